@@ -0,0 +1,160 @@
+"""
+Memory and throughput of one service under gunicorn at several worker counts, on the same host.
+
+Usage: python bench_workers.py [--service navigation-bot] [--workers 1 2 4 8] [--concurrency 32] [--requests 2000]
+                               [--encoder model] [--detector model] [--output workers.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+from datetime import datetime, timezone
+
+import httpx
+
+from run import DEFAULT_PORTS, SCENARIO_SERVICES, Scenario, git_commit, location_titles, run_scenario, start_server, wait_ready
+
+DEFAULT_SCENARIOS = {"navigation-bot": "ask", "lost-and-found": "match"}
+
+def children(pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces: the parent pid follows it
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return pids
+
+def memory_kb(pid):
+    """Rss, Pss and Uss (private pages) of a process, in kB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": values["Rss"], "pss": values["Pss"], "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+def memory_mb(master_pid):
+    """
+    Footprint of the master and its workers. PSS splits shared pages between the processes
+    sharing them, so its sum is what the server really costs; RSS counts them once per worker.
+    """
+    master = memory_kb(master_pid)
+    workers = [memory_kb(pid) for pid in children(master_pid)]
+    mb = lambda kb: round(kb / 1024, 1)
+    return {
+        "total_pss": mb(master["pss"] + sum(worker["pss"] for worker in workers)),
+        "total_rss": mb(master["rss"] + sum(worker["rss"] for worker in workers)),
+        "master_rss": mb(master["rss"]),
+        "worker_rss": mb(max(worker["rss"] for worker in workers)) if workers else None,
+        "worker_uss": mb(max(worker["uss"] for worker in workers)) if workers else None,
+        "processes": 1 + len(workers),
+    }
+
+async def wait_all_ready(url, process, workers, timeout):
+    """/readyz reaches one worker at a time: wait until enough consecutive probes succeed."""
+    await wait_ready(url, process, timeout)
+    async with httpx.AsyncClient(base_url=url) as client:
+        successes = 0
+        while successes < 4 * workers:
+            successes = successes + 1 if (await client.get("/readyz")).status_code == 200 else 0
+            await asyncio.sleep(0.05 if successes else 0.5)
+
+async def measure(args, workers):
+    port = DEFAULT_PORTS[args.service]
+    url = f"http://127.0.0.1:{port}"
+    args.workers = workers
+    process = start_server(args.service, port, args)
+    try:
+        await wait_all_ready(url, process, workers, args.ready_timeout)
+        idle = memory_mb(process.pid)
+        scenario = Scenario(args, args.seed)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+            if args.scenario == "ask":
+                scenario.titles = await location_titles(client, True, args)
+            result = await run_scenario(client, scenario, args.scenario, args.concurrency, args.requests, args.warmup)
+        loaded = memory_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+    return {"workers": workers, "memory_idle_mb": idle, "memory_loaded_mb": loaded, **result}
+
+async def run(args):
+    results = []
+    for workers in args.workers_list:
+        result = await measure(args, workers)
+        results.append(result)
+        print(f"{workers} worker(s): {result['rps']:.1f} req/s, p95 {result['latency_ms']['p95']:.1f} ms, "
+              f"PSS {result['memory_loaded_mb']['total_pss']} MB, errors {result['errors']}")
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "admin_token", "workers")},
+        "results": results,
+    }
+
+def markdown(report):
+    lines = [
+        "| workers | req/s | p50 (ms) | p95 (ms) | total PSS (MB) | total RSS (MB) | RSS per worker (MB) | private per worker (MB) |",
+        "|--:|--:|--:|--:|--:|--:|--:|--:|",
+    ]
+    for result in report["results"]:
+        memory = result["memory_loaded_mb"]
+        lines.append(
+            f"| {result['workers']} | {result['rps']:.1f} | {result['latency_ms']['p50']:.1f} | "
+            f"{result['latency_ms']['p95']:.1f} | {memory['total_pss']} | {memory['total_rss']} | "
+            f"{memory['worker_rss']} | {memory['worker_uss']} |"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--service", choices=sorted(DEFAULT_SCENARIOS), default="navigation-bot")
+    parser.add_argument("--scenario", default=None, choices=SCENARIO_SERVICES,
+                        help="Default: ask for navigation-bot, match for lost-and-found")
+    parser.add_argument("--workers", dest="workers_list", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2_000, help="Measured requests per worker count")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per worker count")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON report path (default: print it)")
+    # Stand-in options, passed to serve.py
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--mongo-uri", default=None)
+    parser.add_argument("--detector", choices=("stub", "model"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--found-ratio", type=float, default=0.3)
+    parser.add_argument("--image-pool", type=int, default=16)
+    parser.add_argument("--locations", type=int, default=5_000)
+    parser.add_argument("--encoder", choices=("stub", "model"), default="stub")
+    args = parser.parse_args()
+    args.scenario = args.scenario or DEFAULT_SCENARIOS[args.service]
+    args.scenarios = [args.scenario]
+    if SCENARIO_SERVICES[args.scenario] != args.service:
+        parser.error(f"{args.scenario} is a {SCENARIO_SERVICES[args.scenario]} scenario")
+    if args.mongo_uri:
+        parser.error("--mongo-uri is not supported: every worker would seed the database")
+
+    report = asyncio.run(run(args))
+    print()
+    print(markdown(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
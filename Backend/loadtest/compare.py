@@ -0,0 +1,63 @@
+"""
+Compare two load-test reports and fail when a scenario regressed beyond a tolerance.
+
+Usage: python compare.py baseline.json candidate.json [--tolerance 10] [--metric p95]
+"""
+import argparse
+import json
+import sys
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="Allowed latency increase / throughput decrease, in percent")
+    parser.add_argument("--metric", default="p95", choices=("mean", "p50", "p95", "p99"),
+                        help="Latency percentile checked against the tolerance")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline {baseline.get('commit')} ({baseline.get('created_at')}) -> "
+          f"candidate {candidate.get('commit')} ({candidate.get('created_at')})")
+    if baseline.get("config") != candidate.get("config"):
+        print("warning: the reports were produced with different settings")
+    print(f"{'scenario':>9} {'rps':>18} {'p50 (ms)':>22} {'p95 (ms)':>22} {'p99 (ms)':>22}")
+
+    regressions = []
+    for name, after in candidate["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            print(f"{name:>9} (new scenario)")
+            continue
+        columns = [f"{before['rps']:>7.1f} -> {after['rps']:>7.1f}"]
+        for percentile in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][percentile], after["latency_ms"][percentile]
+            columns.append(f"{old:>8.1f} -> {new:>8.1f} {change(old, new):>+4.0f}%")
+        print(f"{name:>9} {columns[0]:>18} " + " ".join(f"{column:>22}" for column in columns[1:]))
+
+        latency_change = change(before["latency_ms"][args.metric], after["latency_ms"][args.metric])
+        if latency_change > args.tolerance:
+            regressions.append(f"{name}: {args.metric} latency +{latency_change:.1f}%")
+        rps_change = change(before["rps"], after["rps"])
+        if rps_change < -args.tolerance:
+            regressions.append(f"{name}: throughput {rps_change:.1f}%")
+        if sum(after["errors"].values()) > sum(before["errors"].values()):
+            regressions.append(f"{name}: errors {before['errors']} -> {after['errors']}")
+
+    if regressions:
+        print("\nRegressions beyond tolerance:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regression beyond tolerance")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Locust version of the run.py workload, for ramp-up tests and the Locust web UI against running services.
+
+Usage: locust -f locustfile.py LostAndFoundUser --host http://localhost:8102
+       locust -f locustfile.py NavigationUser --host http://localhost:8101
+"""
+import itertools
+import random
+
+from locust import HttpUser, between, task
+
+from workload import jpeg_pool, random_description, random_detections, random_query, unique_upload
+
+IMAGES = jpeg_pool(16)
+UPLOADS = itertools.count()
+QUERY_SUBJECTS = ["Prepa Block", "Computer Science Department", "Amphi A", "Gym", "Main Entrance", "Red Square"]
+
+class LostAndFoundUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.rng = random.Random()
+
+    @task(1)
+    def upload(self):
+        detections = random_detections(self.rng)
+        data = {"type": "found", "description": random_description(self.rng, detections)}
+        if self.rng.random() < 0.7:
+            data.update(type="lost", contactInfo="owner@example.com")
+        files = {"file": ("photo.jpg", unique_upload(IMAGES, next(UPLOADS)), "image/jpeg")}
+        self.client.post("/upload", data=data, files=files)
+
+    @task(3)
+    def match(self):
+        self.client.post("/match", json=random_detections(self.rng))
+
+    @task(6)
+    def items(self):
+        self.client.get("/items", params={"limit": 50})
+
+class NavigationUser(HttpUser):
+    wait_time = between(0.2, 1)
+
+    def on_start(self):
+        self.rng = random.Random()
+
+    @task
+    def ask(self):
+        self.client.post("/ask", json={"query": random_query(self.rng, QUERY_SUBJECTS)})
@@ -0,0 +1,248 @@
+"""
+Drive /upload, /match, /items and /ask under concurrency and write latency percentiles and throughput as JSON.
+
+Usage: python run.py [--scenarios upload match items ask] [--concurrency 16] [--requests 500] [--output baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+from standins import synthetic_locations
+from workload import jpeg_pool, random_description, random_detections, random_query, unique_upload
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(LOADTEST_DIR)
+SCENARIO_SERVICES = {"upload": "lost-and-found", "match": "lost-and-found", "items": "lost-and-found",
+                     "ask": "navigation-bot"}
+DEFAULT_PORTS = {"lost-and-found": 8102, "navigation-bot": 8101}
+STAGE_SAMPLE = re.compile(r'^stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+class Scenario:
+    def __init__(self, args, seed):
+        self.rng = random.Random(seed)
+        self.counter = 0
+        self.images = jpeg_pool(args.image_pool, seed) if "upload" in args.scenarios else []
+        self.titles = []
+        self.found_ratio = args.found_ratio
+
+    def request(self, name):
+        """Method, path and httpx keyword arguments of the next request of a scenario."""
+        self.counter += 1
+        if name == "upload":
+            detections = random_detections(self.rng)
+            item_type = "found" if self.rng.random() < self.found_ratio else "lost"
+            data = {"type": item_type, "description": random_description(self.rng, detections)}
+            if item_type == "lost":
+                data["contactInfo"] = "owner@example.com"
+            files = {"file": ("photo.jpg", unique_upload(self.images, self.counter), "image/jpeg")}
+            return "POST", "/upload", {"data": data, "files": files}
+        if name == "match":
+            return "POST", "/match", {"json": random_detections(self.rng)}
+        if name == "items":
+            params = {"limit": 50}
+            if self.rng.random() < 0.5:
+                params["type"] = self.rng.choice(("lost", "found"))
+            return "GET", "/items", {"params": params}
+        return "POST", "/ask", {"json": {"query": random_query(self.rng, self.titles)}}
+
+async def run_scenario(client, scenario, name, concurrency, total, warmup):
+    """
+    Send `warmup` unmeasured requests, then `total` measured ones from `concurrency` workers.
+    Returns:
+        dict: Counts, throughput and latency percentiles in milliseconds.
+    """
+    for _ in range(warmup):
+        method, path, kwargs = scenario.request(name)
+        await client.request(method, path, **kwargs)
+
+    latencies, errors = [], {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, path, kwargs = scenario.request(name)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if not status.startswith("2"):
+                errors[status] = errors.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(float(latencies.mean()), 3),
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "max": round(float(latencies.max()), 3),
+        },
+    }
+
+async def stage_means(client):
+    """Mean server-side time per stage (ms) from the service's /metrics, to show where the time goes."""
+    try:
+        text = (await client.get("/metrics")).text
+    except httpx.HTTPError:
+        return {}
+    samples = {}
+    for kind, stage, value in STAGE_SAMPLE.findall(text):
+        samples.setdefault(stage, {})[kind] = float(value)
+    return {
+        stage: {"count": int(values["count"]), "mean_ms": round(1000 * values["sum"] / values["count"], 3)}
+        for stage, values in sorted(samples.items()) if values.get("count")
+    }
+
+def start_server(service, port, args):
+    command = [sys.executable, os.path.join(LOADTEST_DIR, "serve.py"), service, "--port", str(port),
+               "--seed", str(args.seed)]
+    if service == "lost-and-found":
+        command += ["--items", str(args.items), "--detector", args.detector,
+                    "--stub-latency-ms", str(args.stub_latency_ms)]
+        if args.mongo_uri:
+            command += ["--mongo-uri", args.mongo_uri]
+    else:
+        command += ["--locations", str(args.locations), "--encoder", args.encoder]
+    if getattr(args, "workers", 0):
+        command += ["--workers", str(args.workers)]
+    return subprocess.Popen(command)
+
+async def wait_ready(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url}: server exited with code {process.returncode}")
+            try:
+                if (await client.get("/readyz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+async def location_titles(client, started, args):
+    """Titles /ask queries are built from: the stand-in's own locations, the admin API's, or --queries."""
+    if started:
+        with open(os.path.join(BACKEND_DIR, "navigation-bot", "data", "location.json"), encoding="utf-8") as f:
+            base = json.load(f)
+        return [location["title"] for location in synthetic_locations(base, max(args.locations, 1), args.seed)]
+    if args.admin_token:
+        response = await client.get("/admin/locations", headers={"X-Admin-Token": args.admin_token})
+        if response.status_code == 200:
+            return [location["title"] for location in response.json()["locations"]]
+    return args.queries
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=LOADTEST_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args):
+    services = sorted({SCENARIO_SERVICES[name] for name in args.scenarios})
+    urls = {"lost-and-found": args.lost_and_found_url, "navigation-bot": args.navigation_bot_url}
+    processes = {}
+    for service in services:
+        if urls[service] is None:
+            urls[service] = f"http://127.0.0.1:{DEFAULT_PORTS[service]}"
+            processes[service] = start_server(service, DEFAULT_PORTS[service], args)
+    try:
+        for service in services:
+            await wait_ready(urls[service], processes.get(service), args.ready_timeout)
+
+        scenario = Scenario(args, args.seed)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        clients = {
+            service: httpx.AsyncClient(base_url=urls[service], limits=limits, timeout=args.timeout)
+            for service in services
+        }
+        if "ask" in args.scenarios:
+            scenario.titles = await location_titles(clients["navigation-bot"], "navigation-bot" in processes, args)
+        results = {}
+        for name in args.scenarios:
+            client = clients[SCENARIO_SERVICES[name]]
+            results[name] = await run_scenario(client, scenario, name, args.concurrency, args.requests, args.warmup)
+            summary = results[name]["latency_ms"]
+            print(f"{name:>7}: {results[name]['rps']:>8.1f} req/s  p50 {summary['p50']:>8.2f} ms  "
+                  f"p95 {summary['p95']:>8.2f} ms  p99 {summary['p99']:>8.2f} ms  errors {results[name]['errors']}")
+        stages = {service: await stage_means(client) for service, client in clients.items()}
+        for client in clients.values():
+            await client.aclose()
+    finally:
+        for process in processes.values():
+            process.terminate()
+            process.wait(timeout=30)
+
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "admin_token")},
+        "scenarios": results,
+        "stages": stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIO_SERVICES), choices=SCENARIO_SERVICES)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON report path (default: print it)")
+    parser.add_argument("--lost-and-found-url", default=None, help="Target a running service instead of starting one")
+    parser.add_argument("--navigation-bot-url", default=None, help="Target a running service instead of starting one")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--workers", type=int, default=0, help="gunicorn workers per service (default: one uvicorn process)")
+    # Stand-in options, passed to serve.py
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--mongo-uri", default=None)
+    parser.add_argument("--detector", choices=("stub", "model"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--found-ratio", type=float, default=0.3,
+                        help="Share of uploads that are found items (the rest are lost items with a contact email)")
+    parser.add_argument("--image-pool", type=int, default=16, help="Distinct photos uploaded (each upload is still unique)")
+    parser.add_argument("--locations", type=int, default=5_000)
+    parser.add_argument("--encoder", choices=("stub", "model"), default="stub")
+    parser.add_argument("--queries", nargs="+", default=["Prepa Block", "Computer Science Department", "Amphi A", "Gym"],
+                        help="/ask subjects when the location list is not readable (no --admin-token)")
+    parser.add_argument("--admin-token", default=os.environ.get("ADMIN_TOKEN"))
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Run one service with local stand-ins for its external dependencies, for load testing.
+
+Usage: python serve.py lost-and-found [--port 8102] [--items 10000] [--detector stub] [--mongo-uri URI] [--workers N]
+       python serve.py navigation-bot [--port 8101] [--locations 5000] [--encoder stub] [--workers N]
+"""
+import argparse
+import json
+import os
+import runpy
+import sys
+import tempfile
+import uvicorn
+from gunicorn.app.base import BaseApplication
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(LOADTEST_DIR)
+SERVICES = ("lost-and-found", "navigation-bot")
+
+def enter_service(service, workdir):
+    """Import path on the service, working directory in a scratch dir so uploads and artifacts stay out of the tree."""
+    sys.path[:0] = [os.path.join(BACKEND_DIR, service), LOADTEST_DIR]
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.chdir(workdir)
+
+class PreforkServer(BaseApplication):
+    def __init__(self, service, port, workers):
+        """
+        gunicorn configured by the service's gunicorn.conf.py, serving an app the master
+        imports (and patches) itself. The config runs first, as in production, so its
+        environment (PRELOAD_MODELS, thread caps, metrics directory) is set before the import.
+        """
+        os.environ.update(WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+        self.config_path = os.path.join(BACKEND_DIR, service, "gunicorn.conf.py")
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in runpy.run_path(self.config_path).items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+        self.cfg.set("loglevel", "warning")
+
+    def load(self):
+        return self.application
+
+def serve(app, startup, args):
+    if args.server is None:
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+        return
+    if args.server.cfg.preload_app:
+        # Loaded in the master like PRELOAD_MODELS does, but after the stand-ins are patched in
+        startup.preload()
+    args.server.application = app
+    args.server.run()
+
+def lost_and_found(args):
+    from standins import SINK_ADDRESS, SmtpSink, StubDetectorBackend, synthetic_items
+    sink = SmtpSink(port=args.smtp_port).start()
+    os.environ.update(SMTP_HOST="127.0.0.1", SMTP_PORT=str(args.smtp_port), SMTP_USE_SSL="false",
+                      EMAIL_ADDRESS=SINK_ADDRESS, EMAIL_PASSWORD="")
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+
+    import main
+    from archive import ARCHIVE_COLLECTION
+    from class_index import class_fields
+    from lifecycle import LazyModel
+    from notifications import NotificationOutbox
+    from repository import ItemRepository
+
+    if args.mongo_uri:
+        repository = ItemRepository.from_uri(args.mongo_uri, database="lost_and_found_loadtest")
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        repository = ItemRepository(AsyncMongoMockClient()["lost_and_found_loadtest"])
+    main.repository = repository
+    main.detection_cache.collection = repository.collection("detection_cache")
+    main.outbox = main.notification_worker.outbox = NotificationOutbox(repository.collection("notifications"))
+    main.match_jobs.collection = repository.collection("match_jobs")
+    main.archiver.items = repository.items
+    main.archiver.archive = repository.collection(ARCHIVE_COLLECTION)
+    if args.detector == "stub":
+        main.detector.model = LazyModel(lambda: StubDetectorBackend(args.stub_latency_ms, args.seed))
+
+    # Seeded on the server's event loop (a Motor client is bound to one), before the indexes are built
+    prepare_database = main.startup.tasks["mongodb"].func
+
+    async def seed_then_prepare():
+        if args.no_seed:
+            return await prepare_database()
+        for name in ("items", "detection_cache", "notifications", "match_jobs", ARCHIVE_COLLECTION):
+            await repository.collection(name).drop()
+        items = synthetic_items(args.items, args.seed, class_fields)
+        for start in range(0, len(items), 1000):
+            await repository.items.insert_many(items[start:start + 1000])
+        print(f"Seeded {args.items} items; SMTP sink on port {args.smtp_port}")
+        await prepare_database()
+    main.startup.tasks["mongodb"].func = seed_then_prepare
+    try:
+        serve(main.app, main.startup, args)
+    finally:
+        print(f"SMTP sink received {sink.received} message(s)")
+        sink.stop()
+
+def navigation_bot(args):
+    from standins import HashingEncoder, synthetic_locations
+    with open(os.path.join(BACKEND_DIR, "navigation-bot", "data", "location.json"), encoding="utf-8") as f:
+        base = json.load(f)
+    locations = synthetic_locations(base, max(args.locations, 1), args.seed)
+    os.makedirs("data", exist_ok=True)
+    with open("data/location.json", "w", encoding="utf-8") as f:
+        json.dump(locations, f, ensure_ascii=False)
+    os.environ.update(NAV_LOCATIONS_PATH="data/location.json", NAV_ARTIFACT_DIR="artifacts",
+                      NAV_RELOAD_INTERVAL_SECONDS="0")
+
+    import embeddings
+    import main
+    if args.encoder == "stub":
+        embeddings.SentenceTransformer = main.SentenceTransformer = lambda name: HashingEncoder()
+    embeddings.create_faiss_index(locations, "artifacts", "data/location.json", main.MODEL_NAME)
+    print(f"Indexed {len(locations)} locations")
+    serve(main.app, main.startup, args)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("service", choices=SERVICES)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Scratch directory (default: a new temporary one)")
+    parser.add_argument("--items", type=int, default=10_000, help="Synthetic items seeded in MongoDB")
+    parser.add_argument("--mongo-uri", default=None, help="Real MongoDB to seed (default: in-process mongomock)")
+    parser.add_argument("--no-seed", action="store_true", help="Keep the database as it is (with --mongo-uri)")
+    parser.add_argument("--detector", choices=("stub", "model"), default="stub",
+                        help="stub, or the configured DETECTOR_BACKEND with its weights")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated inference time per batch")
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--locations", type=int, default=5_000, help="Locations indexed (real ones plus generated rooms)")
+    parser.add_argument("--encoder", choices=("stub", "model"), default="stub",
+                        help="stub (hashed trigrams), or the real sentence-transformers model")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run under gunicorn with the service's gunicorn.conf.py and this many workers "
+                             "(default: one uvicorn process)")
+    args = parser.parse_args()
+    if args.workers > 1 and args.mongo_uri and not args.no_seed:
+        # Every worker runs the startup tasks, seeding included; mongomock is per process anyway
+        parser.error("--workers with --mongo-uri needs --no-seed: seed the database with a single-worker run first")
+
+    args.port = args.port or {"lost-and-found": 8102, "navigation-bot": 8101}[args.service]
+    enter_service(args.service, args.workdir or tempfile.mkdtemp(prefix=f"loadtest-{args.service}-"))
+    args.server = PreforkServer(args.service, args.port, args.workers) if args.workers else None
+    os.environ["PRELOAD_MODELS"] = "0"
+    if args.service == "lost-and-found":
+        lost_and_found(args)
+    else:
+        navigation_bot(args)
+
+if __name__ == "__main__":
+    main()
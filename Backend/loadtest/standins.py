@@ -0,0 +1,125 @@
+import hashlib
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from workload import random_description, random_detections
+
+SINK_ADDRESS = "loadtest@example.com"
+
+class HashingEncoder:
+    def __init__(self, dim=384):
+        """
+        SentenceTransformer stand-in: hashed character trigrams, L2-normalized.
+        Similar strings get similar vectors, so searches behave plausibly, and
+        encoding costs microseconds instead of a transformer forward pass.
+        Args:
+            dim (int): Embedding size.
+        """
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f"  {text.lower()}  "
+            for i in range(len(padded) - 2):
+                digest = hashlib.blake2b(padded[i:i + 3].encode(), digest_size=8).digest()
+                embeddings[row, int.from_bytes(digest, "little") % self.dim] += 1.0
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+class StubDetectorBackend:
+    def __init__(self, latency_ms=0.0, seed=0):
+        """
+        Detector backend stand-in with the predict() interface of detector_backends.
+        Args:
+            latency_ms (float): Simulated forward-pass time per batch, to model the real one.
+            seed (int): Seed of the reported classes.
+        """
+        self.latency = latency_ms / 1000.0
+        self.seed = seed
+
+    def predict(self, images):
+        if self.latency:
+            time.sleep(self.latency)
+        detections = []
+        for image in images:
+            # Derived from the pixels, so the same photo always gets the same classes
+            rng = random.Random(self.seed + int(image[::64, ::64].sum()))
+            box = [0.0, 0.0, float(image.shape[1]), float(image.shape[0])]
+            detections.append([{**detection, "box": box} for detection in random_detections(rng)])
+        return detections
+
+class SmtpSink:
+    def __init__(self, host="127.0.0.1", port=8025):
+        """Local SMTP server that accepts and counts every message, so notifications never leave the machine."""
+        from aiosmtpd.controller import Controller
+        self.received = 0
+        self._lock = threading.Lock()
+        self.controller = Controller(self, hostname=host, port=port)
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.received += 1
+        return "250 Message accepted"
+
+    def start(self):
+        self.controller.start()
+        return self
+
+    def stop(self):
+        self.controller.stop()
+
+def synthetic_items(count: int, seed: int = 0, class_fields=None) -> list:
+    """
+    Lost and found items as /upload stores them, spread over the last 90 days.
+    Args:
+        count (int): Number of items.
+        seed (int): Random seed.
+        class_fields (callable): class_index.class_fields of the service, for the class index.
+    Returns:
+        list: Item documents.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    items = []
+    for i in range(count):
+        detections = random_detections(rng)
+        item_type = "lost" if rng.random() < 0.6 else "found"
+        items.append({
+            "type": item_type,
+            "description": random_description(rng, detections),
+            "location": f"Bloc {rng.choice('ABCDEFGH')}",
+            "contactInfo": SINK_ADDRESS if item_type == "lost" else None,
+            "image_path": f"data/{hashlib.sha256(f'{seed}-{i}'.encode()).hexdigest()}.jpg",
+            "detections": detections,
+            **(class_fields(detections) if class_fields else {}),
+            "timestamp": (now - timedelta(seconds=rng.uniform(0, 90 * 86400))).isoformat(),
+            "matches": [],
+        })
+    items.sort(key=lambda item: item["timestamp"])
+    return items
+
+def synthetic_locations(base: list, count: int, seed: int = 0) -> list:
+    """
+    The real campus locations plus generated rooms around them, up to `count` locations.
+    """
+    rng = random.Random(seed)
+    locations = [dict(location, id=i + 1) for i, location in enumerate(base)][:count]
+    while len(locations) < count:
+        parent = rng.choice(base)
+        locations.append({
+            "id": len(locations) + 1,
+            "title": f"{parent['title']} - Salle {rng.randint(1, 40)}{rng.choice('ABCD')} #{len(locations)}",
+            "location": {
+                "lat": parent["location"]["lat"] + rng.uniform(-5e-4, 5e-4),
+                "lng": parent["location"]["lng"] + rng.uniform(-5e-4, 5e-4),
+            },
+        })
+    return locations
@@ -0,0 +1,51 @@
+import random
+import cv2
+import numpy as np
+
+# Classes a campus lost-and-found actually sees (COCO names, as YOLO reports them)
+ITEM_CLASSES = (
+    "backpack", "handbag", "umbrella", "suitcase", "cell phone", "laptop", "book",
+    "bottle", "keyboard", "mouse", "remote", "scissors", "clock", "cup", "tie",
+)
+DESCRIPTION_WORDS = ("black", "blue", "red", "small", "large", "leather", "old", "new", "striped", "grey")
+QUERY_TEMPLATES = ("Where is {}?", "how do I get to {}", "{}", "directions to the {}", "Où se trouve {} ?")
+
+def random_detections(rng: random.Random, max_objects: int = 3) -> list:
+    return [
+        {"name": rng.choice(ITEM_CLASSES), "confidence": round(rng.uniform(0.3, 0.95), 3)}
+        for _ in range(rng.randint(1, max_objects))
+    ]
+
+def random_description(rng: random.Random, detections: list) -> str:
+    return f"{rng.choice(DESCRIPTION_WORDS)} {rng.choice(DESCRIPTION_WORDS)} {detections[0]['name']}"
+
+def jpeg_pool(count: int, seed: int = 0, width: int = 1280, height: int = 960) -> list:
+    """
+    Encoded photos of the size a phone upload is resized to: a gradient, a few objects
+    and light sensor noise, so they compress like photos rather than like pure noise
+    (which makes encoders several times slower) or flat colour.
+    """
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 1, width, dtype=np.float32)[None, :] * np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    pool = []
+    for _ in range(count):
+        colour = rng.uniform(40, 215, 3).astype(np.float32)
+        image = np.ascontiguousarray(ramp[:, :, None] * colour)
+        for _ in range(6):
+            center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            axes = (int(rng.integers(40, width // 4)), int(rng.integers(40, height // 4)))
+            cv2.ellipse(image, center, axes, float(rng.uniform(0, 180)), 0, 360, rng.uniform(0, 255, 3).tolist(), -1)
+        image = cv2.GaussianBlur(image, (0, 0), 3) + rng.normal(0, 3, (height, width, 3)).astype(np.float32)
+        ok, encoded = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 85])
+        pool.append(encoded.tobytes())
+    return pool
+
+def unique_upload(pool: list, counter: int) -> bytes:
+    """
+    A pool image made unique: bytes after the JPEG end marker are ignored by decoders
+    but change the content hash, so every upload misses the detection cache.
+    """
+    return pool[counter % len(pool)] + counter.to_bytes(8, "big")
+
+def random_query(rng: random.Random, titles: list) -> str:
+    return rng.choice(QUERY_TEMPLATES).format(rng.choice(titles))
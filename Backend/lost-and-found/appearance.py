@@ -0,0 +1,313 @@
+from datetime import datetime, timedelta
+import cv2
+import faiss
+import numpy as np
+from bson.objectid import ObjectId
+from class_index import CONFIDENCE_THRESHOLD
+from repository import OPEN, OPEN_FILTER
+
+# Bump when the descriptor changes: embeddings of different versions are not comparable
+APPEARANCE_VERSION = 1
+CROP_SIZE = 32
+# Joint hue/saturation/value histogram (hue is 0-179 in OpenCV)
+HSV_BINS = (12, 4, 2)
+# Gradient orientation histograms over a grid of cells, for the shape
+GRADIENT_CELLS = 2
+GRADIENT_BINS = 8
+EMBEDDING_DIM = int(np.prod(HSV_BINS)) + GRADIENT_CELLS ** 2 * GRADIENT_BINS
+# Share of colour in the cosine similarity: two photos of one object mostly differ
+# in pose and background, which change the gradients more than the colours
+COLOR_WEIGHT = 0.7
+# Boxes are centered on the object and their corners are mostly background:
+# pixels count less the farther they are from the center
+_axis = (np.arange(CROP_SIZE) + 0.5) / CROP_SIZE - 0.5
+CENTER_WEIGHTS = np.exp(-(_axis[:, None] ** 2 + _axis[None, :] ** 2) / (2 * 0.25 ** 2))
+
+def crop(image, box):
+    """
+    Region of a detection, clipped to the image.
+    Args:
+        image (np.ndarray): BGR image.
+        box (list): [x1, y1, x2, y2] in image pixels.
+    Returns:
+        np.ndarray | None: The crop, or None when the box is empty once clipped.
+    """
+    height, width = image.shape[:2]
+    x1, y1 = max(int(box[0]), 0), max(int(box[1]), 0)
+    x2, y2 = min(int(np.ceil(box[2])), width), min(int(np.ceil(box[3])), height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return image[y1:y2, x1:x2]
+
+def hellinger(histogram):
+    """Square root of the normalized histogram: dot products become Bhattacharyya coefficients."""
+    total = histogram.sum()
+    return np.sqrt(histogram / total) if total > 0 else np.zeros_like(histogram)
+
+def color_histogram(hsv, weights):
+    """
+    Joint HSV histogram with soft binning: each pixel is split between the two
+    nearest bins of every channel (hue wraps around), so a colour lying on a bin
+    edge does not land in one bin or the other depending on noise.
+    Args:
+        hsv (np.ndarray): (N, 3) uint8 OpenCV HSV pixels.
+        weights (np.ndarray): (N,) pixel weights.
+    Returns:
+        np.ndarray: Flattened (prod(HSV_BINS),) histogram.
+    """
+    bins = np.array(HSV_BINS)
+    position = hsv / np.array([180.0, 256.0, 256.0], dtype=np.float32) * bins - 0.5
+    low = np.floor(position).astype(np.int64)
+    fraction = position - low
+    # (N, 3, 2): the two neighbouring bins of each channel and the share of each
+    index = np.stack([low, low + 1], axis=2)
+    index[:, 0] %= bins[0]
+    index[:, 1:] = np.clip(index[:, 1:], 0, bins[1:, None] - 1)
+    share = np.stack([1 - fraction, fraction], axis=2)
+    flat = (index[:, 0, :, None, None] * bins[1] + index[:, 1, None, :, None]) * bins[2] + index[:, 2, None, None, :]
+    weight = weights[:, None, None, None] \
+        * share[:, 0, :, None, None] * share[:, 1, None, :, None] * share[:, 2, None, None, :]
+    return np.bincount(flat.ravel(), weights=weight.ravel(), minlength=int(np.prod(bins)))
+
+def appearance_embedding(image, box):
+    """
+    Compact colour and shape descriptor of a detected object, computed on the CPU
+    from the crop alone (no second model).
+    Args:
+        image (np.ndarray): BGR image the box was detected in.
+        box (list): [x1, y1, x2, y2] in image pixels.
+    Returns:
+        np.ndarray | None: (EMBEDDING_DIM,) L2-normalized float32 vector, None for an empty box.
+    """
+    region = crop(image, box)
+    if region is None:
+        return None
+    # Large crops are subsampled (a view, no copy) to about 4x the target first:
+    # area-averaging every pixel of a full photo costs more than the rest together
+    step_y, step_x = max(1, region.shape[0] // (4 * CROP_SIZE)), max(1, region.shape[1] // (4 * CROP_SIZE))
+    region = cv2.resize(region[::step_y, ::step_x], (CROP_SIZE, CROP_SIZE), interpolation=cv2.INTER_AREA)
+    color = color_histogram(cv2.cvtColor(region, cv2.COLOR_BGR2HSV).reshape(-1, 3), CENTER_WEIGHTS.ravel())
+
+    # Light blur first, so sensor noise does not add gradients in every direction
+    gray = cv2.GaussianBlur(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY), (3, 3), 0).astype(np.float32)
+    magnitude, angle = cv2.cartToPolar(
+        cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1), angleInDegrees=True
+    )
+    # Unsigned orientations: a dark strap on a light bag and the reverse look alike
+    orientation = (np.mod(angle, 180.0) * GRADIENT_BINS / 180.0).astype(np.int64) % GRADIENT_BINS
+    cells = np.arange(CROP_SIZE) * GRADIENT_CELLS // CROP_SIZE
+    cell = cells[:, None] * GRADIENT_CELLS + cells[None, :]
+    gradient = np.bincount(
+        (cell * GRADIENT_BINS + orientation).ravel(), weights=(magnitude * CENTER_WEIGHTS).ravel(),
+        minlength=GRADIENT_CELLS ** 2 * GRADIENT_BINS
+    )
+    vector = np.concatenate([
+        np.sqrt(COLOR_WEIGHT) * hellinger(color),
+        np.sqrt(1 - COLOR_WEIGHT) * hellinger(gradient),
+    ]).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def pack(embedding) -> bytes:
+    """Serialize an embedding as float16, for the detection cache and the item document."""
+    return np.asarray(embedding, dtype=np.float16).tobytes()
+
+def unpack(data) -> np.ndarray:
+    """Inverse of pack, as float32 for FAISS and numpy."""
+    return np.frombuffer(data, dtype=np.float16).astype(np.float32)
+
+def embed_detections(image, detections: list) -> list:
+    """
+    Add a packed `embedding` to every confident detection that has a box.
+    Args:
+        image (np.ndarray): BGR image the detections come from.
+        detections (list): {"name", "confidence", "box"} dicts, updated in place.
+    Returns:
+        list: The same detections.
+    """
+    for detection in detections:
+        if detection["confidence"] <= CONFIDENCE_THRESHOLD or "box" not in detection:
+            continue
+        embedding = appearance_embedding(image, detection["box"])
+        if embedding is not None:
+            detection["embedding"] = pack(embedding)
+    return detections
+
+def split_embeddings(detections: list):
+    """
+    Separate the crop embeddings from the detections, which are returned by the API.
+    Args:
+        detections (list): Detector output, possibly with embeddings.
+    Returns:
+        tuple: (detections without embeddings, crops as {"name", "embedding"} dicts).
+    """
+    public, crops = [], []
+    for detection in detections or []:
+        if "embedding" in detection:
+            crops.append({"name": detection["name"], "embedding": detection["embedding"]})
+            detection = {key: value for key, value in detection.items() if key != "embedding"}
+        public.append(detection)
+    return public, crops
+
+def crop_similarity(crops1: list, crops2: list) -> float:
+    """
+    Soft Jaccard similarity of two items' crops: every crop is scored by its closest
+    crop of the same class on the other side (0 when there is none), and the scores
+    of both sides are averaged. With identical-looking objects it equals the class
+    Jaccard; two backpacks of different colours score well below 1.
+    Args:
+        crops1 (list): {"name", "embedding"} dicts from split_embeddings.
+        crops2 (list): Same, for the other item.
+    Returns:
+        float: Similarity in [0, 1].
+    """
+    if not crops1 or not crops2:
+        return 0.0
+    vectors1 = np.stack([unpack(c["embedding"]) for c in crops1])
+    vectors2 = np.stack([unpack(c["embedding"]) for c in crops2])
+    same_class = np.array([c["name"] for c in crops1])[:, None] == np.array([c["name"] for c in crops2])[None, :]
+    similarities = np.where(same_class, np.clip(vectors1 @ vectors2.T, 0.0, 1.0), 0.0)
+    total = similarities.max(axis=1).sum() + similarities.max(axis=0).sum()
+    return float(total / (len(crops1) + len(crops2)))
+
+class AppearanceIndex:
+    def __init__(self, k=100, sync_lag=30.0):
+        """
+        In-memory FAISS indexes of crop embeddings, one per (item type, class), so
+        finding the items that contain a similar-looking object is one search
+        instead of a comparison against every item of the class. Vectors are stored
+        as float16. Only open items are indexed; the index is a candidate generator:
+        results are checked against MongoDB, which stays the source of truth for an
+        item's status.
+        Args:
+            k (int): Nearest crops returned per query crop.
+            sync_lag (float): Seconds of inserts and reopenings re-read by sync, to catch
+                items another process inserted with an earlier ObjectId than the last one seen.
+        """
+        self.k = k
+        self.sync_lag = sync_lag
+        self._indexes = {}
+        # FAISS labels are int64: each crop gets a sequential label mapped back to its item
+        self._label_items = {}
+        self._item_labels = {}
+        self._next_label = 0
+        self._synced_at = None
+        # Recent items sync has read but not indexed (no crops, or not open). Only ids
+        # inside the sync window are kept: older ones are never read again.
+        self._skipped = set()
+
+    def __len__(self):
+        return len(self._item_labels)
+
+    def _index(self, key):
+        if key not in self._indexes:
+            quantizer = faiss.IndexScalarQuantizer(
+                EMBEDDING_DIM, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            )
+            self._indexes[key] = faiss.IndexIDMap(quantizer)
+        return self._indexes[key]
+
+    def add(self, item_id, item_type: str, crops: list) -> bool:
+        """
+        Index the crops of one item; an item already indexed is left alone.
+        Returns:
+            bool: Whether the item was added.
+        """
+        if item_id in self._item_labels:
+            return False
+        labels = []
+        for name in {c["name"] for c in crops}:
+            vectors = np.stack([unpack(c["embedding"]) for c in crops if c["name"] == name])
+            ids = np.arange(self._next_label, self._next_label + len(vectors), dtype=np.int64)
+            self._next_label += len(vectors)
+            self._index((item_type, name)).add_with_ids(vectors, ids)
+            labels.extend(((item_type, name), int(label)) for label in ids)
+        if not labels:
+            return False
+        for _, label in labels:
+            self._label_items[label] = item_id
+        self._item_labels[item_id] = labels
+        return True
+
+    def remove(self, item_id):
+        """Drop the crops of an item that is no longer open, or no longer exists (archived)."""
+        labels = self._item_labels.pop(item_id, [])
+        by_index = {}
+        for key, label in labels:
+            by_index.setdefault(key, []).append(label)
+            self._label_items.pop(label, None)
+        for key, ids in by_index.items():
+            self._indexes[key].remove_ids(np.array(ids, dtype=np.int64))
+
+    def search(self, item_type: str, crops: list, threshold: float) -> list:
+        """
+        Items of `item_type` with a crop of the same class whose similarity with one
+        of `crops` exceeds `threshold`. crop_similarity never exceeds the best crop
+        pair, so these are the only items that can score above it (up to k per crop).
+        Args:
+            item_type (str): Type of the items to search.
+            crops (list): {"name", "embedding"} dicts of the query item.
+            threshold (float): Minimum crop similarity.
+        Returns:
+            list: Item ids, most similar first.
+        """
+        best = {}
+        for c in crops:
+            index = self._indexes.get((item_type, c["name"]))
+            if index is None or index.ntotal == 0:
+                continue
+            scores, labels = index.search(unpack(c["embedding"])[None, :], min(self.k, index.ntotal))
+            for score, label in zip(scores[0], labels[0]):
+                if label < 0 or score <= threshold:
+                    continue
+                item_id = self._label_items[int(label)]
+                best[item_id] = max(best.get(item_id, 0.0), float(score))
+        return sorted(best, key=best.get, reverse=True)
+
+    async def load(self, items) -> int:
+        """
+        Build the indexes from every open item with crop embeddings.
+        Args:
+            items: Async (Motor) items collection.
+        Returns:
+            int: Number of indexed items.
+        """
+        self._synced_at = datetime.utcnow()
+        loaded = 0
+        async for item in items.find({"crops.0": {"$exists": True}, **OPEN_FILTER}, {"type": 1, "crops": 1}):
+            loaded += self.add(item["_id"], item["type"], item["crops"])
+        return loaded
+
+    async def sync(self, items) -> int:
+        """
+        Add the open items inserted or reopened since the last sync, by this process or
+        another one. Ids are read first, crops only for unknown items.
+        Returns:
+            int: Number of added items.
+        """
+        now = datetime.utcnow()
+        since = (self._synced_at or now) - timedelta(seconds=self.sync_lag)
+        self._synced_at = now
+        recent = [item["_id"] async for item in items.find({"_id": {"$gte": ObjectId.from_datetime(since)}}, {"_id": 1})]
+        # A reopened item keeps its old ObjectId: it is found by its status change instead
+        reopened = [
+            item["_id"] async for item in
+            items.find({"status": OPEN, "status_changed_at": {"$gte": since.isoformat()}}, {"_id": 1})
+        ]
+        unknown = {item_id for item_id in recent if item_id not in self._skipped}
+        unknown.update(reopened)
+        unknown.difference_update(self._item_labels)
+        added = 0
+        if unknown:
+            query = {"_id": {"$in": list(unknown)}, "crops.0": {"$exists": True}, **OPEN_FILTER}
+            async for item in items.find(query, {"type": 1, "crops": 1}):
+                added += self.add(item["_id"], item["type"], item["crops"])
+        self._skipped = {item_id for item_id in recent if item_id not in self._item_labels}
+        return added
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self),
+            "crops": len(self._label_items),
+            "indexes": len(self._indexes),
+            "bytes": sum(index.ntotal for index in self._indexes.values()) * EMBEDDING_DIM * 2,
+        }
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+import cv2
+from pymongo import ReplaceOne
+from renditions import DATA_DIR, RENDITION_FORMATS, RENDITION_SIZES, rendition_key, rendition_path, write_renditions
+from repository import CLAIMED, MATCHED, OPEN
+from instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTION = "items_archive"
+# Outside the /data static mount: archived photos are no longer served
+COLD_DIR = "cold"
+ITEM_TYPES = ("lost", "found")
+
+class ItemArchiver:
+    def __init__(self, items, archive, open_ttl_days=90.0, matched_ttl_days=30.0, claimed_ttl_days=7.0,
+                 batch_size=500, data_dir=DATA_DIR, cold_dir=COLD_DIR):
+        """
+        Moves expired items out of the hot collection, and their photos to cold storage.
+        Args:
+            items: Async (Motor) items collection, the one matching and /items scan.
+            archive: Async collection receiving archived items.
+            open_ttl_days (float): Age (from `timestamp`) after which an open item is archived.
+            matched_ttl_days (float): Days after being marked matched before an item is archived.
+            claimed_ttl_days (float): Days after being marked claimed before an item is archived.
+            batch_size (int): Items moved per round trip.
+            data_dir (str): Directory of the served originals.
+            cold_dir (str): Directory archived originals are moved to.
+        """
+        self.items = items
+        self.archive = archive
+        self.ttl_days = {OPEN: open_ttl_days, MATCHED: matched_ttl_days, CLAIMED: claimed_ttl_days}
+        self.batch_size = batch_size
+        self.data_dir = data_dir
+        self.cold_dir = cold_dir
+        self.last_run = None
+
+    async def ensure_indexes(self):
+        await self.archive.create_index("archived_at")
+
+    def expired_queries(self, now: datetime):
+        """
+        One filter per (type, status), so each uses the (type, status, timestamp) index.
+        Open items expire by age; matched and claimed ones by the time of their last status change.
+        Yields:
+            tuple: (reason, filter).
+        """
+        for item_type in ITEM_TYPES:
+            for status, days in self.ttl_days.items():
+                cutoff = (now - timedelta(days=days)).isoformat()
+                if status == OPEN:
+                    # Items that predate the status field count as open
+                    yield status, {"type": item_type, "status": {"$in": [OPEN, None]}, "timestamp": {"$lt": cutoff}}
+                else:
+                    yield status, {"type": item_type, "status": status, "status_changed_at": {"$lt": cutoff}}
+
+    async def compact(self, now: datetime = None) -> dict:
+        """
+        Archive every expired item. Safe to run from several processes at once:
+        copies are upserts and deletes are idempotent.
+        Args:
+            now (datetime): Reference time (UTC), mostly for tests.
+        Returns:
+            dict: Number of archived items and of photos moved to cold storage.
+        """
+        now = now or datetime.utcnow()
+        with timed("archive_compaction"):
+            archived, images_moved = await self._compact(now)
+        self.last_run = {"at": now.isoformat(), "archived": archived, "images_moved": images_moved}
+        if archived:
+            logger.info(f"Archived {archived} items, moved {images_moved} images to cold storage")
+        return self.last_run
+
+    async def _compact(self, now: datetime):
+        archived, images_moved = 0, 0
+        for reason, query in self.expired_queries(now):
+            while True:
+                batch = await self.items.find(query).limit(self.batch_size).to_list(length=None)
+                if not batch:
+                    break
+                archived += await self._archive_batch(batch, reason, now)
+                for image_path in {item["image_path"] for item in batch if item.get("image_path")}:
+                    if await self.move_to_cold(image_path):
+                        images_moved += 1
+                if len(batch) < self.batch_size:
+                    break
+        return archived, images_moved
+
+    async def _archive_batch(self, batch: list, reason: str, now: datetime) -> int:
+        # Copy first, then delete: a crash in between leaves a duplicate, never a lost item
+        operations = [
+            ReplaceOne({"_id": item["_id"]}, {**item, "archived_at": now.isoformat(), "archive_reason": reason}, upsert=True)
+            for item in batch
+        ]
+        await self.archive.bulk_write(operations, ordered=False)
+        result = await self.items.delete_many({"_id": {"$in": [item["_id"] for item in batch]}})
+        return result.deleted_count
+
+    def local_path(self, image_path: str):
+        """File behind a stored image path, or None when it is not an upload of data_dir."""
+        path = os.path.normpath(image_path.lstrip("/"))
+        if os.path.dirname(path) != os.path.normpath(self.data_dir):
+            return None
+        return path
+
+    async def move_to_cold(self, image_path: str) -> bool:
+        """
+        Move an original to cold storage and drop its renditions, unless a hot item
+        still uses it (uploads are content-addressed, so one file can back several items).
+        Returns:
+            bool: Whether the file was moved.
+        """
+        source = self.local_path(image_path)
+        if source is None or not os.path.exists(source) or await self._in_use(image_path):
+            return False
+        target = os.path.join(self.cold_dir, os.path.basename(source))
+        await asyncio.to_thread(self._move, source, target)
+        # An upload of the same photo may have been stored meanwhile; its background
+        # write saw the file and skipped it, so it has to be put back. Uploads stored
+        # after this check find the file missing and write it (and its renditions) again.
+        if await self._in_use(image_path):
+            await asyncio.to_thread(self._restore, target, source)
+            return False
+        await self.archive.update_many({"image_path": image_path}, {"$set": {"cold_image_path": target}})
+        return True
+
+    async def _in_use(self, image_path: str) -> bool:
+        return await self.items.find_one({"image_path": image_path}, {"_id": 1}) is not None
+
+    def _move(self, source: str, target: str):
+        os.makedirs(self.cold_dir, exist_ok=True)
+        if not os.path.exists(target):
+            staging = f"{target}.{os.getpid()}.tmp"
+            shutil.copy2(source, staging)
+            os.replace(staging, target)
+        key = rendition_key(source)
+        for path in [source] + [rendition_path(key, size, fmt) for size in RENDITION_SIZES for fmt in RENDITION_FORMATS]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _restore(self, target: str, source: str):
+        staging = f"{source}.{os.getpid()}.tmp"
+        shutil.copy2(target, staging)
+        os.replace(staging, source)
+        image = cv2.imread(source)
+        if image is not None:
+            write_renditions(image, rendition_key(source))
+
+    async def stats(self) -> dict:
+        return {"archived": await self.archive.count_documents({}), "last_run": self.last_run}
+
+class CompactionWorker:
+    def __init__(self, archiver, interval=3600.0):
+        """
+        Runs ItemArchiver.compact periodically in the background.
+        Args:
+            archiver (ItemArchiver): Archiver to run.
+            interval (float): Seconds between runs; 0 disables the worker.
+        """
+        self.archiver = archiver
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archiver.compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Archive compaction error: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,64 @@
+"""
+Compare ranking one found item's crop against N lost items of the same class: scoring
+every item with crop_similarity, or one search in the per-class appearance index.
+
+Usage: python benchmarks/bench_appearance.py [--sizes 1000 10000 100000] [--k 100] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from bson.objectid import ObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from appearance import EMBEDDING_DIM, AppearanceIndex, crop_similarity, pack
+from class_index import MATCH_THRESHOLD
+
+def random_embeddings(rng, count):
+    # Square roots of random histograms: non-negative unit vectors, like appearance_embedding
+    vectors = np.sqrt(rng.dirichlet(np.full(EMBEDDING_DIM, 0.3), size=count)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    query = [{"name": "backpack", "embedding": pack(random_embeddings(rng, 1)[0])}]
+    print(f"{'items':>8} {'scan (ms)':>10} {'index (ms)':>11} {'speedup':>8} {'recall':>7} {'index MB':>9}")
+    for size in args.sizes:
+        items = [
+            (ObjectId(), [{"name": "backpack", "embedding": pack(vector)}])
+            for vector in random_embeddings(rng, size)
+        ]
+        index = AppearanceIndex(k=args.k)
+        for item_id, crops in items:
+            index.add(item_id, "lost", crops)
+
+        def scan():
+            scores = {item_id: crop_similarity(query, crops) for item_id, crops in items}
+            above = [item_id for item_id, score in scores.items() if score > MATCH_THRESHOLD]
+            return sorted(above, key=scores.get, reverse=True)[:args.k]
+
+        scan_time, expected = best_of(args.repeat, scan)
+        index_time, found = best_of(args.repeat, lambda: index.search("lost", query, MATCH_THRESHOLD))
+        recall = len(set(found) & set(expected)) / len(expected) if expected else 1.0
+        print(f"{size:>8} {scan_time * 1000:>10.2f} {index_time * 1000:>11.3f} {scan_time / index_time:>7.0f}x "
+              f"{recall:>7.3f} {index.stats()['bytes'] / 2 ** 20:>9.1f}")
+
+if __name__ == "__main__":
+    main()
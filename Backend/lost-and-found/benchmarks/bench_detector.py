@@ -0,0 +1,103 @@
+"""
+Compare latency, throughput and detection agreement of the detector backends on a folder of images.
+
+Usage: python benchmarks/bench_detector.py data/ [--backends torch onnx onnx-int8] [--imgsz 640] [--threads 4] [--batch 8]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from detector_backends import BACKENDS, create_backend
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+def load_images(folder):
+    paths = sorted(
+        path for path in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    images = [cv2.imread(path) for path in paths]
+    return [image for image in images if image is not None]
+
+def iou(a, b):
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def agreement(reference, candidate, threshold=0.5):
+    """
+    F1 of candidate detections against the reference backend: a detection matches
+    an unmatched reference detection of the same class with IoU >= threshold.
+    """
+    matched = total_reference = total_candidate = 0
+    for expected, found in zip(reference, candidate):
+        total_reference += len(expected)
+        total_candidate += len(found)
+        used = set()
+        for detection in sorted(found, key=lambda d: -d["confidence"]):
+            for i, target in enumerate(expected):
+                if i not in used and target["name"] == detection["name"] and iou(target["box"], detection["box"]) >= threshold:
+                    used.add(i)
+                    matched += 1
+                    break
+    if not total_reference and not total_candidate:
+        return 1.0
+    return 2 * matched / (total_reference + total_candidate)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("images", help="Folder of sample images (searched recursively)")
+    parser.add_argument("--model", default="yolov5su.pt")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--reference", default="torch", choices=BACKENDS, help="Backend agreement is measured against")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=0, help="Inference threads (0: library default)")
+    parser.add_argument("--batch", type=int, default=8, help="Images per call in the throughput run")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    backends = list(dict.fromkeys([args.reference] + args.backends))
+    print(f"{len(images)} images, imgsz {args.imgsz}, {args.threads or 'default'} thread(s), batch {args.batch}")
+    print(f"{'backend':>10} {'load (s)':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'img/s':>8} {'detections':>11} {'agreement':>10}")
+    reference = None
+    for name in backends:
+        start = time.perf_counter()
+        backend = create_backend(name, args.model, args.imgsz, args.threads)
+        load_time = time.perf_counter() - start
+        backend.predict(images[:1])
+
+        # Single-image latency, as a lone upload sees it
+        latencies = []
+        for _ in range(args.repeat):
+            for image in images:
+                start = time.perf_counter()
+                backend.predict([image])
+                latencies.append(time.perf_counter() - start)
+        # Batched throughput, as the inference worker runs under load
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for offset in range(0, len(images), args.batch):
+                backend.predict(images[offset:offset + args.batch])
+        throughput = args.repeat * len(images) / (time.perf_counter() - start)
+
+        detections = backend.predict(images)
+        if reference is None:
+            reference = detections
+        print(f"{name:>10} {load_time:>9.2f} {np.percentile(latencies, 50) * 1000:>9.1f} "
+              f"{np.percentile(latencies, 95) * 1000:>9.1f} {throughput:>8.1f} "
+              f"{sum(len(d) for d in detections):>11} {agreement(reference, detections):>10.3f}")
+
+if __name__ == "__main__":
+    main()
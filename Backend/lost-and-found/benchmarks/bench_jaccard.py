@@ -0,0 +1,56 @@
+"""
+Compare set-based and bitset-based Jaccard scoring of one query against N lost items.
+
+Usage: python benchmarks/bench_jaccard.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from class_index import (
+    COCO_CLASSES, MASK_BYTES, calculate_image_similarity, class_mask, confident_classes, jaccard_many
+)
+
+def random_detections(rng, max_objects=4):
+    return [
+        {"name": rng.choice(COCO_CLASSES), "confidence": rng.random()}
+        for _ in range(rng.randint(1, max_objects))
+    ]
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    query = random_detections(rng)
+    query_mask = class_mask(confident_classes(query))
+    print(f"{'items':>8} {'sets (ms)':>10} {'bitset (ms)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        items = [random_detections(rng) for _ in range(size)]
+        masks = np.frombuffer(
+            b"".join(class_mask(confident_classes(item)) for item in items), dtype=np.uint8
+        ).reshape(size, MASK_BYTES)
+
+        set_time, expected = best_of(args.repeat, lambda: [calculate_image_similarity(query, item) for item in items])
+        bit_time, scores = best_of(args.repeat, lambda: jaccard_many(query_mask, masks))
+        assert np.array_equal(scores, np.array(expected)), "bitset scores differ from set-based scores"
+        print(f"{size:>8} {set_time * 1000:>10.2f} {bit_time * 1000:>12.2f} {set_time / bit_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from pymongo import ASCENDING
+import numpy as np
+
+CONFIDENCE_THRESHOLD = 0.5
+MATCH_THRESHOLD = 0.5
+
+# Label space of the COCO-trained YOLO weights, in model order; one bit per class
+COCO_CLASSES = (
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog",
+    "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella",
+    "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball", "kite",
+    "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", "bottle",
+    "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange",
+    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch", "potted plant",
+    "bed", "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard", "cell phone",
+    "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors",
+    "teddy bear", "hair drier", "toothbrush",
+)
+CLASS_BITS = {name: bit for bit, name in enumerate(COCO_CLASSES)}
+MASK_BYTES = (len(COCO_CLASSES) + 7) // 8
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def confident_classes(detections: list) -> list:
+    """
+    Extract the sorted set of class names detected with enough confidence.
+    Args:
+        detections (list): Detections as returned by YOLOv5Detector.detect.
+    Returns:
+        list: Sorted, de-duplicated class names with confidence > 0.5; empty if a
+        confident detection has no name, like calculate_image_similarity.
+    """
+    classes = set()
+    for det in detections or []:
+        if not isinstance(det, dict) or det.get("confidence", 0) <= CONFIDENCE_THRESHOLD:
+            continue
+        if "name" not in det:
+            return []
+        classes.add(det["name"])
+    return sorted(classes)
+
+
+def calculate_image_similarity(detections1: list, detections2: list) -> float:
+    if not detections1 or not detections2:
+        return 0.0
+    try:
+        classes1 = {det["name"] for det in detections1 if det.get("confidence", 0) > 0.5}
+        classes2 = {det["name"] for det in detections2 if det.get("confidence", 0) > 0.5}
+    except KeyError:
+        return 0.0
+    if not classes1 or not classes2:
+        return 0.0
+    intersection = len(classes1.intersection(classes2))
+    union = len(classes1.union(classes2))
+    return intersection / union if union > 0 else 0.0
+
+
+def class_mask(classes: list):
+    """
+    Pack a class set into a fixed-size bitmask over COCO_CLASSES.
+    Args:
+        classes (list): Class names.
+    Returns:
+        bytes | None: MASK_BYTES bytes, or None if a class is outside the label space.
+    """
+    bits = np.zeros(len(COCO_CLASSES), dtype=np.uint8)
+    for name in classes:
+        if name not in CLASS_BITS:
+            return None
+        bits[CLASS_BITS[name]] = 1
+    return np.packbits(bits).tobytes()
+
+
+def jaccard_many(query_mask: bytes, masks: np.ndarray) -> np.ndarray:
+    """
+    Jaccard similarity of one class bitmask against many, without Python loops.
+    Args:
+        query_mask (bytes): Mask from class_mask.
+        masks (np.ndarray): (N, MASK_BYTES) uint8 matrix of candidate masks.
+    Returns:
+        np.ndarray: (N,) similarities, 0.0 where either set is empty.
+    """
+    query = np.frombuffer(query_mask, dtype=np.uint8)
+    intersection = POPCOUNT[masks & query].sum(axis=1, dtype=np.int64)
+    union = POPCOUNT[masks | query].sum(axis=1, dtype=np.int64)
+    return np.where(union > 0, intersection / np.maximum(union, 1), 0.0)
+
+
+def class_fields(detections: list) -> dict:
+    """
+    Denormalized fields stored on every item so /match can use the class index.
+    Args:
+        detections (list): Detections of the item.
+    Returns:
+        dict: `classes` (multikey-indexed), `class_count` (set cardinality) and
+        `class_mask` (packed bitset, None when a class is outside COCO_CLASSES).
+    """
+    classes = confident_classes(detections)
+    return {"classes": classes, "class_count": len(classes), "class_mask": class_mask(classes)}
+
+
+def required_image_similarity(text_weight: float = 0.0) -> float:
+    """
+    Lowest image similarity that can still produce a match once text is mixed in.
+    With score = (1 - w) * image + w * text and text <= 1, a match needs
+    image > (threshold - w) / (1 - w).
+    Args:
+        text_weight (float): Weight of the text similarity, in [0, MATCH_THRESHOLD).
+    Returns:
+        float: Image similarity bound to use with candidate_query.
+    """
+    return (MATCH_THRESHOLD - text_weight) / (1 - text_weight)
+
+
+def candidate_query(classes: list, item_type: str = "lost", threshold: float = MATCH_THRESHOLD) -> dict:
+    """
+    Build the Mongo filter returning only items that can beat `threshold`.
+
+    Jaccard(A, B) <= min(|A|, |B|) / max(|A|, |B|), so a candidate must share
+    at least one class and have a class count strictly between
+    |A| * threshold and |A| / threshold. Items written before the class index
+    existed (no `classes` field) are still scanned so nothing is missed.
+    Args:
+        classes (list): Confident classes of the query item.
+        item_type (str): Type of the items to match against.
+        threshold (float): Minimum similarity a match must exceed.
+    Returns:
+        dict: Filter for collection.find.
+    """
+    size = len(classes)
+    indexed = {"classes": {"$in": classes}}
+    if threshold > 0:
+        indexed["class_count"] = {"$gt": size * threshold, "$lt": size / threshold}
+    legacy = {"classes": {"$exists": False}, "detections": {"$exists": True, "$ne": []}}
+    return {"type": item_type, "$or": [indexed, legacy]}
+
+
+# Index used before items had a status, superseded by the one created below
+LEGACY_CLASS_INDEX = "type_1_classes_1_class_count_1"
+
+
+async def ensure_class_index(collection):
+    """
+    Create the multikey index and backfill `classes` on items that predate it.
+    Args:
+        collection: The async (Motor) items collection.
+    Returns:
+        int: Number of backfilled items.
+    """
+    # Matching only scans open items, so the status comes right after the type
+    await collection.create_index(
+        [("type", ASCENDING), ("status", ASCENDING), ("classes", ASCENDING), ("class_count", ASCENDING)]
+    )
+    if LEGACY_CLASS_INDEX in await collection.index_information():
+        await collection.drop_index(LEGACY_CLASS_INDEX)
+    backfilled = 0
+    missing = {"$or": [{"classes": {"$exists": False}}, {"class_mask": {"$exists": False}}]}
+    async for item in collection.find(missing, {"detections": 1}):
+        await collection.update_one({"_id": item["_id"]}, {"$set": class_fields(item.get("detections", []))})
+        backfilled += 1
+    return backfilled
@@ -0,0 +1,99 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+class DetectionCache:
+    def __init__(self, collection=None, namespace="", max_entries=1024):
+        """
+        Two-tier cache of detections keyed by image content hash.
+        Args:
+            collection: Optional async (Motor) collection used as the persistent tier.
+            namespace (str): Model path/version, so a model change never serves stale detections.
+            max_entries (int): Size of the in-memory LRU tier.
+        """
+        self.collection = collection
+        self.namespace = namespace
+        self.max_entries = max(0, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    @staticmethod
+    def content_hash(data) -> str:
+        """
+        Hash image bytes.
+        Args:
+            data (bytes | memoryview): Raw image content.
+        Returns:
+            str: Hex SHA-256 digest, also used as the on-disk file name.
+        """
+        return hashlib.sha256(memoryview(data)).hexdigest()
+
+    def _key(self, digest):
+        return f"{self.namespace}:{digest}"
+
+    def _remember(self, key, detections):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = detections
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get(self, digest):
+        """
+        Look up detections for an image.
+        Args:
+            digest (str): Content hash from content_hash.
+        Returns:
+            list | None: Cached detections, or None on a miss.
+        """
+        key = self._key(digest)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._entries[key]
+        entry = await self.collection.find_one({"_id": key}) if self.collection is not None else None
+        with self._lock:
+            self._counters["persistent_hits" if entry else "misses"] += 1
+        if not entry:
+            return None
+        self._remember(key, entry["detections"])
+        return entry["detections"]
+
+    async def put(self, digest, detections):
+        """
+        Store detections in both tiers.
+        Args:
+            digest (str): Content hash from content_hash.
+            detections (list): Detector output for the image.
+        """
+        key = self._key(digest)
+        self._remember(key, detections)
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {"detections": detections, "created_at": datetime.utcnow().isoformat()}},
+                upsert=True
+            )
+
+    def stats(self):
+        """
+        Hit/miss counters.
+        Returns:
+            dict: Counters per tier, hit rate and current in-memory size.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = sum(counters.values())
+        hits = counters["memory_hits"] + counters["persistent_hits"]
+        return {
+            **counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": size,
+            "max_entries": self.max_entries,
+        }
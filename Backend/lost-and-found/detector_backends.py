@@ -0,0 +1,222 @@
+import ast
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from class_index import COCO_CLASSES
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Same defaults as ultralytics predict, so every backend reports comparable detections
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+
+def letterbox(image, size, color=114):
+    """
+    Resize keeping the aspect ratio and pad to a square, as YOLO was trained.
+    Args:
+        image (np.ndarray): BGR image.
+        size (int): Target side.
+        color (int): Padding value.
+    Returns:
+        tuple: Padded image, scale ratio and (left, top) padding.
+    """
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    left, top = (size - new_width) // 2, (size - new_height) // 2
+    padded = np.full((size, size, 3), color, dtype=np.uint8)
+    padded[top:top + new_height, left:left + new_width] = image
+    return padded, ratio, (left, top)
+
+def decode_predictions(output, ratio, pad, names, conf_threshold=CONF_THRESHOLD, iou_threshold=IOU_THRESHOLD,
+                       max_detections=MAX_DETECTIONS):
+    """
+    Decode the raw output of an anchor-free YOLO head (YOLOv5u/YOLOv8 export) for one image.
+    Args:
+        output (np.ndarray): (4 + num_classes, num_anchors) array: cx, cy, w, h then class scores.
+        ratio (float): Letterbox scale.
+        pad (tuple): Letterbox (left, top) padding.
+        names (list): Class names by index.
+        conf_threshold (float): Minimum class score.
+        iou_threshold (float): Per-class NMS overlap threshold.
+        max_detections (int): Maximum detections kept.
+    Returns:
+        list: {"name", "confidence", "box"} dicts, box as [x1, y1, x2, y2] in original image pixels.
+    """
+    predictions = output.T
+    scores = predictions[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences >= conf_threshold
+    if not keep.any():
+        return []
+    boxes, confidences, class_ids = predictions[keep, :4], confidences[keep], class_ids[keep]
+    xywh = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+    selected = cv2.dnn.NMSBoxesBatched(
+        xywh.tolist(), confidences.tolist(), class_ids.tolist(), conf_threshold, iou_threshold
+    )
+    selected = np.asarray(selected, dtype=np.int64).reshape(-1)
+    selected = selected[np.argsort(-confidences[selected], kind='stable')][:max_detections]
+    xyxy = np.column_stack([xywh[:, 0], xywh[:, 1], xywh[:, 0] + xywh[:, 2], xywh[:, 1] + xywh[:, 3]])
+    xyxy = (xyxy - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / ratio
+    return [
+        {
+            "name": names[int(class_ids[i])],
+            "confidence": float(confidences[i]),
+            "box": [round(float(v), 1) for v in xyxy[i]],
+        } for i in selected
+    ]
+
+class TorchBackend:
+    def __init__(self, model_path, imgsz=640, threads=0):
+        """
+        PyTorch model through ultralytics, the reference backend.
+        Args:
+            model_path (str): Weights file.
+            imgsz (int): Inference size.
+            threads (int): Torch intra-op threads (0 keeps the torch default).
+        """
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+        self.names = self.model.names
+
+    def predict(self, images):
+        results = self.model(list(images), imgsz=self.imgsz, verbose=False)
+        detections = []
+        for result in results:
+            boxes = []
+            for box in result.boxes:
+                boxes.append({
+                    "name": self.names[int(box.cls[0])],
+                    "confidence": float(box.conf[0]),
+                    "box": [round(float(v), 1) for v in box.xyxy[0]],
+                })
+            detections.append(boxes)
+        return detections
+
+class OnnxBackend:
+    def __init__(self, onnx_path, imgsz=640, threads=0):
+        """
+        Exported model on ONNX Runtime: preprocessing, head decoding and NMS run here.
+        Args:
+            onnx_path (str): Exported (optionally quantized) model.
+            imgsz (int): Inference size; must match the export unless it has dynamic axes.
+            threads (int): Intra-op threads (0 lets ONNX Runtime use all cores).
+        """
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports only accept their own batch size and image size
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        self.imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else imgsz
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else dict(enumerate(COCO_CLASSES))
+
+    def preprocess(self, images):
+        batch, transforms = [], []
+        for image in images:
+            padded, ratio, pad = letterbox(image, self.imgsz)
+            batch.append(padded[:, :, ::-1].transpose(2, 0, 1))
+            transforms.append((ratio, pad))
+        return np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0, transforms
+
+    def predict(self, images):
+        tensor, transforms = self.preprocess(images)
+        step = self.fixed_batch or len(images)
+        outputs = [
+            self.session.run(None, {self.input_name: tensor[start:start + step]})[0]
+            for start in range(0, len(images), step)
+        ]
+        output = np.concatenate(outputs)
+        return [
+            decode_predictions(output[i], ratio, pad, self.names)
+            for i, (ratio, pad) in enumerate(transforms)
+        ]
+
+def onnx_paths(model_path, imgsz):
+    """Files the exported and quantized models are cached in, next to the weights."""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}-{imgsz}.onnx", f"{stem}-{imgsz}.int8.onnx"
+
+@contextmanager
+def model_lock(onnx_path):
+    """
+    Exclusive lock on the cached models, held while they are exported or quantized:
+    workers that load the ONNX backend start together (no preload) and share the files.
+    """
+    with open(f"{onnx_path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def export_onnx(model_path, imgsz, onnx_path):
+    """
+    Export the PyTorch weights to ONNX with a dynamic batch axis.
+    Graph simplification is left to ONNX Runtime's optimizer (ORT_ENABLE_ALL).
+    Call it with model_lock held: the exporter always writes next to the weights.
+    """
+    exported = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=False)
+    os.replace(exported, onnx_path)
+    return onnx_path
+
+def quantize_onnx(onnx_path, int8_path):
+    """
+    Quantize weights to INT8 (dynamic activation quantization, so no calibration set is needed).
+    Accuracy can drop on small objects; bench_detector.py reports agreement with the float model.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    # Written aside then renamed, so a reader never sees a partial file
+    staging = f"{int8_path}.{os.getpid()}.tmp"
+    try:
+        quantize_dynamic(onnx_path, staging, weight_type=QuantType.QUInt8, per_channel=True)
+        os.replace(staging, int8_path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    return int8_path
+
+def create_backend(name, model_path, imgsz=640, threads=0):
+    """
+    Build a detector backend, exporting and quantizing the model on first use (or at
+    image build time, see the Dockerfile).
+    Args:
+        name (str): One of BACKENDS.
+        model_path (str): PyTorch weights the ONNX models are derived from.
+        imgsz (int): Inference size.
+        threads (int): Inference threads (0: library default).
+    Returns:
+        TorchBackend | OnnxBackend: Object with predict(images) -> detections per image.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    if name == "torch":
+        return TorchBackend(model_path, imgsz, threads)
+    onnx_path, int8_path = onnx_paths(model_path, imgsz)
+    # Checked with the lock held: another worker may have written them while this one waited
+    with model_lock(onnx_path):
+        if not os.path.exists(onnx_path):
+            logger.info(f"Exporting {model_path} to {onnx_path}")
+            export_onnx(model_path, imgsz, onnx_path)
+        if name == "onnx-int8" and not os.path.exists(int8_path):
+            logger.info(f"Quantizing {onnx_path} to {int8_path}")
+            quantize_onnx(onnx_path, int8_path)
+    return OnnxBackend(int8_path if name == "onnx-int8" else onnx_path, imgsz, threads)
@@ -8,25 +8,29 @@ load_dotenv()
 
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
 
 def validate_email(email: str) -> bool:
     """Validate email address format."""
     pattern = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
     return bool(re.match(pattern, email))
 
-def send_match_email(
+def build_match_email(
     to_email: str,
     item_description: str,
     match_description: str,
     similarity: float,
-    finder_email: str  
-):
-    """Send an email notification about a possible item match."""
+    finder_email: str
+) -> EmailMessage:
+    """Build the notification sent to the owner of a lost item."""
     if not validate_email(to_email):
         raise ValueError(f"Invalid email address: {to_email}")
 
-    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
-        raise ValueError("EMAIL_ADDRESS or EMAIL_PASSWORD not set in .env")
+    if not EMAIL_ADDRESS:
+        raise ValueError("EMAIL_ADDRESS not set in .env")
 
     subject = "🔍 Possible Match Found for Your Lost Item"
     body = f"""Hello,
@@ -49,13 +53,18 @@ Lost and Found Team
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body)
+    return msg
 
+def open_smtp_session() -> smtplib.SMTP:
+    """Open an authenticated SMTP session on the configured server, reusable for many messages."""
+    if SMTP_USE_SSL:
+        smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    else:
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=10) as smtp:
+        if EMAIL_PASSWORD:
             smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            smtp.send_message(msg)
-            print(f"Email successfully sent to {to_email}")
-            return True
-    except Exception as e:
-        print(f"Error sending email to {to_email}: {e}")
+    except Exception:
+        smtp.close()
         raise
+    return smtp
@@ -1,43 +1,212 @@
-from ultralytics import YOLO
+from ultralytics import __version__ as ULTRALYTICS_VERSION
 import cv2
 import numpy as np
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from lifecycle import LazyModel
+from detector_backends import create_backend
+from appearance import APPEARANCE_VERSION, embed_detections
+from instrumentation import count_model_call, timed
+
+class BatchingInferenceWorker:
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=10.0):
+        """
+        Dedicated inference thread that groups concurrent requests into one model call.
+        Args:
+            detector (YOLOv5Detector): Detector whose detect_batch runs the forward pass.
+            max_batch_size (int): Maximum number of images per model call.
+            max_wait_ms (float): How long to wait for more requests after the first one.
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._last_batch_size = 0
+        self._thread = threading.Thread(target=self._run, name="yolo-inference", daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """
+        Queue an image for detection.
+        Args:
+            image: Anything YOLOv5Detector.load accepts.
+        Returns:
+            concurrent.futures.Future: Resolves to the detections list.
+        """
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            images, futures = [], []
+            for image, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    images.append(self.detector.load(image))
+                    futures.append(future)
+                except Exception as e:
+                    future.set_exception(e)
+            if not images:
+                continue
+            with self._lock:
+                self._batch_sizes[len(images)] += 1
+                self._requests += len(images)
+                self._last_batch_size = len(images)
+            try:
+                results = self.detector.detect_batch(images)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, detections in zip(futures, results):
+                future.set_result(detections)
+
+    def stats(self):
+        """
+        Snapshot of the queue and batching metrics.
+        Returns:
+            dict: Queue depth, request/batch counters and the batch-size histogram.
+        """
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "requests": self._requests,
+                "batches": batches,
+                "avg_batch_size": self._requests / batches if batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            }
 
 class YOLOv5Detector:
-    def __init__(self, model_path='yolov5s.pt'):
+    def __init__(self, model_path='yolov5s.pt', max_batch_size=8, max_wait_ms=10.0, backend="torch", imgsz=640,
+                 threads=0):
         """
         Initialize YOLO model for object detection.
+        The weights are loaded on first use (or by warmup), not here.
         Args:
             model_path (str): Path to the YOLOv5 model (default: yolov5su.pt).
+            max_batch_size (int): Maximum images per batched forward pass in detect_async.
+            max_wait_ms (float): Batching window for detect_async, in milliseconds.
+            backend (str): Inference backend: torch, onnx or onnx-int8 (see detector_backends).
+            imgsz (int): Inference image size.
+            threads (int): Inference threads (0: library default).
+        """
+        self.model = LazyModel(lambda: create_backend(backend, model_path, imgsz, threads))
+        self.model_path = model_path
+        self.backend = backend
+        self.imgsz = imgsz
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    @property
+    def worker(self):
+        """Inference worker, started on first use."""
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = BatchingInferenceWorker(self, self.max_batch_size, self.max_wait_ms)
+        return self._worker
+
+    @property
+    def model_version(self):
+        """Identifies the weights and runtime that produced a detection, for cache keys."""
+        return f"{self.model_path}@ultralytics-{ULTRALYTICS_VERSION}/{self.backend}-{self.imgsz}/appearance-{APPEARANCE_VERSION}"
+
+    def load(self, image):
+        """
+        Get a BGR image from a path, an encoded in-memory buffer or a decoded array.
+        Encoded buffers are decoded with cv2.imdecode without copying the bytes.
+        Args:
+            image (str | bytes | bytearray | memoryview | np.ndarray): Image to load.
+        Returns:
+            np.ndarray: BGR image.
+        """
+        if isinstance(image, str):
+            img = cv2.imread(image)
+            if img is None:
+                raise ValueError(f"Could not read image at {image}")
+            return img
+        if isinstance(image, np.ndarray) and image.ndim == 3:
+            return image
+        buffer = np.frombuffer(memoryview(image), dtype=np.uint8)
+        img = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+        if img is None:
+            raise ValueError("Could not decode image buffer")
+        return img
+
+    def detect_batch(self, images):
+        """
+        Run a single forward pass over several images, then describe each confident crop.
+        Args:
+            images (list): Decoded BGR images.
+        Returns:
+            list: One detections list per input image: {"name", "confidence", "box"} dicts,
+            plus a packed float16 `embedding` of the crop for confident detections.
         """
-        self.model = YOLO(model_path)  # Use ultralytics.YOLO
+        count_model_call("detector", self.model)
+        with timed("yolo_inference"):
+            results = self.model.predict(images)
+        with timed("crop_embedding"):
+            return [embed_detections(image, detections) for image, detections in zip(images, results)]
+
+    def warmup(self):
+        """Load (or export) the model and run one dummy forward pass, so the first request pays neither."""
+        self.detect_batch([np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
 
     def detect(self, image_path):
         """
         Detect objects in an image.
         Args:
-            image_path (str): Path to the input image.
+            image_path (str | bytes | np.ndarray): Path to the input image, or anything load accepts.
         Returns:
-            list: List of dictionaries containing detected object labels and confidence scores.
+            list: List of dictionaries containing detected object labels, confidence scores,
+            boxes and crop embeddings (see detect_batch).
         """
-        # Read image
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Could not read image at {image_path}")
-        
-        # Perform detection
-        results = self.model(img)
-        
-        # Extract labels and confidence scores
-        detections = []
-        for result in results:
-            for box in result.boxes:
-                label = self.model.names[int(box.cls[0])]
-                conf = float(box.conf[0])
-                detections.append({"name": label, "confidence": conf})
-        
-        return detections
+        return self.detect_batch([self.load(image_path)])[0]
+
+    async def detect_async(self, image):
+        """
+        Detect objects without blocking the event loop.
+        The request is queued on the inference worker and batched with other
+        requests arriving within the batching window; decoding happens there too.
+        Args:
+            image (str | bytes | np.ndarray): Anything load accepts.
+        Returns:
+            list: Same as detect.
+        """
+        return await asyncio.wrap_future(self.worker.submit(image))
+
+    def stats(self):
+        """Queue depth and batch-size metrics of the inference worker."""
+        return self.worker.stats()
 
 if __name__ == "__main__":
     detector = YOLOv5Detector()
     detections = detector.detect('Backend/lost-and-found/data/sample_item.jpg')
-    print(detections)
\ No newline at end of file
+    print(detections)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+class JobQueue:
+    # Statuses of a claimed job, of a finished one and of one given up on; subclasses rename them
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, collection, max_attempts, base_delay, max_delay):
+        """
+        Durable queue of jobs stored in MongoDB. Workers claim due jobs atomically,
+        failed jobs are retried with exponential backoff, and jobs left claimed by a
+        crashed worker are returned to the queue.
+        Args:
+            collection: Async (Motor) collection holding the jobs.
+            max_attempts (int): Runs tried before a job is given up on.
+            base_delay (float): Backoff after the first failure, in seconds; doubles on each retry.
+            max_delay (float): Upper bound of the backoff, in seconds.
+        """
+        self.collection = collection
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+
+    def _new_job(self, now: datetime, **fields) -> dict:
+        """Document of a job due now, with the subclass fields."""
+        return {**fields, "status": PENDING, "attempts": 0, "next_attempt_at": now, "created_at": now}
+
+    async def claim(self, limit: int) -> list:
+        """
+        Atomically claim due jobs so concurrent workers never run one twice.
+        Args:
+            limit (int): Maximum number of jobs to claim.
+        Returns:
+            list: Claimed jobs, now in the RUNNING state.
+        """
+        claimed = []
+        now = datetime.utcnow()
+        while len(claimed) < limit:
+            job = await self.collection.find_one_and_update(
+                {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                {"$set": {"status": self.RUNNING, "claimed_at": now}},
+                sort=[("next_attempt_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                break
+            claimed.append(job)
+        return claimed
+
+    async def mark_failed(self, job: dict, error: str, permanent: bool = False):
+        """Schedule a retry with exponential backoff, or give up on the job."""
+        attempts = job.get("attempts", 0) + 1
+        update = {"attempts": attempts, "last_error": error}
+        if permanent or attempts >= self.max_attempts:
+            update["status"] = self.FAILED
+            update["finished_at"] = datetime.utcnow()
+        else:
+            delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+            update["status"] = PENDING
+            update["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=delay)
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+    async def requeue_stale(self, timeout: float) -> int:
+        """Return jobs stuck in RUNNING (e.g. after a crash) to the queue."""
+        result = await self.collection.update_many(
+            {"status": self.RUNNING, "claimed_at": {"$lt": datetime.utcnow() - timedelta(seconds=timeout)}},
+            {"$set": {"status": PENDING}}
+        )
+        return result.modified_count
+
+    async def stats(self) -> dict:
+        counts = {PENDING: 0, self.RUNNING: 0, self.DONE: 0, self.FAILED: 0}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+class QueueWorker:
+    def __init__(self, queue, batch_size, poll_interval, stale_timeout):
+        """
+        Background task draining a JobQueue: requeue stale jobs, run batches until the
+        queue is empty, then sleep until wake() or the next poll.
+        Args:
+            queue (JobQueue): Queue to drain.
+            batch_size (int): Jobs claimed per round.
+            poll_interval (float): Seconds between polls when nothing wakes the worker.
+            stale_timeout (float): Seconds after which a claimed but unfinished job is requeued.
+        """
+        self.queue = queue
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop after the batch in progress, if any. Cancelling the task would not stop a
+        batch running in a thread, and would leave its jobs claimed until requeued.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def wake(self):
+        """Run newly queued jobs without waiting for the next poll."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await self.queue.requeue_stale(self.stale_timeout)
+                while not self._stopping.is_set() and await self.run_once():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"{type(self).__name__} error: {e}")
+            await self._idle()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _idle(self):
+        """Called once the queue is drained, before sleeping."""
+
+    async def run_once(self) -> int:
+        """
+        Claim and process one batch of jobs.
+        Returns:
+            int: Number of jobs processed (done or failed).
+        """
+        raise NotImplementedError
@@ -0,0 +1,147 @@
+# Copied verbatim in lost-and-found and navigation-bot: each service is its own Docker
+# build context. Keep both copies identical, and service-specific code out of them.
+import asyncio
+import inspect
+import logging
+import threading
+import time
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+class LazyModel:
+    def __init__(self, factory):
+        """
+        Model created on first use, at most once, whichever thread gets there first.
+        Attribute access and calls are forwarded to the model, so it can stand in for it.
+        Args:
+            factory (callable): Builds the model.
+        """
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+class StartupTask:
+    def __init__(self, name, func, retry_interval=None):
+        """
+        One unit of startup work (load a model, connect a database...).
+        Args:
+            name (str): Component name reported by /readyz.
+            func (callable): Sync (run in a thread) or async function doing the work.
+            retry_interval (float): Seconds between attempts after a failure; None gives up after one.
+        """
+        self.name = name
+        self.func = func
+        self.retry_interval = retry_interval
+        self.state = PENDING
+        self.error = None
+        self.attempts = 0
+        self.seconds = None
+
+    @property
+    def is_async(self):
+        return inspect.iscoroutinefunction(self.func)
+
+    def _started(self):
+        self.state = LOADING
+        self.attempts += 1
+        return time.perf_counter()
+
+    def _finished(self, started, error=None):
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.error = None if error is None else f"{type(error).__name__}: {error}"
+        self.state = READY if error is None else FAILED
+
+    def run_sync(self):
+        started = self._started()
+        try:
+            self.func()
+        except Exception as e:
+            self._finished(started, e)
+            raise
+        self._finished(started)
+
+    async def run(self):
+        while True:
+            started = self._started()
+            try:
+                if self.is_async:
+                    await self.func()
+                else:
+                    await asyncio.to_thread(self.func)
+                self._finished(started)
+                logger.info(f"Startup: {self.name} ready in {self.seconds}s")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._finished(started, e)
+                logger.warning(f"Startup: {self.name} failed (attempt {self.attempts}): {self.error}")
+                if self.retry_interval is None:
+                    return
+            await asyncio.sleep(self.retry_interval)
+
+    def status(self):
+        return {"state": self.state, "attempts": self.attempts, "seconds": self.seconds, "error": self.error}
+
+class Startup:
+    def __init__(self):
+        """
+        Background startup: the app accepts connections immediately while models load
+        and warm up, and /readyz reports when every component is ready.
+        """
+        self.tasks = {}
+        self._running = []
+
+    def add(self, name, func, retry_interval=None):
+        self.tasks[name] = StartupTask(name, func, retry_interval)
+
+    def preload(self):
+        """
+        Run the sync tasks now, in the importing process.
+        With a pre-forking server (gunicorn --preload) the master loads the models once
+        and workers share the pages; a failure aborts the import, as a bad model should.
+        """
+        for task in self.tasks.values():
+            if not task.is_async and task.state != READY:
+                task.run_sync()
+
+    def start(self):
+        """Schedule the remaining tasks on the running event loop."""
+        self._running = [
+            asyncio.create_task(task.run()) for task in self.tasks.values() if task.state != READY
+        ]
+
+    async def stop(self):
+        for running in self._running:
+            running.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        self._running = []
+
+    @property
+    def ready(self):
+        return all(task.state == READY for task in self.tasks.values())
+
+    def status(self):
+        return {name: task.status() for name, task in self.tasks.items()}
@@ -1,21 +1,56 @@
-import uuid
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from image_recognition import YOLOv5Detector
-from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from datetime import datetime
 from enum import Enum
 import os
-import shutil
 import uvicorn
-from email_utils import send_match_email, validate_email
+from email_utils import validate_email
+from notifications import NotificationOutbox, NotificationWorker
+from match_worker import MatchJobQueue, MatchWorker
+from detection_cache import DetectionCache
+from appearance import AppearanceIndex, crop_similarity, split_embeddings
+from class_index import (
+    calculate_image_similarity, class_fields, class_mask, confident_classes, jaccard_many,
+    required_image_similarity, MASK_BYTES, MATCH_THRESHOLD
+)
+from text_matching import TextMatcher
+from repository import ItemRepository, CLAIMED, MATCHED, OPEN, OPEN_FILTER
+from archive import ARCHIVE_COLLECTION, COLD_DIR, CompactionWorker, ItemArchiver
+from lifecycle import Startup
+from instrumentation import configure_logging, instrument, timed
+from prometheus_client import Histogram
+from renditions import CachedStaticFiles, rendition_key, rendition_urls, write_renditions
+from contextlib import asynccontextmanager
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from typing import List, Optional
+import json
+import logging
+import numpy as np
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Models load in the background after startup (or before fork with PRELOAD_MODELS=1)
+startup = Startup()
+
+@asynccontextmanager
+async def lifespan(app):
+    startup.start()
+    yield
+    await startup.stop()
+    await match_worker.stop()
+    await notification_worker.stop()
+    await compaction_worker.stop()
 
-app = FastAPI(title="Lost and Found API")
-app.mount("/data", StaticFiles(directory="data"), name="data")
+app = FastAPI(title="Lost and Found API", lifespan=lifespan)
+app.mount("/data", CachedStaticFiles(directory="data"), name="data")
+instrument(app)
 
 # CORS
 app.add_middleware(
@@ -24,28 +59,131 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Request-ID"],
 )
 
-# MongoDB
+# MongoDB (the client connects lazily; an unreachable server only delays readiness)
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongodb:27017/")
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    client.server_info()
-    print(f"Successfully connected to MongoDB at {MONGO_URI}")
-except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-    print(f"Failed to connect to MongoDB at {MONGO_URI}: {e}")
-    raise Exception("Cannot connect to MongoDB")
-
-db = client["lost_and_found"]
-collection = db["items"]
-
-# YOLOv5 Detector
-try:
-    detector = YOLOv5Detector(model_path='yolov5su.pt')
-    print("Successfully loaded YOLOv5 model")
-except Exception as e:
-    print(f"Failed to load YOLOv5 model: {e}")
-    raise Exception("Cannot load YOLOv5 model")
+repository = ItemRepository.from_uri(MONGO_URI)
+
+async def prepare_database():
+    try:
+        await repository.ping()
+        logger.info(f"Successfully connected to MongoDB at {MONGO_URI}")
+    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+        logger.error(f"Failed to connect to MongoDB at {MONGO_URI}: {e}")
+        raise Exception("Cannot connect to MongoDB")
+    backfilled = await repository.ensure_indexes()
+    if backfilled:
+        logger.info(f"Backfilled class index for {backfilled} items")
+    backfilled = await repository.backfill_status()
+    if backfilled:
+        logger.info(f"Marked {backfilled} items without a status as open")
+    await outbox.ensure_indexes()
+    await match_jobs.ensure_indexes()
+    await archiver.ensure_indexes()
+    if appearance_index is not None:
+        with timed("appearance_index_load"):
+            indexed = await appearance_index.load(repository.items)
+        logger.info(f"Appearance index built from {indexed} items")
+    notification_worker.start()
+    match_worker.start()
+    compaction_worker.start()
+
+startup.add("mongodb", prepare_database, retry_interval=float(os.environ.get("MONGO_RETRY_SECONDS", "5")))
+
+# Match notifications are queued in MongoDB and sent by a background worker
+outbox = NotificationOutbox(
+    repository.collection("notifications"),
+    max_attempts=int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "5")),
+    base_delay=float(os.environ.get("NOTIFY_RETRY_BASE_SECONDS", "30"))
+)
+notification_worker = NotificationWorker(
+    outbox,
+    batch_size=int(os.environ.get("NOTIFY_BATCH_SIZE", "20")),
+    poll_interval=float(os.environ.get("NOTIFY_POLL_SECONDS", "2"))
+)
+
+# Matching runs in a background worker fed by a durable job queue
+match_jobs = MatchJobQueue(
+    repository.collection("match_jobs"),
+    max_attempts=int(os.environ.get("MATCH_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.environ.get("MATCH_RETRY_BASE_SECONDS", "5"))
+)
+match_worker = MatchWorker(
+    match_jobs,
+    lambda item_id: run_match_job(item_id),  # defined with the handlers below
+    batch_size=int(os.environ.get("MATCH_BATCH_SIZE", "10")),
+    poll_interval=float(os.environ.get("MATCH_POLL_SECONDS", "2")),
+    use_change_stream=os.environ.get("MATCH_CHANGE_STREAM", "1").lower() in ("1", "true", "yes")
+)
+
+# Expired items move to a cold collection and their photos to cold storage, off the hot path
+archiver = ItemArchiver(
+    repository.items,
+    repository.collection(ARCHIVE_COLLECTION),
+    open_ttl_days=float(os.environ.get("ARCHIVE_OPEN_AFTER_DAYS", "90")),
+    matched_ttl_days=float(os.environ.get("ARCHIVE_MATCHED_AFTER_DAYS", "30")),
+    claimed_ttl_days=float(os.environ.get("ARCHIVE_CLAIMED_AFTER_DAYS", "7")),
+    batch_size=int(os.environ.get("ARCHIVE_BATCH_SIZE", "500")),
+    cold_dir=os.environ.get("COLD_STORAGE_DIR", COLD_DIR)
+)
+compaction_worker = CompactionWorker(archiver, interval=float(os.environ.get("ARCHIVE_INTERVAL_SECONDS", "3600")))
+
+# YOLOv5 Detector (weights are loaded and warmed up by the startup task)
+detector = YOLOv5Detector(
+    model_path='yolov5su.pt',
+    max_batch_size=int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8")),
+    max_wait_ms=float(os.environ.get("INFERENCE_MAX_WAIT_MS", "10")),
+    backend=os.environ.get("DETECTOR_BACKEND", "torch"),
+    imgsz=int(os.environ.get("DETECTOR_IMGSZ", "640")),
+    threads=int(os.environ.get("DETECTOR_THREADS", "0"))
+)
+startup.add("detector", detector.warmup)
+
+detection_cache = DetectionCache(
+    collection=repository.collection("detection_cache"),
+    namespace=detector.model_version,
+    max_entries=int(os.environ.get("DETECTION_CACHE_SIZE", "1024"))
+)
+
+# Crop embeddings: candidates come from one vector search per detected class.
+# Each worker process holds its own index, kept up to date from MongoDB.
+appearance_index = None
+if os.environ.get("APPEARANCE_MATCHING", "1").lower() in ("1", "true", "yes"):
+    appearance_index = AppearanceIndex(
+        k=int(os.environ.get("APPEARANCE_CANDIDATES", "100")),
+        sync_lag=float(os.environ.get("APPEARANCE_SYNC_LAG_SECONDS", "30"))
+    )
+
+# Optional description similarity, mixed into the match score with this weight.
+# It must stay below the match threshold so a match always needs a shared class.
+TEXT_MATCH_WEIGHT = float(os.environ.get("TEXT_MATCH_WEIGHT", "0"))
+if not 0 <= TEXT_MATCH_WEIGHT < MATCH_THRESHOLD:
+    raise ValueError(f"TEXT_MATCH_WEIGHT must be in [0, {MATCH_THRESHOLD})")
+text_matcher = None
+if TEXT_MATCH_WEIGHT > 0:
+    text_matcher = TextMatcher(cache_size=int(os.environ.get("TEXT_EMBEDDING_CACHE_SIZE", "1024")))
+    startup.add("text_matcher", text_matcher.warmup)
+
+# Load the models at import time, so a pre-forking server shares them between workers
+if os.environ.get("PRELOAD_MODELS", "0").lower() in ("1", "true", "yes"):
+    startup.preload()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """
+    Readiness: MongoDB is reachable and every model is loaded and warmed up.
+    Returns 503 until then, so traffic is only routed to warm replicas.
+    """
+    if not startup.ready:
+        response.status_code = 503
+    return {"ready": startup.ready, "components": startup.status()}
 
 class Item(BaseModel):
     description: str
@@ -54,22 +192,45 @@ class ItemType(str, Enum):
     LOST = "lost"
     FOUND = "found"
 
-def calculate_image_similarity(detections1: list, detections2: list) -> float:
-    if not detections1 or not detections2:
-        return 0.0
-    try:
-        classes1 = {det["name"] for det in detections1 if det.get("confidence", 0) > 0.5}
-        classes2 = {det["name"] for det in detections2 if det.get("confidence", 0) > 0.5}
-    except KeyError:
-        return 0.0
-    if not classes1 or not classes2:
-        return 0.0
-    intersection = len(classes1.intersection(classes2))
-    union = len(classes1.union(classes2))
-    return intersection / union if union > 0 else 0.0
+class ItemStatus(str, Enum):
+    OPEN = OPEN
+    MATCHED = MATCHED
+    CLAIMED = CLAIMED
+
+class StatusUpdate(BaseModel):
+    status: ItemStatus
+
+@timed("file_write")
+def save_upload(file_path: str, contents: bytes) -> bool:
+    # Files are content-addressed, so an existing file already holds these bytes
+    if os.path.exists(file_path):
+        return False
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(contents)
+    os.chmod(file_path, 0o644)
+    return True
+
+def store_upload(file_path: str, contents: bytes, image=None):
+    """
+    Background part of an upload: the original, then its renditions.
+    Without a decoded image (detection cache hit) the photo was uploaded before and its
+    renditions exist, unless it was archived since: then the original is missing too.
+    """
+    if not save_upload(file_path, contents) and image is None:
+        return
+    if image is None:
+        try:
+            with timed("image_decode"):
+                image = detector.load(contents)
+        except ValueError:
+            logger.warning(f"Could not decode {file_path} for its renditions")
+            return
+    write_renditions(image, rendition_key(file_path))
 
 @app.post("/upload")
 async def upload_item(
+    background_tasks: BackgroundTasks,
     type: ItemType = Form(...),
     description: str = Form(...),
     location: str = Form(None),
@@ -81,15 +242,26 @@ async def upload_item(
     if type == ItemType.LOST:
         if not contactInfo or not validate_email(contactInfo):
             raise HTTPException(status_code=400, detail="Valid contact email is required for lost items")
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    file_path = f"data/{filename}"
-    os.makedirs('data', exist_ok=True)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    os.chmod(file_path, 0o644)
-    detections = detector.detect(file_path)
+    contents = await file.read()
+    digest = DetectionCache.content_hash(contents)
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".jpg"
+    file_path = f"data/{digest}{extension}"
+    # Detection runs on the in-memory upload; the original and its renditions are written after the response
+    detections = await detection_cache.get(digest)
+    image = None
+    if detections is None:
+        try:
+            with timed("image_decode"):
+                image = await run_in_threadpool(detector.load, contents)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Could not decode the uploaded image")
+        detections = await detector.detect_async(image)
+        await detection_cache.put(digest, detections)
     if not detections:
         raise HTTPException(status_code=400, detail="No objects detected in the image")
+    # Crop embeddings are stored apart from the detections the API returns
+    detections, crops = split_embeddings(detections)
+    background_tasks.add_task(store_upload, file_path, contents, image)
     item = {
         "type": type.value,
         "description": description,
@@ -97,72 +269,350 @@ async def upload_item(
         "contactInfo": contactInfo,
         "image_path": file_path,
         "detections": detections,
+        **class_fields(detections),
+        "crops": crops,
         "timestamp": datetime.utcnow().isoformat(),
+        "status": OPEN,
         "matches": []
     }
-    result = collection.insert_one(item)
-
-    # Match only if it's a FOUND item
-    if type == ItemType.FOUND:
-        matches = await match_item(detections)
-        if matches["matches"]:
-            item["matches"] = matches["matches"]
-            collection.update_one({"_id": result.inserted_id}, {"$set": {"matches": matches["matches"]}})
-            for match in matches["matches"]:
-                match_id = ObjectId(match["id"])
-                matched_item = collection.find_one({"_id": match_id})
-                if matched_item and matched_item.get("type") == "lost" and validate_email(matched_item.get("contactInfo", "")):
-                    send_match_email(
-                        to_email=matched_item["contactInfo"],
-                        item_description=matched_item["description"],
-                        match_description=description,
-                        similarity=match["similarity"],
-                        finder_email=contactInfo
-                    )
-                    collection.update_one(
-                        {"_id": match_id},
-                        {"$push": {
-                            "matches": {
-                                "id": str(result.inserted_id),
-                                "description": description,
-                                "similarity": match["similarity"],
-                                "finder_email": contactInfo,
-                                "type":matched_item.get("type")
-                            }
-                        }}
-                    )
-    return {"id": str(result.inserted_id), "detections": detections}
+    description_embedding = None
+    if text_matcher is not None:
+        # Stored once so matching never re-encodes this description
+        description_embedding = await run_in_threadpool(text_matcher.embed, description)
+        item["description_embedding"] = TextMatcher.pack(description_embedding)
+    with timed("mongo_insert"):
+        inserted_id = await repository.insert_item(item)
+    if appearance_index is not None:
+        appearance_index.add(inserted_id, type.value, crops)
+
+    # Matching runs in the match worker, in both directions; the client polls the job
+    job_id = await match_jobs.enqueue(inserted_id)
+    match_worker.wake()
+    return {"id": str(inserted_id), "detections": detections, "match_job_id": str(job_id)}
+
+ITEM_FIELDS = ("type", "description", "location", "contactInfo", "image_path", "timestamp", "status")
+HEAVY_FIELDS = ("detections", "matches")
+DEFAULT_PAGE_SIZE = int(os.environ.get("ITEMS_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.environ.get("ITEMS_MAX_PAGE_SIZE", "500"))
+
+def serialize_item(item: dict, include: tuple = ()) -> dict:
+    data = {
+        "id": str(item["_id"]),
+        "type": item["type"],
+        "description": item["description"],
+        "location": item.get("location"),
+        "contactInfo": item.get("contactInfo"),
+        "image_path": item.get("image_path"),
+        "renditions": rendition_urls(item["image_path"]) if item.get("image_path") else None,
+        "timestamp": item["timestamp"],
+        "status": item.get("status") or OPEN,
+    }
+    for field in include:
+        data[field] = item.get(field, [])
+    return data
+
+def parse_include(include: Optional[str]) -> tuple:
+    fields = tuple(field.strip() for field in (include or "").split(",") if field.strip())
+    unknown = [field for field in fields if field not in HEAVY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include fields: {', '.join(unknown)}")
+    return fields
 
 @app.get("/items")
-async def get_items():
-    items = collection.find()
-    return [
-        {
-            "id": str(item["_id"]),
-            "type": item["type"],
-            "description": item["description"],
-            "location": item.get("location"),
-            "contactInfo": item.get("contactInfo"),
-            "image_path": item.get("image_path"),
-            "detections": item.get("detections", []),
-            "timestamp": item["timestamp"],
-            "matches": item.get("matches", [])
-        } for item in items
+async def get_items(
+    response: Response,
+    type: Optional[ItemType] = None,
+    status: ItemStatus = ItemStatus.OPEN,
+    since: Optional[str] = Query(None, description="ISO timestamp, inclusive lower bound"),
+    until: Optional[str] = Query(None, description="ISO timestamp, exclusive upper bound"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    include: Optional[str] = Query(None, description="Comma-separated heavy fields: detections, matches"),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """
+    List items of one status (open by default), newest first, with keyset pagination on _id.
+    Heavy arrays (detections, matches) are only returned when listed in `include`.
+    With format=ndjson the documents are streamed one per line straight from the cursor.
+    """
+    fields = parse_include(include)
+    query = {}
+    if type is not None:
+        query["type"] = type.value
+    query["status"] = OPEN_FILTER["status"] if status == ItemStatus.OPEN else status.value
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if after:
+        try:
+            query["_id"] = {"$lt": ObjectId(after)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    projection = {field: 1 for field in ITEM_FIELDS + fields}
+
+    if format == "ndjson":
+        async def lines():
+            async for item in repository.list_items(query, projection, limit):
+                yield json.dumps(serialize_item(item, fields), default=str) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    items = [serialize_item(item, fields) async for item in repository.list_items(query, projection, page_size)]
+    if len(items) == page_size:
+        response.headers["X-Next-Cursor"] = items[-1]["id"]
+    return items
+
+@app.patch("/items/{item_id}/status")
+async def update_item_status(item_id: str, update: StatusUpdate):
+    """
+    Move an item through its lifecycle: open (matched and listed), matched (the owner
+    was put in touch with the finder) and claimed (returned). Only open items take part
+    in matching; matched and claimed items are archived after ARCHIVE_*_AFTER_DAYS.
+    """
+    try:
+        object_id = ObjectId(item_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid item id")
+    item = await repository.set_status(object_id, update.status.value, {field: 1 for field in ITEM_FIELDS})
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if update.status == ItemStatus.OPEN:
+        if appearance_index is not None:
+            # sync only reads recent ObjectIds: index the reopened item here
+            stored = await repository.find_items([object_id], {"type": 1, "crops": 1})
+            if stored and stored[0].get("crops"):
+                appearance_index.add(object_id, stored[0]["type"], stored[0]["crops"])
+        # A reopened item may match items uploaded while it was matched
+        await match_jobs.enqueue(object_id)
+        match_worker.wake()
+    elif appearance_index is not None:
+        appearance_index.remove(object_id)
+    return serialize_item(item)
+
+def class_scores(detections: list, classes: list, candidates: list) -> np.ndarray:
+    """
+    Image similarity of candidates by detected classes only.
+    Computed for all candidates at once from their packed class bitsets; items
+    without one fall back to calculate_image_similarity.
+    """
+    image_scores = np.zeros(len(candidates))
+    query_mask = class_mask(classes)
+    masked = [i for i, db_item in enumerate(candidates) if query_mask is not None and db_item.get("class_mask")]
+    if masked:
+        masks = np.frombuffer(b"".join(candidates[i]["class_mask"] for i in masked), dtype=np.uint8)
+        image_scores[masked] = jaccard_many(query_mask, masks.reshape(-1, MASK_BYTES))
+    for i in set(range(len(candidates))).difference(masked):
+        image_scores[i] = calculate_image_similarity(detections, candidates[i].get("detections", []))
+    return image_scores
+
+APPEARANCE_CANDIDATE_FIELDS = {"description": 1, "status": 1, "crops": 1}
+
+async def appearance_candidates(crops: list, detections: list, classes: list, item_type: str, threshold: float,
+                                use_text: bool):
+    """
+    Candidates of an item with crop embeddings: the open items the appearance index
+    returns, scored by crop_similarity, plus the items stored before crops existed,
+    found and scored by class as before.
+    Returns:
+        tuple: (candidates, image similarities).
+    """
+    await appearance_index.sync(repository.items)
+    projection = {**APPEARANCE_CANDIDATE_FIELDS, "description_embedding": 1} if use_text else APPEARANCE_CANDIDATE_FIELDS
+    candidates, kept = [], set()
+    stale = True
+    while stale:
+        with timed("appearance_search"):
+            item_ids = [item_id for item_id in appearance_index.search(item_type, crops, threshold) if item_id not in kept]
+        found = {db_item["_id"]: db_item for db_item in await repository.find_items(item_ids, projection)}
+        stale = False
+        for item_id in item_ids:
+            if item_id in found and (found[item_id].get("status") or OPEN) == OPEN:
+                candidates.append(found[item_id])
+                kept.add(item_id)
+            else:
+                # Matched, claimed or archived since it was indexed (possibly by another
+                # process): dropped, and searched again so it no longer takes one of the k slots
+                appearance_index.remove(item_id)
+                stale = True
+    image_scores = [crop_similarity(crops, db_item["crops"]) for db_item in candidates]
+
+    legacy = [
+        db_item async for db_item in repository.find_match_candidates(
+            classes, item_type, threshold=threshold, with_embeddings=use_text, without_crops=True
+        )
     ]
+    return candidates + legacy, np.concatenate([image_scores, class_scores(detections, classes, legacy)])
 
-@app.post("/match")
-async def match_item(detections: list):
-    candidates = collection.find({"type": "lost", "detections": {"$exists": True, "$ne": []}})
+# Candidates of the opposite type (found items for a lost one and vice versa) per match:
+# fetched from the class prefilter and appearance index, above the image threshold, matched
+MATCH_CANDIDATES = Histogram(
+    "match_candidates", "Candidate items of the opposite type per match, by step",
+    ["step"], buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000),
+)
+
+async def find_matches(detections: list, description_embedding=None, item_type: str = "lost", crops: list = None) -> list:
+    """
+    Open items of `item_type` similar to the given detections.
+    With crop embeddings (uploaded items), candidates come from the appearance index
+    and are scored by how alike the detected objects look; otherwise (/match, items
+    stored before crops existed) by the overlap of their detected classes.
+    When a description embedding is given, the score mixes image and text
+    similarity; text scores of all candidates come from one matrix product
+    against the embeddings stored at insert time.
+    """
+    classes = confident_classes(detections)
+    if not classes:
+        return []
+    use_text = description_embedding is not None
+    threshold = required_image_similarity(TEXT_MATCH_WEIGHT) if use_text else MATCH_THRESHOLD
+    if crops and appearance_index is not None:
+        candidates, image_scores = await appearance_candidates(crops, detections, classes, item_type, threshold, use_text)
+    else:
+        candidates = [
+            db_item async for db_item in
+            repository.find_match_candidates(classes, item_type, threshold=threshold, with_embeddings=use_text)
+        ]
+        image_scores = class_scores(detections, classes, candidates)
+    MATCH_CANDIDATES.labels("fetched").observe(len(candidates))
+    if not candidates:
+        return []
+
+    kept = np.flatnonzero(image_scores > threshold)
+    candidates = [candidates[i] for i in kept]
+    image_scores = image_scores[kept]
+    MATCH_CANDIDATES.labels("scored").observe(len(candidates))
+
+    if use_text:
+        text_scores = np.zeros(len(candidates), dtype=np.float32)
+        rows = [i for i, db_item in enumerate(candidates) if db_item.get("description_embedding")]
+        if rows:
+            matrix = np.stack([TextMatcher.unpack(candidates[i]["description_embedding"]) for i in rows])
+            text_scores[rows] = TextMatcher.score_batch(description_embedding, matrix)
+        scores = (1 - TEXT_MATCH_WEIGHT) * image_scores + TEXT_MATCH_WEIGHT * text_scores
+    else:
+        scores = image_scores
     matches = []
-    for db_item in candidates:
-        similarity = calculate_image_similarity(detections, db_item.get("detections", []))
-        if similarity > 0.5:
-            matches.append({
+    for i, db_item in enumerate(candidates):
+        if scores[i] > MATCH_THRESHOLD:
+            match = {
                 "id": str(db_item["_id"]),
                 "description": db_item["description"],
-                "similarity": similarity
+                "similarity": float(scores[i])
+            }
+            if use_text:
+                match["image_similarity"] = float(image_scores[i])
+                match["text_similarity"] = float(text_scores[i])
+            matches.append(match)
+    MATCH_CANDIDATES.labels("matched").observe(len(matches))
+    return matches
+
+MATCH_JOB_FIELDS = {
+    "type": 1, "description": 1, "contactInfo": 1, "detections": 1, "crops": 1, "status": 1, "description_embedding": 1
+}
+
+async def run_match_job(item_id) -> dict:
+    """
+    Match one item against the open items of the other type and record every pair
+    on both sides. Replaying a job changes nothing: match entries are only pushed
+    when missing and notifications are deduplicated per (lost, found) pair.
+    Args:
+        item_id (ObjectId): The item to match.
+    Returns:
+        dict: Job result, with the matches found and the number of match entries added (both sides).
+    """
+    item = await repository.find_item(item_id, MATCH_JOB_FIELDS)
+    if item is None or (item.get("status") or OPEN) != OPEN:
+        return {"matches": [], "matches_updated": 0}
+    description_embedding = None
+    if text_matcher is not None and item.get("description_embedding"):
+        description_embedding = TextMatcher.unpack(item["description_embedding"])
+    other_type = ItemType.FOUND.value if item["type"] == ItemType.LOST.value else ItemType.LOST.value
+    with timed("match_scan"):
+        matches = await find_matches(item.get("detections", []), description_embedding, other_type, item.get("crops"))
+    if not matches:
+        return {"matches": [], "matches_updated": 0}
+
+    similarities = {ObjectId(match["id"]): match["similarity"] for match in matches}
+    matched_items = await repository.find_items(list(similarities), {"type": 1, "description": 1, "contactInfo": 1})
+    updates, notifications, keys = [], [], []
+    for matched_item in matched_items:
+        lost, found = (item, matched_item) if item["type"] == ItemType.LOST.value else (matched_item, item)
+        similarity = similarities[matched_item["_id"]]
+        updates.append((found["_id"], {"id": str(lost["_id"]), "description": lost["description"], "similarity": similarity}))
+        updates.append((lost["_id"], {
+            "id": str(found["_id"]),
+            "description": found["description"],
+            "similarity": similarity,
+            "finder_email": found.get("contactInfo"),
+            "type": ItemType.FOUND.value
+        }))
+        if validate_email(lost.get("contactInfo") or ""):
+            notifications.append({
+                "to_email": lost["contactInfo"],
+                "item_description": lost["description"],
+                "match_description": found["description"],
+                "similarity": similarity,
+                "finder_email": found.get("contactInfo")
             })
+            keys.append(f"match:{lost['_id']}:{found['_id']}")
+    # Notifications first: a job that dies after them is replayed without emailing twice
+    if await outbox.enqueue_many(notifications, keys):
+        notification_worker.wake()
+    matches_updated = await repository.push_matches(updates)
+    return {"matches": matches, "matches_updated": matches_updated}
+
+@app.get("/match-jobs/stats")
+async def match_job_stats():
+    return {**await match_jobs.stats(), "change_stream": match_worker.change_stream_active}
+
+@app.get("/match-jobs/{job_id}")
+async def get_match_job(job_id: str):
+    """Status of the match job returned by /upload; `matches` is set once it is done."""
+    try:
+        job = await match_jobs.get(ObjectId(job_id))
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid job id")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Match job not found")
+    return {
+        "id": str(job["_id"]),
+        "item_id": str(job["item_id"]),
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"].isoformat(),
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+        "matches": job.get("matches"),
+        "matches_updated": job.get("matches_updated"),
+        "error": job.get("last_error"),
+    }
+
+@app.post("/match")
+async def match_item(detections: List[dict], description: Optional[str] = None):
+    description_embedding = None
+    if description and text_matcher is not None:
+        description_embedding = await run_in_threadpool(text_matcher.embed, description)
+    with timed("match_scan"):
+        matches = await find_matches(detections, description_embedding)
     return {"matches": matches}
 
+@app.get("/inference/stats")
+async def inference_stats():
+    return {
+        **detector.stats(),
+        "cache": detection_cache.stats(),
+        "appearance_index": appearance_index.stats() if appearance_index is not None else None,
+    }
+
+@app.get("/archive/stats")
+async def archive_stats():
+    return {"items": await repository.count_by_status(), **await archiver.stats()}
+
+@app.get("/notifications/stats")
+async def notification_stats():
+    return {**await outbox.stats(), "smtp_sessions_opened": notification_worker.sessions_opened}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
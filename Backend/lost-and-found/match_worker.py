@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import datetime
+from job_queue import JobQueue, QueueWorker
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class MatchJobQueue(JobQueue):
+    RUNNING = RUNNING
+    DONE = DONE
+    FAILED = FAILED
+
+    def __init__(self, collection, max_attempts=3, base_delay=5.0, max_delay=300.0):
+        """
+        Durable queue of match jobs stored in MongoDB, one job per uploaded item.
+        The job document doubles as the status the client polls. Matching is
+        idempotent, so a job requeued after a crash can safely run again.
+        Args:
+            collection: Async (Motor) collection holding the jobs.
+            max_attempts (int): Runs tried before a job is marked failed.
+            base_delay (float): Backoff after the first failure, in seconds; doubles on each retry.
+            max_delay (float): Upper bound of the backoff, in seconds.
+        """
+        super().__init__(collection, max_attempts, base_delay, max_delay)
+
+    async def enqueue(self, item_id):
+        """
+        Queue matching of one item.
+        Returns:
+            ObjectId: The job id.
+        """
+        result = await self.collection.insert_one(self._new_job(datetime.utcnow(), item_id=item_id))
+        return result.inserted_id
+
+    async def get(self, job_id):
+        return await self.collection.find_one({"_id": job_id})
+
+    async def mark_done(self, job: dict, result: dict):
+        await self.collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": DONE, "finished_at": datetime.utcnow(), **result}}
+        )
+
+class MatchWorker(QueueWorker):
+    def __init__(self, queue, handler, batch_size=10, poll_interval=2.0, stale_timeout=300.0, use_change_stream=True):
+        """
+        Background matcher draining the job queue.
+        New jobs are picked up right away: from wake() in the process that queued them,
+        from a change stream on the jobs collection in the others. Without change
+        streams (standalone server, tests) the queue is polled every `poll_interval`.
+        Args:
+            queue (MatchJobQueue): Queue to drain.
+            handler: Coroutine function taking an item id and returning the job result dict.
+            batch_size (int): Jobs claimed per round.
+            poll_interval (float): Seconds between polls when nothing wakes the worker.
+            stale_timeout (float): Seconds after which a claimed but unfinished job is requeued.
+            use_change_stream (bool): Watch the jobs collection for inserts.
+        """
+        super().__init__(queue, batch_size, poll_interval, stale_timeout)
+        self.handler = handler
+        self.use_change_stream = use_change_stream
+        self._watch_task = None
+        self.change_stream_active = False
+
+    def start(self):
+        if self._task is None:
+            super().start()
+            if self.use_change_stream:
+                self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        self.change_stream_active = False
+        await super().stop()
+
+    async def _watch(self):
+        try:
+            async with self.queue.collection.watch([{"$match": {"operationType": "insert"}}]) as stream:
+                self.change_stream_active = True
+                logger.info("Match worker following the job queue through a change stream")
+                async for _ in stream:
+                    self.wake()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Change streams need a replica set; polling still picks every job up
+            logger.info(f"Change stream unavailable ({e}), polling match jobs every {self.poll_interval}s")
+        self.change_stream_active = False
+
+    async def run_once(self) -> int:
+        """
+        Claim and run one batch of jobs.
+        Returns:
+            int: Number of jobs processed (done or failed).
+        """
+        jobs = await self.queue.claim(self.batch_size)
+        for job in jobs:
+            try:
+                result = await self.handler(job["item_id"])
+            except Exception as e:
+                logger.exception(f"Match job {job['_id']} failed: {e}")
+                await self.queue.mark_failed(job, str(e))
+                continue
+            await self.queue.mark_done(job, result)
+        return len(jobs)
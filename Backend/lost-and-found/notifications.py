@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import smtplib
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+import email_utils
+from instrumentation import timed
+from job_queue import JobQueue, QueueWorker
+
+logger = logging.getLogger(__name__)
+
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+class NotificationOutbox(JobQueue):
+    RUNNING = SENDING
+    DONE = SENT
+    FAILED = DEAD
+
+    def __init__(self, collection, max_attempts=5, base_delay=30.0, max_delay=3600.0):
+        """
+        Durable queue of match notifications stored in MongoDB. Messages that fail
+        max_attempts times, or permanently, are dead-lettered.
+        Args:
+            collection: Async (Motor) collection holding the messages.
+            max_attempts (int): Deliveries tried before a message is dead-lettered.
+            base_delay (float): Backoff after the first failure, in seconds; doubles on each retry.
+            max_delay (float): Upper bound of the backoff, in seconds.
+        """
+        super().__init__(collection, max_attempts, base_delay, max_delay)
+
+    async def ensure_indexes(self):
+        await super().ensure_indexes()
+        await self.collection.create_index("key", unique=True, sparse=True)
+
+    async def enqueue_many(self, payloads: list, keys: list = None) -> int:
+        """
+        Queue match emails for delivery.
+        Args:
+            payloads (list): Keyword arguments of email_utils.build_match_email, one dict per message.
+            keys (list): Optional deduplication key per message; a message whose key was
+                already queued is skipped, so retried producers never send an email twice.
+        Returns:
+            int: Number of queued messages.
+        """
+        if not payloads:
+            return 0
+        now = datetime.utcnow()
+        messages = [self._new_job(now, payload=payload) for payload in payloads]
+        for message, key in zip(messages, keys or []):
+            message["key"] = key
+        try:
+            await self.collection.insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+            return e.details["nInserted"]
+        return len(messages)
+
+    async def mark_sent(self, message_ids: list):
+        if message_ids:
+            await self.collection.update_many(
+                {"_id": {"$in": message_ids}},
+                {"$set": {"status": SENT, "sent_at": datetime.utcnow()}}
+            )
+
+class NotificationWorker(QueueWorker):
+    def __init__(self, outbox, batch_size=20, poll_interval=2.0, idle_timeout=30.0, stale_timeout=300.0):
+        """
+        Background sender draining the outbox over one reused SMTP session.
+        Args:
+            outbox (NotificationOutbox): Queue to drain.
+            batch_size (int): Messages claimed and sent per round.
+            poll_interval (float): Seconds between polls when the outbox is empty.
+            idle_timeout (float): Seconds of inactivity after which the SMTP session is closed.
+            stale_timeout (float): Seconds after which a claimed but unsent message is requeued.
+        """
+        super().__init__(outbox, batch_size, poll_interval, stale_timeout)
+        self.idle_timeout = idle_timeout
+        self._session = None
+        self._session_used_at = 0.0
+        self.sessions_opened = 0
+
+    async def stop(self):
+        # The batch being sent finishes first: the session is never closed under it
+        await super().stop()
+        await asyncio.to_thread(self._close_session)
+
+    async def _idle(self):
+        if self._session is not None and asyncio.get_running_loop().time() - self._session_used_at > self.idle_timeout:
+            await asyncio.to_thread(self._close_session)
+
+    async def run_once(self) -> int:
+        """
+        Claim and send one batch.
+        Returns:
+            int: Number of messages processed (sent or failed).
+        """
+        messages = await self.queue.claim(self.batch_size)
+        if not messages:
+            return 0
+        sent, failed = await asyncio.to_thread(self._send_batch, messages)
+        self._session_used_at = asyncio.get_running_loop().time()
+        await self.queue.mark_sent(sent)
+        for message, error, permanent in failed:
+            await self.queue.mark_failed(message, error, permanent)
+        return len(messages)
+
+    def _open_session(self):
+        self._session = email_utils.open_smtp_session()
+        self.sessions_opened += 1
+
+    def _check_session(self):
+        # One NOOP per batch detects connections the server dropped while idle
+        if self._session is not None:
+            try:
+                self._session.noop()
+            except (smtplib.SMTPException, OSError):
+                self._close_session()
+
+    def _close_session(self):
+        if self._session is not None:
+            try:
+                self._session.quit()
+            except Exception:
+                pass
+            self._session = None
+
+    def _send_batch(self, messages):
+        sent, failed = [], []
+        self._check_session()
+        for index, message in enumerate(messages):
+            try:
+                email = email_utils.build_match_email(**message["payload"])
+            except Exception as e:
+                # A message that cannot be built will never succeed
+                failed.append((message, str(e), True))
+                continue
+            if self._session is None:
+                try:
+                    self._open_session()
+                except Exception as e:
+                    # Server unreachable: the rest of the batch would fail the same way
+                    failed.extend((pending, str(e), False) for pending in messages[index:])
+                    break
+            try:
+                with timed("email_send"):
+                    self._session.send_message(email)
+                sent.append(message["_id"])
+            except Exception as e:
+                # Drop the session so the next message starts from a fresh connection
+                self._close_session()
+                failed.append((message, str(e), False))
+        return sent, failed
@@ -0,0 +1,128 @@
+import glob
+import logging
+import os
+import re
+import sys
+import cv2
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+from instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "data"
+RENDITIONS_DIR = os.path.join(DATA_DIR, "renditions")
+# Longest side in pixels; images are never upscaled
+RENDITION_SIZES = {"thumbnail": 320, "medium": 1280}
+RENDITION_FORMATS = {
+    "webp": (".webp", [cv2.IMWRITE_WEBP_QUALITY, 80]),
+    "jpeg": (".jpg", [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_PROGRESSIVE, 1]),
+}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+# Uploads are named after the SHA-256 of their bytes, so their content never changes
+CONTENT_ADDRESSED = re.compile(r"[0-9a-f]{64}")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE_SECONDS", "86400"))
+
+def rendition_key(image_path: str) -> str:
+    """Renditions are named after the original's file name without extension (its digest for new uploads)."""
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+def rendition_path(key: str, size: str, fmt: str) -> str:
+    return os.path.join(RENDITIONS_DIR, f"{key}-{size}{RENDITION_FORMATS[fmt][0]}")
+
+def rendition_urls(image_path: str) -> dict:
+    """
+    URLs of the derived images of an item, for the /data static mount.
+    Args:
+        image_path (str): Stored path of the original image.
+    Returns:
+        dict: {size: {format: url}}, e.g. urls["thumbnail"]["webp"].
+    """
+    key = rendition_key(image_path)
+    return {
+        size: {fmt: "/" + rendition_path(key, size, fmt).replace(os.sep, "/") for fmt in RENDITION_FORMATS}
+        for size in RENDITION_SIZES
+    }
+
+def resize(image, max_side: int):
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    # INTER_AREA averages source pixels, which avoids aliasing when shrinking
+    return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+@timed("renditions")
+def write_renditions(image, key: str) -> int:
+    """
+    Write every missing rendition of a decoded image. Runs as a background task
+    on the array the upload already decoded for detection; files are written
+    atomically, so concurrent uploads of the same photo are harmless.
+    Args:
+        image (np.ndarray): Decoded BGR original.
+        key (str): rendition_key of the original.
+    Returns:
+        int: Number of files written.
+    """
+    os.makedirs(RENDITIONS_DIR, exist_ok=True)
+    written = 0
+    for size, max_side in RENDITION_SIZES.items():
+        resized = None
+        for fmt, (extension, params) in RENDITION_FORMATS.items():
+            path = rendition_path(key, size, fmt)
+            if os.path.exists(path):
+                continue
+            if resized is None:
+                resized = resize(image, max_side)
+            ok, encoded = cv2.imencode(extension, resized, params)
+            if not ok:
+                logger.warning(f"Could not encode {path}")
+                continue
+            staging = f"{path}.{os.getpid()}.tmp"
+            with open(staging, "wb") as f:
+                f.write(encoded.tobytes())
+            os.chmod(staging, 0o644)
+            os.replace(staging, path)
+            written += 1
+    return written
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with browser caching. Content-addressed uploads and renditions never
+    change, so they are cached for a year with their file name as a strong ETag;
+    other files get STATIC_MAX_AGE and Starlette's mtime/size ETag.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        name = os.path.basename(full_path)
+        in_renditions = os.path.basename(os.path.dirname(full_path)) == os.path.basename(RENDITIONS_DIR)
+        if in_renditions or CONTENT_ADDRESSED.fullmatch(rendition_key(name)):
+            response.headers["etag"] = f'"{name}"'
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = f"public, max-age={STATIC_MAX_AGE}"
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+def backfill(data_dir=DATA_DIR):
+    """Generate the missing renditions of every stored original (images uploaded before renditions existed)."""
+    written = 0
+    for path in sorted(glob.glob(os.path.join(data_dir, "*"))):
+        if not path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        written += write_renditions(image, rendition_key(path))
+    print(f"Wrote {written} rendition file(s)")
+    return written
+
+if __name__ == "__main__":
+    backfill(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR)
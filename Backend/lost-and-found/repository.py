@@ -0,0 +1,169 @@
+import os
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from class_index import candidate_query, ensure_class_index, MATCH_THRESHOLD
+
+DATABASE_NAME = "lost_and_found"
+
+# Item lifecycle: open items are matched and listed; matched and claimed items wait for archival
+OPEN = "open"
+MATCHED = "matched"
+CLAIMED = "claimed"
+STATUSES = (OPEN, MATCHED, CLAIMED)
+# Items written before the status field existed count as open (null also matches a missing field)
+OPEN_FILTER = {"status": {"$in": [OPEN, None]}}
+
+def create_client(uri: str) -> AsyncIOMotorClient:
+    """
+    Create the pooled async MongoDB client.
+    Pool size, timeouts and read preference come from the environment so they
+    can be tuned per deployment without code changes.
+    Args:
+        uri (str): MongoDB connection string.
+    Returns:
+        AsyncIOMotorClient: Lazily connecting client.
+    """
+    return AsyncIOMotorClient(
+        uri,
+        maxPoolSize=int(os.environ.get("MONGO_MAX_POOL_SIZE", "50")),
+        minPoolSize=int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+        maxIdleTimeMS=int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "60000")),
+        waitQueueTimeoutMS=int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+        serverSelectionTimeoutMS=int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        connectTimeoutMS=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        socketTimeoutMS=int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "10000")),
+        readPreference=os.environ.get("MONGO_READ_PREFERENCE", "primaryPreferred"),
+    )
+
+class ItemRepository:
+    def __init__(self, db):
+        """
+        Async data access for lost and found items.
+        Args:
+            db: Motor database (or an in-process fake with the same API in tests).
+        """
+        self.db = db
+        self.items = db["items"]
+
+    @classmethod
+    def from_uri(cls, uri: str, database: str = DATABASE_NAME):
+        return cls(create_client(uri)[database])
+
+    def collection(self, name: str):
+        """Other collections of the same database (caches, queues...)."""
+        return self.db[name]
+
+    async def ping(self):
+        """Raise if the server is unreachable."""
+        await self.db.command("ping")
+
+    async def ensure_indexes(self) -> int:
+        """
+        Create the indexes the handlers rely on and backfill the class index.
+        Returns:
+            int: Number of items whose class index was backfilled.
+        """
+        await self.items.create_index([("type", ASCENDING), ("_id", DESCENDING)])
+        await self.items.create_index([("type", ASCENDING), ("status", ASCENDING), ("timestamp", ASCENDING)])
+        # Archival checks whether a content-addressed image is still used by another item
+        await self.items.create_index([("image_path", ASCENDING)])
+        # Reopened items, read by the appearance index sync
+        await self.items.create_index([("status", ASCENDING), ("status_changed_at", ASCENDING)])
+        return await ensure_class_index(self.items)
+
+    async def backfill_status(self) -> int:
+        """
+        Mark items that predate the lifecycle as open.
+        Returns:
+            int: Number of updated items.
+        """
+        result = await self.items.update_many({"status": {"$exists": False}}, {"$set": {"status": OPEN}})
+        return result.modified_count
+
+    async def insert_item(self, item: dict):
+        result = await self.items.insert_one(item)
+        return result.inserted_id
+
+    async def find_item(self, item_id, projection: dict = None):
+        return await self.items.find_one({"_id": item_id}, projection)
+
+    async def find_items(self, item_ids: list, projection: dict = None) -> list:
+        """
+        Fetch several items in one round trip.
+        Args:
+            item_ids (list): ObjectIds to fetch.
+            projection (dict): Optional projection.
+        Returns:
+            list: Found documents, in no particular order.
+        """
+        if not item_ids:
+            return []
+        return await self.items.find({"_id": {"$in": item_ids}}, projection).to_list(length=None)
+
+    async def push_matches(self, updates: list) -> int:
+        """
+        Append match entries to several items with a single bulk write.
+        An item that already lists the matched id is left alone, so replaying
+        the same updates is harmless.
+        Args:
+            updates (list): (item_id, match) pairs.
+        Returns:
+            int: Number of documents modified.
+        """
+        if not updates:
+            return 0
+        operations = [
+            UpdateOne({"_id": item_id, "matches.id": {"$ne": match["id"]}}, {"$push": {"matches": match}})
+            for item_id, match in updates
+        ]
+        result = await self.items.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    async def set_status(self, item_id, status: str, projection: dict = None):
+        """
+        Move an item to another lifecycle status.
+        Returns:
+            dict: The updated item, or None if it does not exist.
+        """
+        return await self.items.find_one_and_update(
+            {"_id": item_id},
+            {"$set": {"status": status, "status_changed_at": datetime.utcnow().isoformat()}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def count_by_status(self) -> dict:
+        counts = {status: 0 for status in STATUSES}
+        async for row in self.items.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"] or OPEN] = counts.get(row["_id"] or OPEN, 0) + row["count"]
+        return counts
+
+    def list_items(self, query: dict, projection: dict, limit: int = None):
+        """
+        Items matching `query`, newest first.
+        Returns:
+            Async cursor, iterated with `async for`.
+        """
+        cursor = self.items.find(query, projection).sort("_id", DESCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    def find_match_candidates(self, classes: list, item_type: str = "lost", threshold: float = MATCH_THRESHOLD,
+                              with_embeddings: bool = False, without_crops: bool = False):
+        """
+        Open items of `item_type` whose image similarity with `classes` can exceed `threshold`.
+        Args:
+            without_crops (bool): Only items without crop embeddings, the ones the appearance index cannot find.
+        Returns:
+            Async cursor over candidates with their description, detections, class mask and,
+            if requested, their stored description embedding.
+        """
+        projection = {"description": 1, "detections": 1, "class_mask": 1}
+        if with_embeddings:
+            projection["description_embedding"] = 1
+        query = {**candidate_query(classes, item_type, threshold), **OPEN_FILTER}
+        if without_crops:
+            query["crops.0"] = {"$exists": False}
+        return self.items.find(query, projection)
@@ -1,38 +1,56 @@
+import numpy as np
 import pytest
-from pymongo import MongoClient
 from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+import main
 from main import app
-from unittest.mock import patch
+from repository import ItemRepository
+from notifications import NotificationOutbox
+from archive import ARCHIVE_COLLECTION, ItemArchiver
+from match_worker import MatchJobQueue, MatchWorker
+from appearance import AppearanceIndex
 
 @pytest.fixture(scope="module")
 def client():
     return TestClient(app)
 
-@pytest.fixture(scope="module")
+@pytest.fixture
 def mongo_db():
-    # Connexion à MongoDB dans l'environnement Docker
-    client = MongoClient("mongodb://mongodb:27017")
-    db = client["test_db"]
-    yield db
-    # Nettoyage après les tests
-    client.drop_database("test_db")
-    client.close()
+    # Base MongoDB en mémoire (API Motor), recréée pour chaque test
+    return AsyncMongoMockClient()["test_db"]
+
+@pytest.fixture(autouse=True)
+def repository(mongo_db, monkeypatch):
+    # Remplace le dépôt de l'application par le faux en mémoire
+    repository = ItemRepository(mongo_db)
+    monkeypatch.setattr(main, "repository", repository)
+    monkeypatch.setattr(main.detection_cache, "collection", repository.collection("detection_cache"))
+    monkeypatch.setattr(main, "outbox", NotificationOutbox(repository.collection("notifications")))
+    monkeypatch.setattr(main, "archiver", ItemArchiver(repository.items, repository.collection(ARCHIVE_COLLECTION)))
+    match_jobs = MatchJobQueue(repository.collection("match_jobs"), base_delay=0)
+    monkeypatch.setattr(main, "match_jobs", match_jobs)
+    monkeypatch.setattr(main, "match_worker", MatchWorker(match_jobs, main.run_match_job))
+    monkeypatch.setattr(main, "appearance_index", AppearanceIndex())
+    return repository
+
+@pytest.fixture
+def collection(repository):
+    return repository.items
 
 @pytest.fixture
-def collection(mongo_db):
-    collection = mongo_db["items"]
-    collection.delete_many({})  # Nettoyer la collection avant chaque test
-    return collection
+def match_worker():
+    # Le worker n'est pas démarré : les tests traitent la file avec run_once()
+    return main.match_worker
 
 @pytest.fixture
 def mock_yolo_detector(monkeypatch):
-    # Simuler le détecteur YOLOv5
-    def mock_detect(file_path):
+    # Simuler le détecteur YOLOv5 (et le décodage, les images de test étant factices)
+    async def mock_detect_async(self, image):
         return [{"name": "wallet", "confidence": 0.9}]
-    monkeypatch.setattr("main.YOLOv5Detector.detect", mock_detect)
+    monkeypatch.setattr("main.YOLOv5Detector.load", lambda self, image: np.zeros((8, 8, 3), dtype=np.uint8))
+    monkeypatch.setattr("main.YOLOv5Detector.detect_async", mock_detect_async)
 
 @pytest.fixture
 def mock_email_utils(monkeypatch):
-    # Simuler l'envoi d'email et la validation
+    # Simuler la validation des emails
     monkeypatch.setattr("main.validate_email", lambda x: True)
-    monkeypatch.setattr("main.send_match_email", lambda to_email, item_description, match_description, similarity: None)
\ No newline at end of file
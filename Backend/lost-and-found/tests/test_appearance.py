@@ -0,0 +1,147 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+import pytest
+from bson.objectid import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from appearance import (
+    EMBEDDING_DIM, AppearanceIndex, appearance_embedding, crop_similarity, embed_detections, pack,
+    split_embeddings, unpack
+)
+
+
+def bag_photo(color, background, noise=0.0, shift=0, seed=0):
+    # Un sac (avec une poche et une bretelle) sur un fond uni ; renvoie l'image et la boîte
+    image = np.full((240, 320, 3), background, dtype=np.uint8)
+    cv2.rectangle(image, (100 + shift, 60), (220 + shift, 200), color, -1)
+    cv2.rectangle(image, (130 + shift, 90), (190 + shift, 130), tuple(int(c * 0.6) for c in color), -1)
+    cv2.line(image, (110 + shift, 60), (110 + shift, 20), (30, 30, 30), 4)
+    if noise:
+        image = np.clip(image + np.random.default_rng(seed).normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+    return image, [90 + shift, 15, 230 + shift, 205]
+
+
+def crops(name, *vectors):
+    return [{"name": name, "embedding": pack(vector)} for vector in vectors]
+
+
+def unit(*values):
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+def test_same_object_is_closer_than_same_class_in_another_colour():
+    # Le même sac photographié ailleurs ressemble plus à lui-même qu'un sac d'une autre couleur
+    blue = appearance_embedding(*bag_photo((200, 40, 40), (230, 230, 230)))
+    blue_elsewhere = appearance_embedding(*bag_photo((190, 50, 45), (60, 120, 60), noise=12, shift=20))
+    red = appearance_embedding(*bag_photo((40, 40, 200), (230, 230, 230)))
+
+    assert blue.shape == (EMBEDDING_DIM,)
+    assert np.linalg.norm(blue) == pytest.approx(1.0, abs=1e-5)
+    assert blue @ blue_elsewhere > 0.7
+    assert blue @ red < 0.5
+
+
+def test_empty_box_has_no_embedding():
+    image = np.zeros((20, 20, 3), dtype=np.uint8)
+    assert appearance_embedding(image, [30, 30, 40, 40]) is None
+    assert appearance_embedding(image, [5, 5, 5, 12]) is None
+
+
+def test_embeddings_are_stored_as_float16():
+    vector = appearance_embedding(*bag_photo((200, 40, 40), (230, 230, 230)))
+    data = pack(vector)
+    assert len(data) == EMBEDDING_DIM * 2
+    assert np.allclose(unpack(data), vector, atol=1e-3)
+
+
+def test_only_confident_boxed_detections_are_embedded():
+    image, box = bag_photo((200, 40, 40), (230, 230, 230))
+    detections = embed_detections(image, [
+        {"name": "backpack", "confidence": 0.9, "box": box},
+        {"name": "person", "confidence": 0.3, "box": box},
+        {"name": "cup", "confidence": 0.8},
+    ])
+    public, item_crops = split_embeddings(detections)
+
+    assert [c["name"] for c in item_crops] == ["backpack"]
+    # Les détections renvoyées par l'API ne contiennent pas les embeddings
+    assert public == [
+        {"name": "backpack", "confidence": 0.9, "box": box},
+        {"name": "person", "confidence": 0.3, "box": box},
+        {"name": "cup", "confidence": 0.8},
+    ]
+
+
+def test_crop_similarity_is_a_soft_jaccard():
+    # Objets identiques : égale au Jaccard des classes ; seules les classes communes sont comparées
+    a, b = unit(1, 0), unit(0, 1)
+    assert crop_similarity(crops("backpack", a), crops("backpack", a)) == pytest.approx(1.0, abs=1e-3)
+    assert crop_similarity(crops("backpack", a) + crops("bottle", a), crops("backpack", a)) == pytest.approx(2 / 3, abs=1e-3)
+    assert crop_similarity(crops("backpack", a), crops("backpack", b)) == pytest.approx(0.0, abs=1e-3)
+    assert crop_similarity(crops("backpack", a), crops("handbag", a)) == 0.0
+    assert crop_similarity(crops("backpack", a), []) == 0.0
+
+
+def test_index_searches_per_type_and_class():
+    index = AppearanceIndex(k=10)
+    close, far, other_class, other_type = ObjectId(), ObjectId(), ObjectId(), ObjectId()
+    index.add(close, "lost", crops("backpack", unit(1, 0.1)))
+    index.add(far, "lost", crops("backpack", unit(0, 1)))
+    index.add(other_class, "lost", crops("handbag", unit(1, 0)))
+    index.add(other_type, "found", crops("backpack", unit(1, 0)))
+    # Un objet déjà indexé n'est pas ajouté deux fois
+    assert not index.add(close, "lost", crops("backpack", unit(1, 0)))
+
+    assert index.search("lost", crops("backpack", unit(1, 0)), threshold=0.5) == [close]
+    assert index.search("lost", crops("backpack", unit(1, 1)), threshold=0.5) == [close, far]
+    assert index.search("lost", crops("bottle", unit(1, 0)), threshold=0.5) == []
+
+    index.remove(close)
+    assert index.search("lost", crops("backpack", unit(1, 0)), threshold=0.5) == []
+    assert index.stats() == {"items": 3, "crops": 3, "indexes": 3, "bytes": 3 * EMBEDDING_DIM * 2}
+
+
+@pytest.mark.asyncio
+async def test_index_loads_and_syncs_from_mongodb():
+    # Les objets insérés par un autre processus sont ajoutés à la recherche suivante
+    items = AsyncMongoMockClient()["test_db"]["items"]
+    stored = await items.insert_one({"type": "lost", "crops": crops("backpack", unit(1, 0))})
+    await items.insert_one({"type": "lost", "crops": []})
+    index = AppearanceIndex()
+    assert await index.load(items) == 1
+
+    other_process = await items.insert_one({"type": "lost", "crops": crops("backpack", unit(1, 0.2))})
+    await items.insert_one({"type": "lost", "description": "before crops existed"})
+    assert await index.sync(items) == 1
+    assert await index.sync(items) == 0
+    found = index.search("lost", crops("backpack", unit(1, 0)), threshold=0.5)
+    assert found == [stored.inserted_id, other_process.inserted_id]
+
+
+@pytest.mark.asyncio
+async def test_sync_indexes_open_and_reopened_items_only():
+    # Les objets qui ne sont plus ouverts ne sont pas indexés ; un objet rouvert l'est à nouveau,
+    # même si son ObjectId est plus ancien que la fenêtre de synchronisation
+    items = AsyncMongoMockClient()["test_db"]["items"]
+    old_id = ObjectId.from_datetime(datetime.utcnow() - timedelta(days=1))
+    await items.insert_one({"_id": old_id, "type": "lost", "status": "matched", "crops": crops("backpack", unit(1, 0))})
+    matched = await items.insert_one({"type": "lost", "status": "claimed", "crops": crops("backpack", unit(1, 0.1))})
+    await items.insert_one({"type": "lost", "status": "open", "crops": []})
+    index = AppearanceIndex()
+    assert await index.load(items) == 0
+    assert await index.sync(items) == 0
+    # Les objets sans crops ne sont pas conservés dans l'index
+    assert len(index) == 0
+
+    await items.update_one({"_id": old_id}, {"$set": {"status": "open", "status_changed_at": datetime.utcnow().isoformat()}})
+    assert await index.sync(items) == 1
+    assert index.search("lost", crops("backpack", unit(1, 0)), threshold=0.5) == [old_id]
+    assert matched.inserted_id not in index.search("lost", crops("backpack", unit(1, 0.1)), threshold=0.5)
+    assert len(index) == 1
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from archive import ItemArchiver
+from renditions import rendition_path, write_renditions
+
+NOW = datetime(2024, 6, 1)
+DIGEST = "b" * 64
+
+
+@pytest.fixture
+def archiver(tmp_path, monkeypatch):
+    # Répertoire de travail temporaire : data/ et cold/ y sont créés
+    monkeypatch.chdir(tmp_path)
+    db = AsyncMongoMockClient()["test_db"]
+    return ItemArchiver(db["items"], db["items_archive"], batch_size=2)
+
+
+def item(description, days_old, status="open", image_path=None, changed_days_ago=None):
+    document = {
+        "type": "lost",
+        "description": description,
+        "timestamp": (NOW - timedelta(days=days_old)).isoformat(),
+        "status": status,
+        "image_path": image_path,
+    }
+    if changed_days_ago is not None:
+        document["status_changed_at"] = (NOW - timedelta(days=changed_days_ago)).isoformat()
+    return document
+
+
+def store_image(name):
+    os.makedirs("data", exist_ok=True)
+    image = np.full((40, 60, 3), 128, dtype=np.uint8)
+    cv2.imwrite(f"data/{name}.jpg", image)
+    write_renditions(image, name)
+    return f"data/{name}.jpg"
+
+
+@pytest.mark.asyncio
+async def test_compact_archives_expired_items(archiver):
+    # Les éléments ouverts trop anciens et les éléments réclamés depuis 7 jours sont archivés
+    await archiver.items.insert_many([
+        item("recent", 10),
+        item("old", 120),
+        {**item("legacy", 200), "status": None},
+        item("claimed", 20, "claimed", changed_days_ago=8),
+        item("just claimed", 20, "claimed", changed_days_ago=1),
+        item("matched", 20, "matched", changed_days_ago=40),
+        {**item("old found", 100), "type": "found"},
+    ])
+    result = await archiver.compact(NOW)
+    assert result["archived"] == 5
+    remaining = {doc["description"] async for doc in archiver.items.find()}
+    assert remaining == {"recent", "just claimed"}
+    archived = {doc["description"]: doc async for doc in archiver.archive.find()}
+    assert set(archived) == {"old", "legacy", "claimed", "matched", "old found"}
+    assert archived["claimed"]["archive_reason"] == "claimed"
+    assert archived["old"]["archived_at"] == NOW.isoformat()
+    # Une seconde passe ne trouve plus rien
+    assert (await archiver.compact(NOW))["archived"] == 0
+
+
+@pytest.mark.asyncio
+async def test_compact_moves_images_to_cold_storage(archiver):
+    # La photo part en stockage froid, ses vignettes sont supprimées
+    image_path = store_image(DIGEST)
+    await archiver.items.insert_one(item("old", 120, image_path=image_path))
+    result = await archiver.compact(NOW)
+    assert result["images_moved"] == 1
+    assert not os.path.exists(image_path)
+    assert os.path.exists(f"cold/{DIGEST}.jpg")
+    assert not os.path.exists(rendition_path(DIGEST, "thumbnail", "webp"))
+    archived = await archiver.archive.find_one({"description": "old"})
+    assert archived["cold_image_path"] == f"cold/{DIGEST}.jpg"
+
+
+@pytest.mark.asyncio
+async def test_compact_keeps_images_shared_with_open_items(archiver):
+    # Une même photo (adressée par son contenu) encore utilisée par un élément ouvert reste en place
+    image_path = store_image(DIGEST)
+    await archiver.items.insert_many([
+        item("old", 120, image_path=image_path),
+        item("recent upload of the same photo", 1, image_path=image_path),
+    ])
+    result = await archiver.compact(NOW)
+    assert result == {"at": NOW.isoformat(), "archived": 1, "images_moved": 0}
+    assert os.path.exists(image_path)
+    assert os.path.exists(rendition_path(DIGEST, "medium", "jpeg"))
+
+
+@pytest.mark.asyncio
+async def test_image_restored_when_reused_during_move(archiver, monkeypatch):
+    # Si la photo est réutilisée pendant le déplacement, elle est remise en place avec ses vignettes
+    image_path = store_image(DIGEST)
+    await archiver.items.insert_one(item("old", 120, image_path=image_path))
+    # Aucun élément ouvert ne l'utilise avant le déplacement, un nouvel upload l'utilise juste après
+    in_use = iter([False, True])
+
+    async def fake_in_use(path):
+        return next(in_use)
+
+    monkeypatch.setattr(archiver, "_in_use", fake_in_use)
+    result = await archiver.compact(NOW)
+    assert result["archived"] == 1 and result["images_moved"] == 0
+    assert os.path.exists(image_path)
+    assert os.path.exists(rendition_path(DIGEST, "thumbnail", "webp"))
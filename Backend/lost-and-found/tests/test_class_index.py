@@ -0,0 +1,39 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import random
+import numpy as np
+from class_index import (
+    COCO_CLASSES, MASK_BYTES, calculate_image_similarity, candidate_query, class_mask, confident_classes,
+    jaccard_many
+)
+
+
+def test_jaccard_many_matches_set_based_similarity():
+    # Le calcul vectorisé sur bitsets donne exactement les mêmes scores
+    rng = random.Random(42)
+    def detections():
+        return [{"name": rng.choice(COCO_CLASSES[:12]), "confidence": rng.random()} for _ in range(rng.randint(0, 4))]
+
+    query = detections() + [{"name": "person", "confidence": 0.9}]
+    items = [detections() for _ in range(500)]
+    masks = np.frombuffer(
+        b"".join(class_mask(confident_classes(item)) for item in items), dtype=np.uint8
+    ).reshape(-1, MASK_BYTES)
+
+    scores = jaccard_many(class_mask(confident_classes(query)), masks)
+    assert scores.tolist() == [calculate_image_similarity(query, item) for item in items]
+
+
+def test_class_mask_outside_label_space():
+    assert len(class_mask(["person", "toothbrush"])) == MASK_BYTES
+    assert class_mask(["wallet"]) is None
+
+
+def test_candidate_query_cardinality_bound():
+    # Jaccard > 0.5 impose |A| / 2 < |B| < 2 |A|
+    query = candidate_query(["backpack", "laptop"])
+    indexed = query["$or"][0]
+    assert indexed["classes"] == {"$in": ["backpack", "laptop"]}
+    assert indexed["class_count"] == {"$gt": 1.0, "$lt": 4.0}
@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from class_index import COCO_CLASSES
+from detector_backends import create_backend, decode_predictions, letterbox, onnx_paths
+
+
+def head_output(anchors, num_classes=80):
+    # Sortie brute d'une tête YOLO : (4 + classes, ancres), une colonne par ancre
+    output = np.zeros((4 + num_classes, len(anchors)), dtype=np.float32)
+    for i, (cx, cy, w, h, class_id, score) in enumerate(anchors):
+        output[:4, i] = (cx, cy, w, h)
+        output[4 + class_id, i] = score
+    return output
+
+
+ANCHORS = [
+    (320, 320, 100, 50, 0, 0.9),   # person
+    (322, 321, 100, 50, 0, 0.6),   # doublon de la même personne, supprimé par la NMS
+    (321, 320, 100, 50, 67, 0.5),  # cell phone au même endroit : autre classe, conservé
+    (100, 100, 20, 20, 24, 0.1),   # sous le seuil de confiance
+]
+
+
+def test_letterbox_keeps_aspect_ratio():
+    # L'image est réduite sans déformation puis centrée sur un fond gris
+    image = np.full((200, 400, 3), 255, dtype=np.uint8)
+    padded, ratio, (left, top) = letterbox(image, 100)
+
+    assert padded.shape == (100, 100, 3)
+    assert ratio == 0.25
+    assert (left, top) == (0, 25)
+    assert (padded[25:75] == 255).all()
+    assert (padded[:25] == 114).all() and (padded[75:] == 114).all()
+
+
+def test_decode_applies_threshold_nms_and_undoes_letterbox():
+    # Seuil, NMS par classe et retour aux coordonnées de l'image d'origine
+    detections = decode_predictions(head_output(ANCHORS), ratio=0.5, pad=(0, 80), names=COCO_CLASSES)
+
+    assert [(d["name"], round(d["confidence"], 2)) for d in detections] == [("person", 0.9), ("cell phone", 0.5)]
+    assert detections[0]["box"] == [540.0, 430.0, 740.0, 530.0]
+    assert decode_predictions(head_output(ANCHORS[3:]), 1.0, (0, 0), COCO_CLASSES) == []
+
+
+def test_onnx_paths_are_per_image_size():
+    assert onnx_paths("models/yolov5su.pt", 320) == ("models/yolov5su-320.onnx", "models/yolov5su-320.int8.onnx")
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_backend("tensorrt", "yolov5su.pt")
+
+
+def test_onnx_backend_end_to_end(tmp_path):
+    # Petit graphe ONNX qui renvoie la même sortie de tête pour chaque image du lot
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from onnx import TensorProto, helper, numpy_helper
+
+    output = head_output(ANCHORS)[None]
+    graph = helper.make_graph(
+        [
+            helper.make_node("Shape", ["images"], ["input_shape"]),
+            helper.make_node("Slice", ["input_shape", "zero", "one"], ["batch"]),
+            helper.make_node("Concat", ["batch", "head_shape"], ["output_shape"], axis=0),
+            helper.make_node("Expand", ["head", "output_shape"], ["output0"]),
+        ],
+        "fake_yolo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, 64, 64])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", 84, len(ANCHORS)])],
+        initializer=[
+            numpy_helper.from_array(output, "head"),
+            numpy_helper.from_array(np.array([0], dtype=np.int64), "zero"),
+            numpy_helper.from_array(np.array([1], dtype=np.int64), "one"),
+            numpy_helper.from_array(np.array(output.shape[1:], dtype=np.int64), "head_shape"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    helper.set_model_props(model, {"names": str(dict(enumerate(COCO_CLASSES)))})
+    path = tmp_path / "yolov5su-64.onnx"
+    onnx.save(model, str(path))
+
+    # L'export existe déjà : create_backend le réutilise sans repasser par PyTorch
+    backend = create_backend("onnx", str(tmp_path / "yolov5su.pt"), imgsz=64, threads=1)
+    assert backend.imgsz == 64
+    images = [np.zeros((32, 64, 3), dtype=np.uint8), np.zeros((64, 64, 3), dtype=np.uint8)]
+    results = backend.predict(images)
+
+    assert len(results) == 2
+    assert [d["name"] for d in results[0]] == ["person", "cell phone"]
+    # La première image garde sa taille (ratio 1) mais est décalée de 16 pixels verticalement
+    assert results[0][0]["box"] == [270.0, 279.0, 370.0, 329.0]
+    assert results[1][0]["box"] == [270.0, 295.0, 370.0, 345.0]
+
+
+def test_concurrent_workers_export_and_quantize_once(tmp_path, monkeypatch):
+    # Deux workers démarrent ensemble : un seul exporte et quantifie, l'autre attend
+    # le verrou puis réutilise les fichiers
+    import detector_backends
+    calls = []
+
+    class SlowYOLO:
+        def __init__(self, model_path):
+            pass
+
+        def export(self, **kwargs):
+            calls.append("export")
+            exported = tmp_path / "yolov5su.onnx"
+            exported.write_bytes(b"float model")
+            time.sleep(0.2)
+            return str(exported)
+
+    def quantize(onnx_path, int8_path):
+        calls.append("quantize")
+        with open(int8_path, "wb") as f:
+            f.write(b"int8 model")
+        return int8_path
+
+    monkeypatch.setattr(detector_backends, "YOLO", SlowYOLO)
+    monkeypatch.setattr(detector_backends, "quantize_onnx", quantize)
+    monkeypatch.setattr(detector_backends, "OnnxBackend", lambda path, imgsz, threads: open(path, "rb").read())
+    with ThreadPoolExecutor(2) as pool:
+        models = list(pool.map(lambda _: create_backend("onnx-int8", str(tmp_path / "yolov5su.pt")), range(2)))
+
+    assert calls == ["export", "quantize"]
+    assert models == [b"int8 model", b"int8 model"]
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from image_recognition import BatchingInferenceWorker, YOLOv5Detector
+
+
+class FakeDetector:
+    def __init__(self):
+        self.calls = []
+
+    def load(self, image):
+        if image == "broken":
+            raise ValueError("Could not read image at broken")
+        return image
+
+    def detect_batch(self, images):
+        self.calls.append(list(images))
+        return [[{"name": image, "confidence": 0.9}] for image in images]
+
+
+def test_worker_batches_concurrent_requests():
+    # Les requêtes arrivant dans la fenêtre sont regroupées en un seul appel au modèle
+    detector = FakeDetector()
+    worker = BatchingInferenceWorker(detector, max_batch_size=4, max_wait_ms=200)
+    futures = [worker.submit(f"img{i}") for i in range(4)]
+
+    results = [future.result(timeout=5) for future in futures]
+    assert results == [[{"name": f"img{i}", "confidence": 0.9}] for i in range(4)]
+    assert detector.calls == [["img0", "img1", "img2", "img3"]]
+
+    stats = worker.stats()
+    assert stats["requests"] == 4
+    assert stats["batches"] == 1
+    assert stats["batch_size_histogram"] == {"4": 1}
+    assert stats["queue_depth"] == 0
+
+
+def test_worker_isolates_unreadable_images():
+    # Une image illisible échoue seule, sans faire échouer le reste du lot
+    detector = FakeDetector()
+    worker = BatchingInferenceWorker(detector, max_batch_size=2, max_wait_ms=200)
+    broken = worker.submit("broken")
+    valid = worker.submit("img")
+
+    assert valid.result(timeout=5) == [{"name": "img", "confidence": 0.9}]
+    with pytest.raises(ValueError):
+        broken.result(timeout=5)
+
+
+def test_load_decodes_in_memory_buffers():
+    # Les images envoyées sont décodées en mémoire, sans passer par le disque
+    detector = object.__new__(YOLOv5Detector)
+    image = np.full((4, 6, 3), 255, dtype=np.uint8)
+    ok, encoded = cv2.imencode(".png", image)
+    assert ok
+
+    for source in (encoded.tobytes(), memoryview(encoded.tobytes()), encoded):
+        assert np.array_equal(detector.load(source), image)
+    assert detector.load(image) is image
+    with pytest.raises(ValueError):
+        detector.load(b"fake image content")
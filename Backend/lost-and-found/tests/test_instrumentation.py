@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from instrumentation import RequestIdFilter, count_model_call, instrument, timed
+from lifecycle import LazyModel
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_timed_records_stage_durations():
+    # Chaque bloc chronométré ajoute une observation à l'histogramme de son étape
+    before = sample("stage_duration_seconds_count", stage="unit_test")
+    with timed("unit_test"):
+        pass
+
+    @timed("unit_test")
+    def work():
+        return 42
+
+    assert work() == 42
+    assert sample("stage_duration_seconds_count", stage="unit_test") == before + 2
+
+
+def test_model_calls_are_warm_once_loaded():
+    # Le premier appel charge le modèle (froid), les suivants le trouvent chargé (chaud)
+    model = LazyModel(lambda: object())
+    cold = sample("model_calls_total", model="unit_test", state="cold")
+    count_model_call("unit_test", model)
+    model.get()
+    count_model_call("unit_test", model)
+    assert sample("model_calls_total", model="unit_test", state="cold") == cold + 1
+    assert sample("model_calls_total", model="unit_test", state="warm") >= 1
+
+
+def test_request_ids_are_propagated_to_logs_and_responses(caplog):
+    # L'identifiant de requête est renvoyé au client et ajouté aux journaux de la requête
+    app = instrument(FastAPI())
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        logging.getLogger("unit_test").warning(f"reading {item_id}")
+        return {"id": item_id}
+
+    caplog.handler.addFilter(RequestIdFilter())
+    client = TestClient(app)
+    response = client.get("/items/abc", headers={"X-Request-ID": "trace-1"})
+    assert response.headers["X-Request-ID"] == "trace-1"
+    assert [record.request_id for record in caplog.records if record.name == "unit_test"] == ["trace-1"]
+    assert len(client.get("/items/abc").headers["X-Request-ID"]) == 32
+
+    # Les routes sont étiquetées par leur modèle, pas par le chemin brut
+    metrics = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"}' in metrics
@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import pytest
+from lifecycle import LazyModel, Startup, StartupTask, READY, FAILED
+
+
+def test_lazy_model_is_built_once():
+    # Le modèle est construit au premier usage, une seule fois même en concurrence
+    builds = []
+
+    class Model:
+        names = {0: "wallet"}
+
+        def __call__(self, images):
+            return len(images)
+
+    def factory():
+        builds.append(1)
+        return Model()
+
+    model = LazyModel(factory)
+    assert not model.loaded
+    threads = [threading.Thread(target=lambda: model.names) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert model(["a", "b"]) == 2
+    assert builds == [1]
+    assert model.loaded
+
+
+@pytest.mark.asyncio
+async def test_startup_task_retries_until_ready():
+    # Une tâche en échec est relancée jusqu'à réussir
+    attempts = []
+
+    async def connect():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("unreachable")
+
+    task = StartupTask("mongodb", connect, retry_interval=0)
+    await task.run()
+    assert task.state == READY
+    assert task.attempts == 3
+    assert task.error is None
+
+
+@pytest.mark.asyncio
+async def test_startup_reports_readiness():
+    # La disponibilité n'est annoncée que lorsque toutes les tâches ont réussi
+    gate = threading.Event()
+    startup = Startup()
+    startup.add("model", lambda: gate.wait(timeout=5))
+    startup.add("broken", lambda: 1 / 0)
+    startup.start()
+    await asyncio.sleep(0.05)
+    assert not startup.ready
+    assert startup.status()["broken"]["state"] == FAILED
+    assert "ZeroDivisionError" in startup.status()["broken"]["error"]
+    gate.set()
+    await asyncio.sleep(0.05)
+    assert startup.status()["model"]["state"] == READY
+    await startup.stop()
+
+
+def test_preload_runs_sync_tasks_and_raises():
+    # Le préchargement exécute les tâches synchrones tout de suite et échoue franchement
+    loaded = []
+    startup = Startup()
+    startup.add("model", lambda: loaded.append(1))
+
+    async def connect():
+        pass
+
+    startup.add("mongodb", connect)
+    startup.preload()
+    assert loaded == [1]
+    assert startup.status()["model"]["state"] == READY
+    assert startup.status()["mongodb"]["state"] != READY
+    startup.add("broken", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        startup.preload()
@@ -2,6 +2,8 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import json
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime
@@ -28,7 +30,7 @@ async def test_upload_lost_item(client, collection, mock_yolo_detector, mock_ema
     assert response_json["detections"] == [{"name": "wallet", "confidence": 0.9}]
 
     # Vérifier que l'élément est bien dans MongoDB
-    item = collection.find_one({"description": "Lost a black wallet"})
+    item = await collection.find_one({"description": "Lost a black wallet"})
     assert item is not None
     assert item["type"] == "lost"
     assert item["description"] == "Lost a black wallet"
@@ -52,7 +54,7 @@ async def test_upload_found_item(client, collection, mock_yolo_detector):
     assert response.status_code == 200
 
     # Vérifier que l'élément est bien dans MongoDB
-    item = collection.find_one({"description": "Found a black wallet"})
+    item = await collection.find_one({"description": "Found a black wallet"})
     assert item is not None
     assert item["type"] == "found"
 
@@ -84,7 +86,7 @@ async def test_get_items(client, collection):
         "timestamp": datetime.utcnow().isoformat(),
         "matches": []
     }
-    inserted_item = collection.insert_one(item)
+    inserted_item = await collection.insert_one(item)
 
     # Teste la récupération des éléments
     response = client.get("/items")
@@ -94,6 +96,7 @@ async def test_get_items(client, collection):
     assert len(items) == 1
     assert items[0]["id"] == str(inserted_item.inserted_id)
     assert items[0]["description"] == "Found a black wallet"
+    assert items[0]["renditions"]["thumbnail"]["webp"] == "/data/renditions/test-thumbnail.webp"
 
 @pytest.mark.asyncio
 async def test_match_item(client, collection):
@@ -105,7 +108,7 @@ async def test_match_item(client, collection):
         "timestamp": datetime.utcnow().isoformat(),
         "matches": []
     }
-    inserted_item = collection.insert_one(item)
+    inserted_item = await collection.insert_one(item)
 
     # Teste le matching avec des détections similaires
     detections = [{"name": "wallet", "confidence": 0.9}]
@@ -126,4 +129,459 @@ async def test_cors_headers(client):
                           headers={"Origin": "http://frontend:8080"})
     assert response.status_code == 200
     assert "access-control-allow-origin" in response.headers
-    assert response.headers["access-control-allow-origin"] == "http://frontend:8080"
\ No newline at end of file
+    assert response.headers["access-control-allow-origin"] == "http://frontend:8080"
+
+@pytest.mark.asyncio
+async def test_upload_stores_class_index(client, collection, mock_yolo_detector, mock_email_utils):
+    # Vérifie que les classes détectées sont dénormalisées pour l'index de /match
+    form_data = {
+        "type": "lost",
+        "description": "Lost a brown wallet",
+        "contactInfo": "john.doe@example.com"
+    }
+    files = {
+        "file": ("test.jpg", b"fake image content", "image/jpeg")
+    }
+
+    response = client.post("/upload", data=form_data, files=files)
+    assert response.status_code == 200
+
+    item = await collection.find_one({"description": "Lost a brown wallet"})
+    assert item["classes"] == ["wallet"]
+    assert item["class_count"] == 1
+
+@pytest.mark.asyncio
+async def test_match_item_prunes_candidates(client, collection):
+    # Un élément qui ne partage aucune classe, ou dont la cardinalité rend
+    # Jaccard <= 0.5, ne doit jamais être candidat
+    detections = [{"name": n, "confidence": 0.9} for n in ("wallet", "phone", "keys")]
+    await collection.insert_one({
+        "type": "lost",
+        "description": "Lost wallet, phone and keys",
+        "detections": detections,
+        "classes": ["keys", "phone", "wallet"],
+        "class_count": 3,
+        "timestamp": datetime.utcnow().isoformat(),
+        "matches": []
+    })
+    await collection.insert_one({
+        "type": "lost",
+        "description": "Lost an umbrella",
+        "detections": [{"name": "umbrella", "confidence": 0.9}],
+        "classes": ["umbrella"],
+        "class_count": 1,
+        "timestamp": datetime.utcnow().isoformat(),
+        "matches": []
+    })
+
+    response = client.post("/match", json=[{"name": "wallet", "confidence": 0.9}])
+    assert response.status_code == 200
+    assert response.json()["matches"] == []
+
+@pytest.mark.asyncio
+async def test_duplicate_upload_uses_detection_cache(client, collection, mock_email_utils, monkeypatch):
+    # Une image déjà vue ne repasse pas par le modèle et n'est stockée qu'une fois
+    import main
+    from detection_cache import DetectionCache
+    calls = []
+
+    async def counting_detect_async(self, image):
+        calls.append(image)
+        return [{"name": "umbrella", "confidence": 0.8}]
+
+    monkeypatch.setattr("main.YOLOv5Detector.load", lambda self, image: np.zeros((8, 8, 3), dtype=np.uint8))
+    monkeypatch.setattr("main.YOLOv5Detector.detect_async", counting_detect_async)
+    monkeypatch.setattr(main, "detection_cache", DetectionCache(namespace="test"))
+    form_data = {"type": "found", "description": "Found an umbrella"}
+    files = {"file": ("umbrella.jpg", b"same umbrella photo", "image/jpeg")}
+
+    first = client.post("/upload", data=form_data, files=files)
+    second = client.post("/upload", data=form_data, files=files)
+    assert first.status_code == 200 and second.status_code == 200
+    assert second.json()["detections"] == [{"name": "umbrella", "confidence": 0.8}]
+    assert len(calls) == 1
+    assert main.detection_cache.stats()["memory_hits"] == 1
+
+    paths = {item["image_path"] async for item in collection.find({"description": "Found an umbrella"})}
+    assert len(paths) == 1
+
+@pytest.mark.asyncio
+async def test_get_items_paginates_with_cursor(client, collection):
+    # Pagination par curseur (_id décroissant) et tableaux lourds en option
+    for i in range(3):
+        await collection.insert_one({
+            "type": "lost",
+            "description": f"Lost item {i}",
+            "detections": [{"name": "wallet", "confidence": 0.9}],
+            "timestamp": f"2024-01-0{i + 1}T10:00:00",
+            "matches": []
+        })
+
+    first = client.get("/items", params={"limit": 2})
+    assert first.status_code == 200
+    assert [item["description"] for item in first.json()] == ["Lost item 2", "Lost item 1"]
+    assert "detections" not in first.json()[0]
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get("/items", params={"limit": 2, "after": cursor, "include": "detections,matches"})
+    assert [item["description"] for item in second.json()] == ["Lost item 0"]
+    assert second.json()[0]["detections"] == [{"name": "wallet", "confidence": 0.9}]
+    assert second.json()[0]["matches"] == []
+    assert "X-Next-Cursor" not in second.headers
+
+    ranged = client.get("/items", params={"type": "lost", "since": "2024-01-02", "until": "2024-01-03"})
+    assert [item["description"] for item in ranged.json()] == ["Lost item 1"]
+
+@pytest.mark.asyncio
+async def test_get_items_streams_ndjson(client, collection):
+    # Le mode NDJSON renvoie un document par ligne
+    for i in range(2):
+        await collection.insert_one({
+            "type": "found",
+            "description": f"Found item {i}",
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+
+    response = client.get("/items", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["description"] for line in lines] == ["Found item 1", "Found item 0"]
+
+@pytest.mark.asyncio
+async def test_found_upload_fans_out_matches_in_bulk(client, collection, repository, mock_yolo_detector, match_worker):
+    # Un objet trouvé qui correspond à plusieurs objets perdus met à jour
+    # tous les objets perdus en une seule écriture groupée
+    lost_ids = []
+    for i in range(3):
+        result = await collection.insert_one({
+            "type": "lost",
+            "description": f"Lost wallet {i}",
+            "contactInfo": f"owner{i}@example.com",
+            "detections": [{"name": "wallet", "confidence": 0.9}],
+            "classes": ["wallet"],
+            "class_count": 1,
+            "timestamp": datetime.utcnow().isoformat(),
+            "matches": []
+        })
+        lost_ids.append(result.inserted_id)
+
+    response = client.post(
+        "/upload",
+        data={"type": "found", "description": "Found a wallet", "contactInfo": "finder@example.com"},
+        files={"file": ("wallet.jpg", b"wallet photo", "image/jpeg")}
+    )
+    assert response.status_code == 200
+    # La réponse n'attend pas le matching : il est fait par le worker
+    job_id = response.json()["match_job_id"]
+    assert client.get(f"/match-jobs/{job_id}").json()["status"] == "pending"
+    assert await match_worker.run_once() == 1
+    job = client.get(f"/match-jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert len(job["matches"]) == 3
+    # Une entrée sur chaque objet perdu, trois sur l'objet trouvé
+    assert job["matches_updated"] == 6
+    # Les emails sont mis en file d'attente, pas envoyés pendant la requête
+    queued = [message async for message in repository.collection("notifications").find()]
+    assert sorted(message["payload"]["to_email"] for message in queued) == [f"owner{i}@example.com" for i in range(3)]
+    assert {message["status"] for message in queued} == {"pending"}
+
+    for lost_id in lost_ids:
+        lost = await collection.find_one({"_id": lost_id})
+        assert lost["matches"][0]["id"] == response.json()["id"]
+        assert lost["matches"][0]["finder_email"] == "finder@example.com"
+
+@pytest.mark.asyncio
+async def test_match_item_mixes_stored_text_embeddings(client, collection, monkeypatch):
+    # Avec un poids texte, le score combine image et texte à partir des
+    # embeddings enregistrés, sans ré-encoder les objets perdus
+    import main
+    embeddings = {"black wallet": np.array([1.0, 0.0], dtype=np.float32)}
+
+    class FakeTextMatcher:
+        def embed(self, text):
+            return embeddings[text]
+
+    monkeypatch.setattr(main, "TEXT_MATCH_WEIGHT", 0.25)
+    monkeypatch.setattr(main, "text_matcher", FakeTextMatcher())
+    for description, vector in (("Same wallet", [1.0, 0.0]), ("Other wallet", [0.0, 1.0])):
+        await collection.insert_one({
+            "type": "lost",
+            "description": description,
+            "detections": [{"name": "wallet", "confidence": 0.9}],
+            "classes": ["wallet"],
+            "class_count": 1,
+            "description_embedding": np.array(vector, dtype=np.float32).tobytes(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "matches": []
+        })
+
+    response = client.post(
+        "/match",
+        params={"description": "black wallet"},
+        json=[{"name": "wallet", "confidence": 0.9}]
+    )
+    matches = {match["description"]: match for match in response.json()["matches"]}
+    assert matches["Same wallet"]["similarity"] == pytest.approx(1.0)
+    assert matches["Other wallet"]["similarity"] == pytest.approx(0.75)
+    assert matches["Other wallet"]["text_similarity"] == pytest.approx(0.0)
+
+def test_liveness_and_readiness_before_startup(client):
+    # Le processus est vivant, mais pas prêt tant que les modèles ne sont pas chargés
+    assert client.get("/healthz").status_code == 200
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert set(response.json()["components"]) >= {"mongodb", "detector"}
+
+def test_lifespan_loads_models_in_background(monkeypatch):
+    # Au démarrage, la base et le détecteur sont préparés en tâche de fond
+    import time
+    import main
+    from lifecycle import Startup
+    startup = Startup()
+    for name, task in main.startup.tasks.items():
+        startup.add(name, task.func, task.retry_interval)
+    monkeypatch.setattr(main, "startup", startup)
+    monkeypatch.setattr(main.notification_worker, "queue", main.outbox)
+    with TestClient(main.app) as lifespan_client:
+        deadline = time.monotonic() + 10
+        while not lifespan_client.get("/readyz").json()["ready"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        response = lifespan_client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["components"]["detector"]["state"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_upload_writes_renditions_from_decoded_image(client, collection, monkeypatch):
+    # Les vignettes sont produites en tâche de fond à partir de l'image déjà décodée
+    import cv2
+    import main
+    from detection_cache import DetectionCache
+
+    async def mock_detect_async(self, image):
+        assert image.shape == (600, 800, 3)
+        return [{"name": "backpack", "confidence": 0.9}]
+
+    monkeypatch.setattr("main.YOLOv5Detector.detect_async", mock_detect_async)
+    monkeypatch.setattr(main, "detection_cache", DetectionCache(namespace="test"))
+    image = np.random.default_rng(1).integers(0, 255, (600, 800, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode(".png", image)
+    files = {"file": ("backpack.png", encoded.tobytes(), "image/png")}
+
+    response = client.post("/upload", data={"type": "found", "description": "Found a backpack"}, files=files)
+    assert response.status_code == 200
+    item = (client.get("/items").json())[0]
+    thumbnail = client.get(item["renditions"]["thumbnail"]["webp"])
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["content-type"] == "image/webp"
+    assert "immutable" in thumbnail.headers["cache-control"]
+    assert cv2.imdecode(np.frombuffer(thumbnail.content, np.uint8), cv2.IMREAD_COLOR).shape == (240, 320, 3)
+
+
+def test_upload_rejects_undecodable_image(client):
+    # Une image illisible est refusée avant la détection
+    files = {"file": ("broken.jpg", b"not an image", "image/jpeg")}
+    response = client.post("/upload", data={"type": "found", "description": "Found something"}, files=files)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_metrics_expose_upload_stages(client, collection, mock_yolo_detector):
+    # Les étapes de l'upload et le nombre de candidats du matching sont exportés
+    form_data = {"type": "found", "description": "Found a black wallet"}
+    files = {"file": ("wallet.jpg", b"metrics wallet", "image/jpeg")}
+    assert client.post("/upload", data=form_data, files=files).status_code == 200
+
+    metrics = client.get("/metrics").text
+    for stage in ("image_decode", "mongo_insert", "match_scan", "file_write", "renditions"):
+        assert f'stage_duration_seconds_count{{stage="{stage}"}}' in metrics
+    assert 'match_candidates_count{step="fetched"}' in metrics
+
+
+@pytest.mark.asyncio
+async def test_item_status_lifecycle(client, collection):
+    # Un élément marqué "matched" ne participe plus au matching ni à la liste par défaut
+    inserted = await collection.insert_one({
+        "type": "lost",
+        "description": "Lost a black wallet",
+        "detections": [{"name": "wallet", "confidence": 0.9}],
+        "timestamp": datetime.utcnow().isoformat(),
+        "status": "open",
+        "matches": []
+    })
+    item_id = str(inserted.inserted_id)
+    assert len(client.post("/match", json=[{"name": "wallet", "confidence": 0.9}]).json()["matches"]) == 1
+
+    response = client.patch(f"/items/{item_id}/status", json={"status": "matched"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "matched"
+    stored = await collection.find_one({"_id": inserted.inserted_id})
+    assert stored["status_changed_at"]
+
+    assert client.post("/match", json=[{"name": "wallet", "confidence": 0.9}]).json()["matches"] == []
+    assert client.get("/items").json() == []
+    assert [item["id"] for item in client.get("/items", params={"status": "matched"}).json()] == [item_id]
+    assert client.get("/archive/stats").json()["items"] == {"open": 0, "matched": 1, "claimed": 0}
+
+
+def test_item_status_validation(client):
+    # Identifiant invalide, élément inconnu ou statut inconnu
+    assert client.patch("/items/not-an-id/status", json={"status": "claimed"}).status_code == 400
+    assert client.patch(f"/items/{ObjectId()}/status", json={"status": "claimed"}).status_code == 404
+    assert client.patch(f"/items/{ObjectId()}/status", json={"status": "lost"}).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_upload_of_archived_photo_restores_renditions(client, collection, mock_yolo_detector, monkeypatch):
+    # Une photo déjà vue (cache de détection) mais archivée depuis est réécrite avec ses vignettes
+    import main
+    from detection_cache import DetectionCache
+    monkeypatch.setattr(main, "detection_cache", DetectionCache(namespace="test"))
+    stored = []
+    monkeypatch.setattr(main, "write_renditions", lambda image, key: stored.append(key))
+    files = {"file": ("wallet.jpg", b"archived wallet photo", "image/jpeg")}
+    form_data = {"type": "found", "description": "Found a wallet"}
+
+    assert client.post("/upload", data=form_data, files=files).status_code == 200
+    item = await collection.find_one({"description": "Found a wallet"})
+    assert item["status"] == "open"
+    os.remove(item["image_path"])
+    assert client.post("/upload", data=form_data, files=files).status_code == 200
+    assert client.post("/upload", data=form_data, files=files).status_code == 200
+    assert os.path.exists(item["image_path"])
+    assert len(stored) == 2
+
+
+@pytest.mark.asyncio
+async def test_lost_upload_matches_earlier_found_item(client, collection, repository, mock_yolo_detector, mock_email_utils, match_worker):
+    # Un objet perdu déclaré après l'objet trouvé est apparié aussi, et rejouer le job ne change rien
+    import main
+    await main.outbox.ensure_indexes()
+    found = await collection.insert_one({
+        "type": "found",
+        "description": "Found a wallet",
+        "contactInfo": "finder@example.com",
+        "detections": [{"name": "wallet", "confidence": 0.9}],
+        "classes": ["wallet"],
+        "class_count": 1,
+        "timestamp": datetime.utcnow().isoformat(),
+        "status": "open",
+        "matches": []
+    })
+    response = client.post(
+        "/upload",
+        data={"type": "lost", "description": "Lost my wallet", "contactInfo": "owner@example.com"},
+        files={"file": ("wallet.jpg", b"lost wallet photo", "image/jpeg")}
+    )
+    assert response.status_code == 200
+    assert await match_worker.run_once() == 1
+    lost_id = ObjectId(response.json()["id"])
+
+    for _ in range(2):
+        lost = await collection.find_one({"_id": lost_id})
+        assert [(match["id"], match["finder_email"]) for match in lost["matches"]] == [(str(found.inserted_id), "finder@example.com")]
+        found_item = await collection.find_one({"_id": found.inserted_id})
+        assert [match["id"] for match in found_item["matches"]] == [str(lost_id)]
+        queued = [message async for message in repository.collection("notifications").find()]
+        assert [message["payload"]["to_email"] for message in queued] == ["owner@example.com"]
+        # Même job rejoué (par exemple après un crash du worker)
+        await main.match_jobs.collection.update_many({}, {"$set": {"status": "pending"}})
+        assert await match_worker.run_once() == 1
+
+
+def test_match_job_not_found(client):
+    assert client.get("/match-jobs/not-an-id").status_code == 400
+    assert client.get(f"/match-jobs/{ObjectId()}").status_code == 404
+    assert client.get("/match-jobs/stats").json()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_upload_matches_by_crop_appearance(client, collection, monkeypatch, match_worker):
+    # Deux sacs à dos perdus : seul celui qui ressemble au sac trouvé est apparié ;
+    # un objet enregistré avant les embeddings reste apparié par classe
+    from appearance import EMBEDDING_DIM, pack
+    blue, red = np.eye(2, EMBEDDING_DIM, dtype=np.float32)
+    lost_ids = {}
+    for description, vector in (("Blue backpack", blue), ("Red backpack", red), ("Old backpack", None)):
+        document = {
+            "type": "lost",
+            "description": description,
+            "detections": [{"name": "backpack", "confidence": 0.9}],
+            "classes": ["backpack"],
+            "class_count": 1,
+            "timestamp": datetime.utcnow().isoformat(),
+            "status": "open",
+            "matches": []
+        }
+        if vector is not None:
+            document["crops"] = [{"name": "backpack", "embedding": pack(vector)}]
+        lost_ids[description] = (await collection.insert_one(document)).inserted_id
+
+    async def detect_async(self, image):
+        return [{"name": "backpack", "confidence": 0.9, "box": [0, 0, 8, 8], "embedding": pack(blue)}]
+    monkeypatch.setattr("main.YOLOv5Detector.load", lambda self, image: np.zeros((8, 8, 3), dtype=np.uint8))
+    monkeypatch.setattr("main.YOLOv5Detector.detect_async", detect_async)
+
+    response = client.post(
+        "/upload",
+        data={"type": "found", "description": "Found a backpack", "contactInfo": "finder@example.com"},
+        files={"file": ("backpack.jpg", b"backpack photo", "image/jpeg")}
+    )
+    assert response.status_code == 200
+    assert response.json()["detections"] == [{"name": "backpack", "confidence": 0.9, "box": [0, 0, 8, 8]}]
+    found = await collection.find_one({"_id": ObjectId(response.json()["id"])})
+    assert found["crops"] == [{"name": "backpack", "embedding": pack(blue)}]
+
+    assert await match_worker.run_once() == 1
+    job = client.get(f"/match-jobs/{response.json()['match_job_id']}").json()
+    assert sorted(match["description"] for match in job["matches"]) == ["Blue backpack", "Old backpack"]
+    assert client.get("/inference/stats").json()["appearance_index"]["items"] == 3
+
+
+@pytest.mark.asyncio
+async def test_matched_item_no_longer_shadows_an_open_one(client, collection, monkeypatch, match_worker):
+    # Avec k=1, le sac le plus proche a été apparié (par un autre processus) : le sac encore
+    # ouvert est trouvé à sa place ; rouvert, le premier est de nouveau indexé
+    import main
+    from appearance import EMBEDDING_DIM, AppearanceIndex, pack
+    monkeypatch.setattr(main, "appearance_index", AppearanceIndex(k=1))
+    blue = np.eye(1, EMBEDDING_DIM, dtype=np.float32)[0]
+    close = blue.copy()
+    close[1] = 0.2
+    close /= np.linalg.norm(close)
+    lost_ids = {}
+    for description, vector in (("Blue backpack", blue), ("Similar backpack", close)):
+        lost_ids[description] = (await collection.insert_one({
+            "type": "lost",
+            "description": description,
+            "detections": [{"name": "backpack", "confidence": 0.9}],
+            "classes": ["backpack"],
+            "class_count": 1,
+            "crops": [{"name": "backpack", "embedding": pack(vector)}],
+            "timestamp": datetime.utcnow().isoformat(),
+            "status": "open",
+            "matches": []
+        })).inserted_id
+    await main.appearance_index.sync(collection)
+    await collection.update_one({"_id": lost_ids["Blue backpack"]}, {"$set": {"status": "matched"}})
+
+    async def detect_async(self, image):
+        return [{"name": "backpack", "confidence": 0.9, "box": [0, 0, 8, 8], "embedding": pack(blue)}]
+    monkeypatch.setattr("main.YOLOv5Detector.load", lambda self, image: np.zeros((8, 8, 3), dtype=np.uint8))
+    monkeypatch.setattr("main.YOLOv5Detector.detect_async", detect_async)
+    response = client.post(
+        "/upload",
+        data={"type": "found", "description": "Found a backpack", "contactInfo": "finder@example.com"},
+        files={"file": ("backpack.jpg", b"backpack photo", "image/jpeg")}
+    )
+    assert response.status_code == 200
+    assert await match_worker.run_once() == 1
+    job = client.get(f"/match-jobs/{response.json()['match_job_id']}").json()
+    assert [match["description"] for match in job["matches"]] == ["Similar backpack"]
+
+    query = [{"name": "backpack", "embedding": pack(blue)}]
+    assert client.patch(f"/items/{lost_ids['Similar backpack']}/status", json={"status": "matched"}).status_code == 200
+    assert main.appearance_index.search("lost", query, threshold=0.5) == []
+    assert client.patch(f"/items/{lost_ids['Blue backpack']}/status", json={"status": "open"}).status_code == 200
+    assert main.appearance_index.search("lost", query, threshold=0.5) == [lost_ids["Blue backpack"]]
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import pytest
+from bson.objectid import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from match_worker import MatchJobQueue, MatchWorker
+
+
+@pytest.fixture
+def queue():
+    return MatchJobQueue(AsyncMongoMockClient()["test_db"]["match_jobs"], max_attempts=2, base_delay=0)
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs_once(queue):
+    # Chaque job est réclamé une seule fois et son résultat enregistré
+    handled = []
+
+    async def handler(item_id):
+        handled.append(item_id)
+        return {"matches": [], "matches_updated": 0}
+
+    item_ids = [ObjectId() for _ in range(3)]
+    job_ids = [await queue.enqueue(item_id) for item_id in item_ids]
+    worker = MatchWorker(queue, handler, batch_size=2)
+    assert await worker.run_once() == 2
+    assert await worker.run_once() == 1
+    assert await worker.run_once() == 0
+    assert handled == item_ids
+    assert (await queue.get(job_ids[0]))["status"] == "done"
+    assert await queue.stats() == {"pending": 0, "running": 0, "done": 3, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_given_up(queue):
+    # Un job en erreur est relancé, puis abandonné après max_attempts
+    async def handler(item_id):
+        raise RuntimeError("mongo timeout")
+
+    job_id = await queue.enqueue(ObjectId())
+    worker = MatchWorker(queue, handler)
+    assert await worker.run_once() == 1
+    assert (await queue.get(job_id))["status"] == "pending"
+    assert await worker.run_once() == 1
+    job = await queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["last_error"] == "mongo timeout"
+
+
+@pytest.mark.asyncio
+async def test_worker_polls_without_change_stream(queue):
+    # Sans change stream (serveur autonome, base en mémoire), la file est interrogée périodiquement
+    done = asyncio.Event()
+
+    async def handler(item_id):
+        done.set()
+        return {}
+
+    worker = MatchWorker(queue, handler, poll_interval=0.05)
+    worker.start()
+    try:
+        await queue.enqueue(ObjectId())
+        await asyncio.wait_for(done.wait(), timeout=2)
+        assert not worker.change_stream_active
+    finally:
+        await worker.stop()
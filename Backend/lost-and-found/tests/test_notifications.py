@@ -0,0 +1,141 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import socket
+import threading
+import pytest
+from aiosmtpd.controller import Controller
+from mongomock_motor import AsyncMongoMockClient
+import email_utils
+from notifications import NotificationOutbox, NotificationWorker
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def payload(i):
+    return {
+        "to_email": f"owner{i}@example.com",
+        "item_description": f"Lost wallet {i}",
+        "match_description": "Found a wallet",
+        "similarity": 1.0,
+        "finder_email": "finder@example.com"
+    }
+
+
+@pytest.fixture
+def smtp_config(monkeypatch):
+    # Serveur SMTP local (aiosmtpd) à la place de Gmail
+    monkeypatch.setattr(email_utils, "EMAIL_ADDRESS", "lost-and-found@example.com")
+    monkeypatch.setattr(email_utils, "EMAIL_PASSWORD", None)
+    monkeypatch.setattr(email_utils, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(email_utils, "SMTP_USE_SSL", False)
+    monkeypatch.setattr(email_utils, "SMTP_TIMEOUT", 2)
+
+
+@pytest.fixture
+def smtp_server(smtp_config, monkeypatch):
+    handler = RecordingHandler()
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(email_utils, "SMTP_PORT", port)
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def outbox():
+    return NotificationOutbox(AsyncMongoMockClient()["test_db"]["notifications"], max_attempts=2, base_delay=0)
+
+
+@pytest.mark.asyncio
+async def test_worker_sends_batch_over_one_session(outbox, smtp_server):
+    # Plusieurs messages partent sur une seule session SMTP
+    await outbox.enqueue_many([payload(i) for i in range(3)])
+    worker = NotificationWorker(outbox, batch_size=10)
+
+    assert await worker.run_once() == 3
+    assert sorted(envelope.rcpt_tos[0] for envelope in smtp_server.messages) == [f"owner{i}@example.com" for i in range(3)]
+    assert smtp_server.connections == 1
+    assert worker.sessions_opened == 1
+    assert (await outbox.stats())["sent"] == 3
+    await worker.stop()
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_then_dead_letters(outbox, smtp_config, monkeypatch):
+    # Serveur injoignable : nouvel essai avec délai, puis lettre morte
+    monkeypatch.setattr(email_utils, "SMTP_PORT", free_port())
+    await outbox.enqueue_many([payload(0)])
+    worker = NotificationWorker(outbox)
+
+    assert await worker.run_once() == 1
+    message = await outbox.collection.find_one()
+    assert message["status"] == "pending"
+    assert message["attempts"] == 1
+
+    assert await worker.run_once() == 1
+    message = await outbox.collection.find_one()
+    assert message["status"] == "dead"
+    assert message["last_error"]
+    await worker.stop()
+
+
+@pytest.mark.asyncio
+async def test_invalid_recipient_is_dead_lettered_immediately(outbox, smtp_server):
+    await outbox.enqueue_many([{**payload(0), "to_email": "not-an-email"}])
+    worker = NotificationWorker(outbox)
+
+    await worker.run_once()
+    message = await outbox.collection.find_one()
+    assert message["status"] == "dead"
+    assert smtp_server.messages == []
+
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_the_batch_being_sent(outbox, smtp_server):
+    # stop() pendant un envoi : le lot se termine et est marqué envoyé avant la fermeture
+    # de la session, sinon il serait renvoyé (e-mails en double)
+    await outbox.enqueue_many([payload(0)])
+    worker = NotificationWorker(outbox, poll_interval=0.05)
+    started, release = threading.Event(), threading.Event()
+    send_batch = worker._send_batch
+
+    def slow_send_batch(messages):
+        started.set()
+        release.wait(timeout=5)
+        return send_batch(messages)
+    worker._send_batch = slow_send_batch
+
+    worker.start()
+    assert await asyncio.to_thread(started.wait, 5)
+    stopping = asyncio.create_task(worker.stop())
+    await asyncio.sleep(0.1)
+    assert not stopping.done()
+    release.set()
+    await stopping
+
+    assert (await outbox.stats())["sent"] == 1
+    assert [envelope.rcpt_tos[0] for envelope in smtp_server.messages] == ["owner0@example.com"]
+    assert worker._session is None
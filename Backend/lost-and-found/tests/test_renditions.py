@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import renditions
+from renditions import CachedStaticFiles, IMMUTABLE_CACHE_CONTROL, rendition_urls, write_renditions
+
+DIGEST = "a" * 64
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Répertoire de données temporaire, pour ne pas écrire dans data/
+    monkeypatch.setattr(renditions, "RENDITIONS_DIR", str(tmp_path / "renditions"))
+    return tmp_path
+
+
+def test_write_renditions_resizes_without_upscaling(data_dir):
+    # Chaque taille est écrite en WebP et en JPEG, le côté le plus long étant borné
+    image = np.random.default_rng(0).integers(0, 255, (1500, 2000, 3), dtype=np.uint8)
+    assert write_renditions(image, DIGEST) == 4
+
+    thumbnail = cv2.imread(str(data_dir / "renditions" / f"{DIGEST}-thumbnail.webp"))
+    assert thumbnail.shape == (240, 320, 3)
+    medium = cv2.imread(str(data_dir / "renditions" / f"{DIGEST}-medium.jpg"))
+    assert medium.shape == (960, 1280, 3)
+
+    # Les fichiers existants ne sont pas régénérés ; une petite image n'est pas agrandie
+    assert write_renditions(image, DIGEST) == 0
+    write_renditions(np.zeros((100, 50, 3), dtype=np.uint8), "small")
+    assert cv2.imread(str(data_dir / "renditions" / "small-medium.jpg")).shape == (100, 50, 3)
+
+
+def test_rendition_urls_follow_the_original_name():
+    urls = rendition_urls(f"data/{DIGEST}.png")
+    assert urls["thumbnail"]["webp"] == f"/data/renditions/{DIGEST}-thumbnail.webp"
+    assert urls["medium"]["jpeg"] == f"/data/renditions/{DIGEST}-medium.jpg"
+
+
+def test_static_files_cache_headers(tmp_path):
+    # Les fichiers adressés par contenu sont immuables, les autres ont une durée de cache courte
+    (tmp_path / f"{DIGEST}.jpg").write_bytes(b"original")
+    (tmp_path / "sample_item.jpg").write_bytes(b"sample")
+    app = FastAPI()
+    app.mount("/data", CachedStaticFiles(directory=str(tmp_path)), name="data")
+    client = TestClient(app)
+
+    response = client.get(f"/data/{DIGEST}.jpg")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"] == f'"{DIGEST}.jpg"'
+
+    revalidated = client.get(f"/data/{DIGEST}.jpg", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    sample = client.get("/data/sample_item.jpg")
+    assert sample.headers["cache-control"].startswith("public, max-age=")
+    assert "immutable" not in sample.headers["cache-control"]
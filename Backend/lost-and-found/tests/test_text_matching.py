@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import text_matching
+from text_matching import TextMatcher
+
+
+class FakeSentenceTransformer:
+    def __init__(self, model_name):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False):
+        self.calls.append(list(texts))
+        vectors = np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_matcher(monkeypatch, cache_size=2):
+    monkeypatch.setattr(text_matching, "SentenceTransformer", FakeSentenceTransformer)
+    return TextMatcher(cache_size=cache_size)
+
+
+def test_embed_uses_bounded_lru(monkeypatch):
+    # Les chaînes déjà vues ne sont pas ré-encodées, et le cache reste borné
+    matcher = make_matcher(monkeypatch)
+    matcher.embed("black wallet")
+    matcher.embed("black wallet")
+    matcher.embed("red umbrella")
+    matcher.embed("blue backpack")
+    assert matcher.model.calls == [["black wallet"], ["red umbrella"], ["blue backpack"]]
+    assert list(matcher._cache) == ["red umbrella", "blue backpack"]
+
+
+def test_score_batch_matches_pairwise_cosine(monkeypatch):
+    # Un seul produit matriciel donne les mêmes scores que les comparaisons deux à deux
+    matcher = make_matcher(monkeypatch, cache_size=8)
+    texts = ["wallet", "black leather wallet", "umbrella"]
+    matrix = matcher.encode(texts)
+    query = matcher.embed("lost wallet")
+
+    scores = TextMatcher.score_batch(query, matrix)
+    expected = [matcher.compute_similarity("lost wallet", text) for text in texts]
+    assert np.allclose(scores, expected)
+    assert np.array_equal(TextMatcher.unpack(TextMatcher.pack(matrix[0])), matrix[0])
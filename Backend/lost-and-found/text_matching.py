@@ -1,13 +1,84 @@
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
+from collections import OrderedDict
+import threading
+import numpy as np
+from lifecycle import LazyModel
+from instrumentation import count_model_call, timed
 
 class TextMatcher:
-    def __init__(self):
+    def __init__(self, model_name='all-MiniLM-L6-v2', cache_size=1024):
         """
         Initialize SentenceTransformer model for text similarity.
-        Uses all-MiniLM-L6-v2 model for embedding generation.
+        Uses all-MiniLM-L6-v2 model for embedding generation, loaded on first use.
+        Args:
+            model_name (str): SentenceTransformer model to load.
+            cache_size (int): Number of ad-hoc strings whose embeddings are kept in the LRU.
+        """
+        self.model = LazyModel(lambda: SentenceTransformer(model_name))
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, texts):
+        """
+        Encode descriptions in one batch.
+        Args:
+            texts (list): Descriptions to encode.
+        Returns:
+            np.ndarray: (N, d) float32 matrix of L2-normalized embeddings.
+        """
+        count_model_call("text_matcher", self.model)
+        with timed("text_encode"):
+            embeddings = self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def warmup(self):
+        """Load the model and run one dummy encode."""
+        self.encode(["warm up"])
+
+    def embed(self, text):
+        """
+        Embedding of a single description, served from the LRU when possible.
+        Args:
+            text (str): Description to encode.
+        Returns:
+            np.ndarray: (d,) normalized embedding.
+        """
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+        embedding = self.encode([text])[0]
+        with self._lock:
+            self._cache[text] = embedding
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return embedding
+
+    @staticmethod
+    def score_batch(query, matrix):
+        """
+        Cosine similarity of one embedding against many, as a single matmul.
+        Args:
+            query (np.ndarray): (d,) normalized query embedding.
+            matrix (np.ndarray): (N, d) normalized embeddings.
+        Returns:
+            np.ndarray: (N,) similarities.
         """
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-    
+        if len(matrix) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(matrix, dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+
+    @staticmethod
+    def pack(embedding) -> bytes:
+        """Serialize an embedding for storage on the item document."""
+        return np.asarray(embedding, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def unpack(data) -> np.ndarray:
+        """Inverse of pack."""
+        return np.frombuffer(data, dtype=np.float32)
+
     def compute_similarity(self, desc1, desc2):
         """
         Compute cosine similarity between two descriptions.
@@ -17,14 +88,10 @@ class TextMatcher:
         Returns:
             float: Cosine similarity score (0 to 1).
         """
-        # Encode descriptions
-        embeddings = self.model.encode([desc1, desc2], convert_to_tensor=True)
-        # Compute cosine similarity
-        similarity = util.cos_sim(embeddings[0], embeddings[1]).item()
-        return similarity
+        return float(self.embed(desc1) @ self.embed(desc2))
 
 if __name__ == "__main__":
     # Example usage
     matcher = TextMatcher()
     sim = matcher.compute_similarity("Blue backpack with laptop", "Navy blue backpack")
-    print(f"Similarity: {sim}")
\ No newline at end of file
+    print(f"Similarity: {sim}")
@@ -0,0 +1,68 @@
+"""
+Compare KD-tree radius and nearest-neighbour queries against a brute-force haversine scan.
+
+Usage: python benchmarks/bench_geo.py [--locations 50000] [--queries 1000] [--radius 200] [--k 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from geo import GeoIndex, haversine_m
+
+# Roughly the extent of a large campus, around the default location
+CENTER = (36.8344, 10.1456)
+SPAN_DEGREES = 0.02
+
+def timed_ms(fn, points):
+    start = time.perf_counter()
+    results = [fn(lat, lng) for lat, lng in points]
+    return (time.perf_counter() - start) * 1000 / len(points), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--locations", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--radius", type=float, default=200.0, help="Radius in meters")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    lat = CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES, args.locations)
+    lng = CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES, args.locations)
+    points = np.column_stack([
+        CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES, args.queries),
+        CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES, args.queries),
+    ]).tolist()
+
+    start = time.perf_counter()
+    geo = GeoIndex(lat, lng)
+    print(f"{args.locations} locations, tree built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def brute_within(qlat, qlng):
+        distances = haversine_m(qlat, qlng, lat, lng)
+        rows = np.flatnonzero(distances <= args.radius)
+        return rows[np.argsort(distances[rows], kind='stable')]
+
+    def brute_nearest(qlat, qlng):
+        return np.argsort(haversine_m(qlat, qlng, lat, lng), kind='stable')[:args.k]
+
+    print(f"{'query':>22} {'ms/query':>9} {'agrees':>7}")
+    brute_ms, expected = timed_ms(brute_within, points)
+    tree_ms, found = timed_ms(lambda qlat, qlng: geo.within(qlat, qlng, args.radius)[0], points)
+    agrees = np.mean([set(a.tolist()) == set(b.tolist()) for a, b in zip(found, expected)])
+    print(f"{f'brute within {args.radius:.0f} m':>22} {brute_ms:>9.3f} {'':>7}")
+    print(f"{f'kd-tree within {args.radius:.0f} m':>22} {tree_ms:>9.3f} {agrees:>7.1%}")
+
+    brute_ms, expected = timed_ms(brute_nearest, points)
+    tree_ms, found = timed_ms(lambda qlat, qlng: geo.nearest(qlat, qlng, args.k)[0], points)
+    agrees = np.mean([set(a.tolist()) == set(b.tolist()) for a, b in zip(found, expected)])
+    print(f"{f'brute nearest {args.k}':>22} {brute_ms:>9.3f} {'':>7}")
+    print(f"{f'kd-tree nearest {args.k}':>22} {tree_ms:>9.3f} {agrees:>7.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare recall and latency of the location index types against exact cosine search.
+
+Usage: python benchmarks/bench_index.py [--locations 100000] [--queries 1000] [--k 5] [--types flat-ip hnsw ivfpq]
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from index_artifact import LocationIndex
+from index_types import INDEX_TYPES, IndexConfig, build_index, configure_search, prepare_vectors
+
+def synthetic_locations(rng, count, dim, clusters):
+    """
+    Embedding-like vectors: rooms of the same building share a direction, with per-room noise.
+    Queries are perturbed copies of random locations, like alias phrasings of a title.
+    """
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+def recall_at_k(found, expected):
+    hits = sum(len(set(row_found) & set(row_expected)) for row_found, row_expected in zip(found, expected))
+    return hits / expected.size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--locations", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--refine", type=int, default=4, help="IVF-PQ candidates re-ranked per result")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(args.seed)
+    embeddings = synthetic_locations(rng, args.locations, args.dim, args.clusters)
+    ids = np.arange(1, args.locations + 1, dtype=np.int64)
+    queries = embeddings[rng.integers(0, args.locations, args.queries)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32)
+
+    # Exact cosine search is the reference every mode is scored against
+    baseline = build_index(embeddings, ids, IndexConfig("flat-ip"))
+    _, expected = baseline.search(prepare_vectors(queries, "ip"), args.k)
+
+    print(f"{args.locations} locations, {args.queries} queries, dim {args.dim}, k {args.k}, {args.threads} thread(s)")
+    print(f"{'type':>8} {'knob':>18} {'build (s)':>10} {'size (MB)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'batch qps':>10} {'recall@k':>9}")
+    for index_type in args.types:
+        config = IndexConfig(index_type)
+        start = time.perf_counter()
+        index = build_index(embeddings, ids, config)
+        build_time = time.perf_counter() - start
+        size = faiss.serialize_index(index).nbytes / 1e6
+        # Search through LocationIndex, as the service does (IVF-PQ re-ranking included)
+        knobs = {
+            "hnsw": [IndexConfig(index_type, ef_search=value) for value in args.ef_search],
+            "ivfpq": [IndexConfig(index_type, nprobe=value, refine=refine)
+                      for value in args.nprobe for refine in (1, args.refine)],
+        }.get(index_type, [config])
+        for knob in knobs:
+            configure_search(index, knob)
+            locations = LocationIndex(index, ids, None, None, None, embeddings, {"index": config.build_params()},
+                                      refine=knob.refine if index_type == "ivfpq" else 1)
+            latencies = []
+            for row in range(len(queries)):
+                start = time.perf_counter()
+                locations.search(queries[row:row + 1], args.k)
+                latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            _, found = locations.search(queries, args.k)
+            batch_qps = len(queries) / (time.perf_counter() - start)
+            label = {"hnsw": f"efSearch={knob.ef_search}",
+                     "ivfpq": f"nprobe={knob.nprobe},refine={knob.refine}"}.get(index_type, "-")
+            print(f"{index_type:>8} {label:>18} {build_time:>10.2f} {size:>10.1f} "
+                  f"{np.percentile(latencies, 50) * 1000:>9.3f} {np.percentile(latencies, 99) * 1000:>9.3f} "
+                  f"{batch_qps:>10.0f} {recall_at_k(found, expected):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
+import argparse
 import json
-import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
-import pickle
 import os
+from index_artifact import file_sha256, location_columns, write_artifact
+from index_types import IndexConfig, build_index
+
+MODEL_NAME = os.environ.get("NAV_MODEL_NAME", "all-MiniLM-L6-v2")
+LOCATIONS_PATH = os.environ.get("NAV_LOCATIONS_PATH", "data/location.json")
+ARTIFACT_DIR = os.environ.get("NAV_ARTIFACT_DIR", "artifacts")
 
 # Vérifier et créer le répertoire data/ si nécessaire
 if not os.path.exists('data'):
@@ -16,29 +21,59 @@ def load_locations(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
 
-# Generate embeddings and store in FAISS
-def create_faiss_index(location_data, output_path='faiss_index.bin'):
+# Generate embeddings and store them, with the FAISS index, as a versioned artifact
+def create_faiss_index(location_data, output_dir=ARTIFACT_DIR, source_path=LOCATIONS_PATH, model_name=MODEL_NAME,
+                       config=None):
     # Initialize SentenceTransformer model (local)
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(model_name)
     
     # Extract location titles for embedding
     titles = [item['title'] for item in location_data]
-    embeddings = model.encode(titles, convert_to_numpy=True)
+    embeddings = np.asarray(model.encode(titles, convert_to_numpy=True), dtype=np.float32)
     
-    # Create FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    # Create FAISS index keyed by location id (type from NAV_INDEX_TYPE)
+    config = config or IndexConfig.from_env()
+    columns = location_columns(location_data, embeddings)
+    index = build_index(columns["embeddings"], columns["ids"], config)
     
-    # Save index and location data
-    faiss.write_index(index, output_path)
-    with open('location_data.pkl', 'wb') as f:
-        pickle.dump(location_data, f)
+    # Save index, location columns and manifest
+    write_artifact(output_dir, columns, index, model_name, file_sha256(source_path), config)
     
     return index
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the location index, or update it incrementally.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("build", help="Embed every location and rebuild the index (default)")
+    commands.add_parser("reindex", help="Rebuild the index with NAV_INDEX_TYPE from the stored embeddings")
+    add = commands.add_parser("add", help="Add a location")
+    add.add_argument("--id", type=int, default=None)
+    update = commands.add_parser("update", help="Update a location; only a new title is re-embedded")
+    update.add_argument("--id", type=int, required=True)
+    for command in (add, update):
+        command.add_argument("--title", required=True)
+        command.add_argument("--lat", type=float, required=True)
+        command.add_argument("--lng", type=float, required=True)
+    delete = commands.add_parser("delete", help="Delete locations")
+    delete.add_argument("--id", type=int, nargs="+", required=True)
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    # Charger les données de localisation et créer l'index FAISS
-    location_data = load_locations('data/location.json')
-    create_faiss_index(location_data)
-    print("FAISS index created successfully for locations.")
\ No newline at end of file
+    args = parse_args()
+    if args.command in (None, "build"):
+        # Charger les données de localisation et créer l'index FAISS
+        location_data = load_locations(LOCATIONS_PATH)
+        create_faiss_index(location_data)
+        print("FAISS index created successfully for locations.")
+    else:
+        # Mise à jour incrémentale : les services en cours la chargent via /admin/reload ou NAV_RELOAD_INTERVAL_SECONDS
+        from index_manager import IndexManager
+        manager = IndexManager(SentenceTransformer(MODEL_NAME), MODEL_NAME, ARTIFACT_DIR, LOCATIONS_PATH,
+                               config=IndexConfig.from_env(), check_index_type=args.command != "reindex")
+        if args.command == "reindex":
+            result = manager.reindex()
+        elif args.command == "delete":
+            result = manager.delete(args.id)
+        else:
+            result = manager.upsert([{"id": args.id, "title": args.title, "location": {"lat": args.lat, "lng": args.lng}}])
+        print(json.dumps(result))
@@ -0,0 +1,105 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Mean Earth radius (IUGG); haversine on a sphere is within 0.5% of the ellipsoid, far below GPS error
+EARTH_RADIUS_M = 6_371_008.8
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in meters, vectorized over any broadcastable arrays.
+    Args:
+        lat1, lng1: Coordinates of the first points, in degrees.
+        lat2, lng2: Coordinates of the second points, in degrees.
+    Returns:
+        np.ndarray: Distances in meters.
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def to_ecef(lat, lng):
+    """
+    Points on the sphere as 3-d cartesian coordinates in meters; straight-line
+    distance between them grows monotonically with great-circle distance.
+    """
+    lat, lng = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lng, dtype=np.float64))
+    return EARTH_RADIUS_M * np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+def chord_m(distance_m):
+    """Straight-line length of a great-circle arc, the search radius to use in ECEF space."""
+    return 2 * EARTH_RADIUS_M * np.sin(np.minimum(distance_m, np.pi * EARTH_RADIUS_M) / (2 * EARTH_RADIUS_M))
+
+class GeoIndex:
+    def __init__(self, lat, lng):
+        """
+        KD-tree over location coordinates (converted to ECEF, so it works across
+        the antimeridian and near the poles). Queries return rows of the input arrays.
+        Args:
+            lat (np.ndarray): Latitudes in degrees.
+            lng (np.ndarray): Longitudes in degrees.
+        """
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.tree = cKDTree(to_ecef(self.lat, self.lng)) if len(self.lat) else None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def distances(self, lat, lng, rows):
+        """Haversine distances (m) from a point to the given rows."""
+        return haversine_m(lat, lng, self.lat[rows], self.lng[rows])
+
+    def within(self, lat, lng, radius_m, limit=None):
+        """
+        Locations within `radius_m` of a point, closest first.
+        Args:
+            lat (float): Latitude of the point.
+            lng (float): Longitude of the point.
+            radius_m (float): Search radius in meters.
+            limit (int): Maximum number of results (None: all).
+        Returns:
+            tuple: (rows, distances in meters), both sorted by distance.
+        """
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        point = to_ecef(lat, lng)[0]
+        rows = np.asarray(self.tree.query_ball_point(point, chord_m(radius_m)), dtype=np.int64)
+        distances = self.distances(lat, lng, rows)
+        order = np.argsort(distances, kind='stable')[:limit]
+        return rows[order], distances[order]
+
+    def nearest(self, lat, lng, k=1):
+        """
+        The `k` locations closest to a point.
+        Returns:
+            tuple: (rows, distances in meters), closest first.
+        """
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        k = min(k, len(self))
+        _, rows = self.tree.query(to_ecef(lat, lng)[0], k=k)
+        rows = np.atleast_1d(rows).astype(np.int64)
+        return rows, self.distances(lat, lng, rows)
+
+def rerank_by_distance(semantic_distances, rows, distances_m, margin, radius_m=None):
+    """
+    Reorder semantic candidates by how far they are from the user.
+    Only candidates whose semantic distance is within `margin` of the best one are
+    kept, so "nearest restroom" picks the closest restroom rather than the closest
+    building that happens to be in the top-k.
+    Args:
+        semantic_distances (np.ndarray): (k,) distances from LocationIndex.search, closest first.
+        rows (np.ndarray): (k,) column rows of the candidates (-1 for no result).
+        distances_m (np.ndarray): (k,) distances from the user in meters.
+        margin (float): Allowed semantic distance above the best candidate.
+        radius_m (float): Drop candidates farther than this from the user (None: no limit).
+    Returns:
+        np.ndarray: Candidate positions (indices into the inputs), closest to the user first.
+    """
+    keep = (rows >= 0) & np.isfinite(semantic_distances)
+    if keep.any():
+        keep &= semantic_distances <= semantic_distances[keep].min() + margin
+    if radius_m is not None:
+        keep &= distances_m <= radius_m
+    positions = np.flatnonzero(keep)
+    return positions[np.argsort(distances_m[positions], kind='stable')]
@@ -0,0 +1,67 @@
+"""
+Production launch: gunicorn managing uvicorn workers.
+
+The model and the index load in the master before forking (preload_app with
+PRELOAD_MODELS), so workers share the weights copy-on-write instead of loading one
+copy each (the index is memory-mapped, so its pages are shared either way). Every
+worker caps its Torch/OpenMP/FAISS/OpenCV threads at THREADS_PER_WORKER, so N
+workers do not oversubscribe the CPU.
+
+Usage: gunicorn -c gunicorn.conf.py main:app
+Settings: WEB_CONCURRENCY (workers), THREADS_PER_WORKER (default: CPUs / workers),
+          PRELOAD_MODELS, BIND, GUNICORN_TIMEOUT, PROMETHEUS_MULTIPROC_DIR.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+SERVICE = "navigation-bot"
+THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Heartbeat files on tmpfs: a slow disk must not get healthy workers killed
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+threads_per_worker = int(os.environ.get("THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // workers)
+
+os.environ.setdefault("PRELOAD_MODELS", "1")
+preload_app = os.environ["PRELOAD_MODELS"].lower() in ("1", "true", "yes")
+
+if preload_app:
+    # The master only loads and warms up the model: single-threaded, so no OpenMP
+    # thread team exists at fork time (GNU OpenMP is not fork-safe once it has one)
+    for name in THREAD_ENV:
+        os.environ[name] = "1"
+
+if workers > 1:
+    # Each worker writes its metrics to this directory and /metrics aggregates them;
+    # files left by a previous run would be added to the new counts
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"prometheus-{SERVICE}"))
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+def limit_threads(count):
+    """Apply a thread cap to the libraries already imported; later imports read the environment."""
+    for name in THREAD_ENV:
+        os.environ[name] = str(count)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(count)
+    if "faiss" in sys.modules:
+        sys.modules["faiss"].omp_set_num_threads(count)
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(count)
+
+def post_fork(server, worker):
+    limit_threads(threads_per_worker)
+    server.log.info(f"Worker {worker.pid}: {threads_per_worker} thread(s), models preloaded: {preload_app}")
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
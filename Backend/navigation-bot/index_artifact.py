@@ -0,0 +1,308 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+import faiss
+import numpy as np
+from geo import GeoIndex
+from index_types import IndexConfig, configure_search, prepare_vectors
+
+# Bumped whenever the on-disk layout changes; older artifacts are refused
+ARTIFACT_FORMAT = 3
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+COLUMN_FILES = {"ids": "ids.npy", "titles": "titles.npy", "lat": "lat.npy", "lng": "lng.npy", "embeddings": "embeddings.npy"}
+CURRENT_FILE = "CURRENT"
+# Older versions kept on disk after a new one becomes current
+KEEP_VERSIONS = 3
+
+class ArtifactMismatchError(Exception):
+    """The index artifact is missing, incomplete or was built from other data or another model."""
+
+def file_sha256(path):
+    """
+    Hash of a source file, recorded in the manifest to detect stale artifacts.
+    Args:
+        path (str): File to hash.
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def location_columns(location_data, embeddings):
+    """
+    Columnar location table, sorted by location id.
+    Args:
+        location_data (list): Locations as {id, title, location: {lat, lng}} dicts.
+        embeddings (np.ndarray): (N, d) title embeddings, in the order of `location_data`.
+    Returns:
+        dict: ids, titles, lat, lng and embeddings columns.
+    """
+    ids = np.array([item['id'] for item in location_data], dtype=np.int64)
+    if len(np.unique(ids)) != len(ids):
+        raise ValueError("Location ids must be unique")
+    order = np.argsort(ids, kind='stable')
+    return {
+        "ids": ids[order],
+        # Fixed-width unicode keeps the titles loadable without pickle and mappable from disk
+        "titles": np.array([item['title'] for item in location_data], dtype=str)[order],
+        "lat": np.array([item['location']['lat'] for item in location_data], dtype=np.float64)[order],
+        "lng": np.array([item['location']['lng'] for item in location_data], dtype=np.float64)[order],
+        "embeddings": np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32)[order]),
+    }
+
+class LocationIndex:
+    def __init__(self, index, ids, titles, lat, lng, embeddings, manifest, refine=1):
+        """
+        FAISS index and the columnar location table it points into.
+        The index returns location ids; columns are sorted by id, so the row of an id is found by binary search.
+        Args:
+            index: FAISS IndexIDMap keyed by location id.
+            ids (np.ndarray): Sorted int64 location ids.
+            titles (np.ndarray): Location titles.
+            lat (np.ndarray): Latitudes.
+            lng (np.ndarray): Longitudes.
+            embeddings (np.ndarray): (N, d) title embeddings the index was built from.
+            manifest (dict): Build metadata.
+            refine (int): Candidates fetched per result and re-ranked exactly (1: trust the index scores).
+        """
+        self.index = index
+        self.ids = ids
+        self.titles = titles
+        self.lat = lat
+        self.lng = lng
+        self.embeddings = embeddings
+        self.manifest = manifest
+        self.refine = max(1, refine)
+        self._geo = None
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def geo(self):
+        """Spatial index over the coordinates, built on first use (a snapshot never changes)."""
+        if self._geo is None:
+            self._geo = GeoIndex(self.lat, self.lng)
+        return self._geo
+
+    @property
+    def metric(self):
+        return self.manifest.get("index", {}).get("metric", "l2")
+
+    def search(self, queries, k):
+        """
+        Nearest locations of each query.
+        Inner-product indexes search normalized queries; their similarities are reported
+        as squared L2 distances between unit vectors (2 - 2 * cosine), so smaller is
+        closer for every index type.
+        Args:
+            queries (np.ndarray): (N, d) raw query embeddings.
+            k (int): Results per query.
+        Returns:
+            tuple: (N, k) distances and (N, k) location ids (-1 where fewer than k results).
+        """
+        vectors = prepare_vectors(queries, self.metric)
+        if self.refine > 1:
+            return self._rerank(vectors, self.index.search(vectors, k * self.refine)[1], k)
+        distances, ids = self.index.search(vectors, k)
+        if self.metric == "ip":
+            distances = np.where(ids >= 0, 2.0 - 2.0 * distances, np.inf).astype(np.float32)
+        return distances, ids
+
+    def _rerank(self, vectors, candidates, k):
+        # Exact distances to the stored embeddings fix the ordering of compressed (PQ) scores
+        rows = self.rows(candidates)
+        valid = rows >= 0
+        embeddings = prepare_vectors(self.embeddings[np.where(valid, rows, 0)].reshape(-1, vectors.shape[1]), self.metric)
+        embeddings = embeddings.reshape(*rows.shape, vectors.shape[1])
+        if self.metric == "ip":
+            distances = 2.0 - 2.0 * np.einsum('nkd,nd->nk', embeddings, vectors)
+        else:
+            distances = np.square(embeddings - vectors[:, None, :]).sum(axis=2)
+        distances = np.where(valid, distances, np.inf).astype(np.float32)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        ids = np.where(np.take_along_axis(valid, order, axis=1), np.take_along_axis(candidates, order, axis=1), -1)
+        return np.take_along_axis(distances, order, axis=1), ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, ids):
+        """
+        Column rows of location ids, vectorized.
+        Args:
+            ids (np.ndarray): Location ids, as returned by index.search (-1 for no result).
+        Returns:
+            np.ndarray: Row of each id, or -1 for unknown ids.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return np.where((ids >= 0) & (self.ids[positions] == ids), positions, -1)
+
+    def location(self, row):
+        """Location at `row` as a {id, title, location: {lat, lng}} dict."""
+        return {
+            "id": int(self.ids[row]),
+            "title": str(self.titles[row]),
+            "location": {"lat": float(self.lat[row]), "lng": float(self.lng[row])},
+        }
+
+    def locations(self):
+        return [self.location(row) for row in range(len(self))]
+
+def write_artifact(root, columns, index, model_name, source_sha256, config=None):
+    """
+    Write a new artifact version under `root` and make it current.
+    The version directory is fully written before CURRENT is switched to it,
+    so readers never see a half-written artifact.
+    Args:
+        root (str): Artifact root directory.
+        columns (dict): Location columns, see location_columns.
+        index: FAISS index keyed by the ids column.
+        model_name (str): SentenceTransformer used for the embeddings.
+        source_sha256 (str): Hash of the location source file.
+        config (IndexConfig): Index type and build parameters the index was built with.
+    Returns:
+        str: Directory of the new version.
+    """
+    index_params = (config or IndexConfig()).build_params()
+    fingerprint = f"{ARTIFACT_FORMAT}:{model_name}:{source_sha256}:{json.dumps(index_params, sort_keys=True)}"
+    version = hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "model_name": model_name,
+        "dim": int(columns["embeddings"].shape[1]),
+        "count": len(columns["ids"]),
+        "source_sha256": source_sha256,
+        "index": index_params,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+    }
+
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    faiss.write_index(index, os.path.join(staging, INDEX_FILE))
+    for name, file_name in COLUMN_FILES.items():
+        np.save(os.path.join(staging, file_name), columns[name], allow_pickle=False)
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    target = os.path.join(root, version)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    with open(os.path.join(root, f".{CURRENT_FILE}.tmp"), 'w') as f:
+        f.write(version)
+    os.replace(os.path.join(root, f".{CURRENT_FILE}.tmp"), os.path.join(root, CURRENT_FILE))
+    prune_versions(root, keep=version)
+    return target
+
+def prune_versions(root, keep):
+    """
+    Delete all but the newest KEEP_VERSIONS versions.
+    Workers still serving a deleted version are unaffected: their mapped files stay valid until unmapped.
+    """
+    versions = [
+        entry for entry in os.scandir(root)
+        if entry.is_dir() and not entry.name.startswith('.') and entry.name != keep
+    ]
+    versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+def current_version(root):
+    """Version CURRENT points to, or None."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def resolve_version_dir(path):
+    """
+    Directory holding the artifact files.
+    Args:
+        path (str): Either an artifact root (with a CURRENT pointer) or a version directory.
+    Returns:
+        str: Version directory.
+    """
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return path
+    version = current_version(path)
+    if version is None:
+        raise ArtifactMismatchError(f"No index artifact found at {path}; run `python embeddings.py` first")
+    return os.path.join(path, version)
+
+def read_index(path, mmap=True):
+    """Read a FAISS index, memory-mapped when the index type supports it."""
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
+
+def load_artifact(path, model_name=None, dim=None, source_path=None, config=None, mmap=True):
+    """
+    Load and validate an index artifact.
+    Columns are memory-mapped read-only, so workers loading the same artifact share pages.
+    Args:
+        path (str): Artifact root or version directory.
+        model_name (str): Model the service encodes queries with; must match the build.
+        dim (int): Embedding size of that model; must match the index.
+        source_path (str): Location source file; if it exists its hash must match the build.
+        config (IndexConfig): Expected index type; its runtime search knobs are applied to the index.
+        mmap (bool): Memory-map the index and columns instead of reading them into memory.
+    Returns:
+        LocationIndex: The validated index and location table.
+    Raises:
+        ArtifactMismatchError: If the artifact is missing, inconsistent or stale.
+    """
+    version_dir = resolve_version_dir(path)
+    try:
+        with open(os.path.join(version_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        index = read_index(os.path.join(version_dir, INDEX_FILE), mmap)
+        columns = {
+            name: np.load(os.path.join(version_dir, file_name), mmap_mode='r' if mmap else None, allow_pickle=False)
+            for name, file_name in COLUMN_FILES.items()
+        }
+    except (OSError, ValueError, RuntimeError) as e:
+        raise ArtifactMismatchError(f"Unreadable index artifact at {version_dir}: {e}") from e
+
+    def check(condition, message):
+        if not condition:
+            raise ArtifactMismatchError(f"Index artifact {version_dir}: {message}")
+
+    check(manifest.get("format") == ARTIFACT_FORMAT,
+          f"format {manifest.get('format')} is not supported (expected {ARTIFACT_FORMAT})")
+    check(model_name is None or manifest["model_name"] == model_name,
+          f"built with model {manifest['model_name']}, service uses {model_name}")
+    check(dim is None or manifest["dim"] == dim,
+          f"embedding dim {manifest['dim']} does not match the model ({dim})")
+    check(index.d == manifest["dim"], f"index dim {index.d} does not match the manifest ({manifest['dim']})")
+    check(index.ntotal == manifest["count"],
+          f"index holds {index.ntotal} vectors, manifest lists {manifest['count']} locations")
+    for name, column in columns.items():
+        check(len(column) == manifest["count"], f"{name} has {len(column)} rows, expected {manifest['count']}")
+    check(bool(np.all(np.diff(columns["ids"]) > 0)), "location ids are not sorted and unique")
+    if config is not None:
+        check(manifest["index"]["type"] == config.index_type,
+              f"index type {manifest['index']['type']} does not match NAV_INDEX_TYPE={config.index_type}; "
+              f"run `python embeddings.py reindex`")
+        configure_search(index, config)
+    if source_path is not None and os.path.exists(source_path):
+        check(file_sha256(source_path) == manifest["source_sha256"],
+              f"{source_path} changed since the artifact was built; rebuild it")
+    refine = config.refine if config is not None and manifest["index"]["type"] == "ivfpq" else 1
+    return LocationIndex(index, manifest=manifest, refine=refine, **columns)
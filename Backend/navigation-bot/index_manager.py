@@ -0,0 +1,217 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from index_artifact import COLUMN_FILES, current_version, file_sha256, load_artifact, write_artifact
+from index_types import IndexConfig, build_index, prepare_vectors
+
+logger = logging.getLogger(__name__)
+
+# Taken by every process writing to (exclusive) or loading from (shared) an artifact directory
+LOCK_FILE = ".write.lock"
+
+class IndexManager:
+    def __init__(self, model, model_name, artifact_dir, source_path, dim=None, config=None, check_index_type=True):
+        """
+        Owns the served LocationIndex and applies incremental location changes to it.
+        Readers take `current` once per request; writers build a new LocationIndex,
+        persist it and swap the reference, so searches never see a partial update.
+        Writes are serialized across processes (gunicorn workers, the CLI) by a lock
+        file in the artifact directory, and start from the latest written version.
+        Args:
+            model: SentenceTransformer used to embed new or renamed titles.
+            model_name (str): Name recorded in (and checked against) the artifact manifest.
+            artifact_dir (str): Artifact root directory.
+            source_path (str): Location source file, rewritten on every change.
+            dim (int): Embedding size of the model.
+            config (IndexConfig): Index type and parameters (default: flat-l2).
+            check_index_type (bool): Refuse an artifact built with another index type;
+                disabled only to reindex it with the configured one.
+        """
+        self.model = model
+        self.model_name = model_name
+        self.artifact_dir = artifact_dir
+        self.source_path = source_path
+        self.dim = dim
+        self.config = config or IndexConfig()
+        self.check_index_type = check_index_type
+        self._write_lock = threading.Lock()
+        with self._artifact_lock(exclusive=False):
+            self.current = self.load()
+
+    @contextmanager
+    def _artifact_lock(self, exclusive: bool):
+        """
+        flock on the artifact directory. Writers hold it exclusively while they rewrite
+        the source file and the artifact; loads hold it shared, so they never see the
+        source file of one version next to the manifest of another.
+        """
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        with open(os.path.join(self.artifact_dir, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive write section, starting from the version CURRENT points to (possibly written by another process)."""
+        with self._write_lock, self._artifact_lock(exclusive=True):
+            if current_version(self.artifact_dir) != self.current.version:
+                self.current = self.load()
+            yield self.current
+
+    def load(self):
+        return load_artifact(self.artifact_dir, model_name=self.model_name, dim=self.dim,
+                             source_path=self.source_path, config=self.config if self.check_index_type else None)
+
+    def reload(self):
+        """
+        Serve the version CURRENT points to, e.g. after a CLI update or a change made by another worker.
+        Returns:
+            str: Served version.
+        """
+        with self._write_lock, self._artifact_lock(exclusive=False):
+            if current_version(self.artifact_dir) != self.current.version:
+                self.current = self.load()
+            return self.current.version
+
+    def watch(self, interval):
+        """Poll for versions written by other processes every `interval` seconds (0 disables)."""
+        if interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"Index reload failed, still serving {self.current.version}: {e}")
+
+        threading.Thread(target=run, name="index-reload", daemon=True).start()
+
+    def upsert(self, locations: list) -> dict:
+        """
+        Add or update locations. Only new or renamed titles are embedded; coordinate
+        changes reuse the stored embedding. Index types without removal (HNSW) are
+        rebuilt from the stored embeddings instead of being edited in place.
+        Args:
+            locations (list): {id, title, location: {lat, lng}} dicts; a missing id adds a new location.
+        Returns:
+            dict: New version, location count, ids written and number of titles embedded.
+        """
+        with self._writing() as state:
+            next_id = int(max([state.ids.max() if len(state) else 0] +
+                              [item['id'] for item in locations if item.get('id') is not None])) + 1
+            ids = []
+            for item in locations:
+                if item.get('id') is None:
+                    ids.append(next_id)
+                    next_id += 1
+                else:
+                    ids.append(item['id'])
+            ids = np.array(ids, dtype=np.int64)
+            if len(np.unique(ids)) != len(ids):
+                raise ValueError("Duplicate location ids in request")
+
+            rows = state.rows(ids)
+            titles = np.array([item['title'] for item in locations], dtype=str)
+            embeddings = np.zeros((len(locations), state.embeddings.shape[1]), dtype=np.float32)
+            existing = rows >= 0
+            embeddings[existing] = state.embeddings[rows[existing]]
+            changed = ~existing
+            changed[existing] = state.titles[rows[existing]] != titles[existing]
+            if changed.any():
+                embeddings[changed] = self.encode(titles[changed].tolist())
+
+            new_rows = {
+                "ids": ids,
+                "titles": titles,
+                "lat": np.array([item['location']['lat'] for item in locations], dtype=np.float64),
+                "lng": np.array([item['location']['lng'] for item in locations], dtype=np.float64),
+                "embeddings": embeddings,
+            }
+            columns = self._merge(state, ~np.isin(state.ids, ids), new_rows)
+            if self.config.supports_removal:
+                index = faiss.clone_index(state.index)
+                index.remove_ids(ids[changed & existing])
+                if changed.any():
+                    index.add_with_ids(prepare_vectors(embeddings[changed], self.config.metric), ids[changed])
+            else:
+                index = build_index(columns["embeddings"], columns["ids"], self.config)
+            self._commit(columns, index)
+            return {
+                "version": self.current.version,
+                "count": len(self.current),
+                "ids": ids.tolist(),
+                "embedded": int(changed.sum()),
+            }
+
+    def delete(self, ids: list) -> dict:
+        """
+        Remove locations.
+        Args:
+            ids (list): Location ids.
+        Returns:
+            dict: New version and location count.
+        Raises:
+            KeyError: If an id is unknown; nothing is removed.
+        """
+        with self._writing() as state:
+            ids = np.array(ids, dtype=np.int64)
+            unknown = ids[state.rows(ids) < 0]
+            if len(unknown):
+                raise KeyError(f"Unknown location ids: {unknown.tolist()}")
+            columns = self._merge(state, ~np.isin(state.ids, ids))
+            if self.config.supports_removal:
+                index = faiss.clone_index(state.index)
+                index.remove_ids(ids)
+            else:
+                index = build_index(columns["embeddings"], columns["ids"], self.config)
+            self._commit(columns, index)
+            return {"version": self.current.version, "count": len(self.current)}
+
+    def reindex(self) -> dict:
+        """
+        Rebuild the index from the stored embeddings with the configured index type.
+        Nothing is re-embedded; used after changing NAV_INDEX_TYPE or its build parameters,
+        or to retrain IVF cells after many incremental additions.
+        Returns:
+            dict: New version, location count and index type.
+        """
+        with self._writing() as state:
+            columns = self._merge(state, np.ones(len(state), dtype=bool))
+            self._commit(columns, build_index(columns["embeddings"], columns["ids"], self.config))
+            return {"version": self.current.version, "count": len(self.current), "index_type": self.config.index_type}
+
+    def encode(self, titles):
+        return np.asarray(self.model.encode(titles, convert_to_numpy=True), dtype=np.float32)
+
+    @staticmethod
+    def _merge(state, keep, new_rows=None):
+        columns = {name: np.asarray(getattr(state, name))[keep] for name in COLUMN_FILES}
+        if new_rows is not None:
+            columns = {name: np.concatenate([columns[name], new_rows[name]]) for name in COLUMN_FILES}
+        order = np.argsort(columns["ids"], kind='stable')
+        return {name: np.ascontiguousarray(column[order]) for name, column in columns.items()}
+
+    def _commit(self, columns, index):
+        # Called with the artifact lock held. The source file is rewritten first, so a
+        # full rebuild gives the same index
+        locations = [
+            {"id": int(location_id), "title": str(title), "location": {"lat": float(lat), "lng": float(lng)}}
+            for location_id, title, lat, lng in zip(columns["ids"], columns["titles"], columns["lat"], columns["lng"])
+        ]
+        staging = f"{self.source_path}.tmp"
+        with open(staging, 'w', encoding='utf-8') as f:
+            json.dump(locations, f, indent=2, ensure_ascii=False)
+        os.replace(staging, self.source_path)
+        write_artifact(self.artifact_dir, columns, index, self.model_name, file_sha256(self.source_path), self.config)
+        self.current = self.load()
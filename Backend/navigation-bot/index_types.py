@@ -0,0 +1,118 @@
+import os
+import faiss
+import numpy as np
+
+# flat-l2 is exact on raw embeddings; the other types use normalized embeddings and inner product (cosine)
+INDEX_TYPES = ("flat-l2", "flat-ip", "hnsw", "ivfpq")
+
+class IndexConfig:
+    def __init__(self, index_type="flat-l2", hnsw_m=32, ef_construction=200, ef_search=64,
+                 nlist=0, pq_m=16, nprobe=16, refine=4):
+        """
+        Index type with its build parameters and runtime search knobs.
+        Args:
+            index_type (str): One of INDEX_TYPES.
+            hnsw_m (int): HNSW graph degree.
+            ef_construction (int): HNSW candidate list size while building.
+            ef_search (int): HNSW candidate list size while searching (runtime).
+            nlist (int): IVF cells; 0 picks about 4 * sqrt(N).
+            pq_m (int): PQ sub-quantizers; lowered to a divisor of the embedding size if needed.
+            nprobe (int): IVF cells visited per search (runtime).
+            refine (int): IVF-PQ fetches k * refine candidates and re-ranks them exactly
+                with the stored embeddings (runtime; 1 disables).
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.refine = refine
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            index_type=os.environ.get("NAV_INDEX_TYPE", "flat-l2"),
+            hnsw_m=int(os.environ.get("NAV_HNSW_M", "32")),
+            ef_construction=int(os.environ.get("NAV_HNSW_EF_CONSTRUCTION", "200")),
+            ef_search=int(os.environ.get("NAV_HNSW_EF_SEARCH", "64")),
+            nlist=int(os.environ.get("NAV_IVF_NLIST", "0")),
+            pq_m=int(os.environ.get("NAV_PQ_M", "16")),
+            nprobe=int(os.environ.get("NAV_IVF_NPROBE", "16")),
+            refine=int(os.environ.get("NAV_IVF_REFINE", "4")),
+        )
+
+    @property
+    def metric(self):
+        return "l2" if self.index_type == "flat-l2" else "ip"
+
+    @property
+    def supports_removal(self):
+        """HNSW graphs cannot drop vectors; such indexes are rebuilt from the stored embeddings."""
+        return self.index_type != "hnsw"
+
+    def build_params(self):
+        """Build-time parameters, recorded in the artifact manifest."""
+        params = {"type": self.index_type, "metric": self.metric}
+        if self.index_type == "hnsw":
+            params.update(hnsw_m=self.hnsw_m, ef_construction=self.ef_construction)
+        elif self.index_type == "ivfpq":
+            params.update(nlist=self.nlist, pq_m=self.pq_m)
+        return params
+
+def prepare_vectors(embeddings, metric):
+    """Float32, contiguous and, for inner-product indexes, L2-normalized vectors."""
+    vectors = np.array(embeddings, dtype=np.float32, order='C', copy=True)
+    if metric == "ip" and len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def largest_divisor(value, limit):
+    return max(divisor for divisor in range(1, max(1, min(value, limit)) + 1) if value % divisor == 0)
+
+def build_index(embeddings, ids, config=None):
+    """
+    Index over title embeddings, keyed by location id.
+    Args:
+        embeddings (np.ndarray): (N, d) raw float32 embeddings.
+        ids (np.ndarray): (N,) int64 location ids.
+        config (IndexConfig): Index type and parameters (default: exact flat-l2).
+    Returns:
+        faiss.IndexIDMap: The index, trained if needed and populated.
+    """
+    config = config or IndexConfig()
+    vectors = prepare_vectors(embeddings, config.metric)
+    dim = vectors.shape[1]
+    count = len(vectors)
+    if config.index_type == "flat-l2":
+        base = faiss.IndexFlatL2(dim)
+    elif config.index_type == "flat-ip":
+        base = faiss.IndexFlatIP(dim)
+    elif config.index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config.ef_construction
+    else:
+        # k-means needs at least as many training points as centroids (ideally ~39 per centroid)
+        nlist = max(1, min(config.nlist or int(4 * np.sqrt(count)), count // 39))
+        nbits = int(min(8, max(1, np.log2(max(count, 2)))))
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, nlist, largest_divisor(dim, config.pq_m), nbits,
+                                faiss.METRIC_INNER_PRODUCT)
+        base.train(vectors)
+    index = faiss.IndexIDMap(base)
+    if count:
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    configure_search(index, config)
+    return index
+
+def configure_search(index, config):
+    """Apply the runtime search knobs (efSearch, nprobe) to a built or loaded index."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = config.ef_search
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(config.nprobe, base.nlist)
+    return index
@@ -0,0 +1,105 @@
+# Copied verbatim in lost-and-found and navigation-bot: each service is its own Docker
+# build context. Keep both copies identical, and service-specific code out of them.
+import contextvars
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from starlette.responses import Response
+
+# Sub-millisecond buckets too: cache lookups and index searches are often that fast
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_ID_HEADER = "X-Request-ID"
+LOG_REQUEST_IDS = os.environ.get("LOG_REQUEST_IDS", "1").lower() in ("1", "true", "yes")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request or background job",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+MODEL_CALLS = Counter(
+    "model_calls_total", "Model calls, cold when the call had to load the model first",
+    ["model", "state"],
+)
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+@contextmanager
+def timed(stage: str):
+    """
+    Record the wall time of a block in the stage histogram. Also usable as a decorator
+    on sync functions; in async code, wrap the awaits in `with timed(...)`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+def count_model_call(name: str, model):
+    """Count a call on a LazyModel as warm or cold; call it before the model is used."""
+    MODEL_CALLS.labels(name, "warm" if getattr(model, "loaded", True) else "cold").inc()
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+def configure_logging():
+    """Log to stderr, with the id of the current request when LOG_REQUEST_IDS is on."""
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    request_id = " [%(request_id)s]" if LOG_REQUEST_IDS else ""
+    handler.setFormatter(logging.Formatter(f"%(asctime)s %(levelname)s %(name)s{request_id}: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+def metrics_response() -> Response:
+    """
+    Current metrics in the Prometheus text format. With several worker processes,
+    PROMETHEUS_MULTIPROC_DIR must point to a directory shared by the workers so
+    every worker's samples are aggregated.
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+def instrument(app):
+    """
+    Add GET /metrics and a middleware that times every request by route template and
+    tags it with an id (the client's X-Request-ID, or a new one) returned in the response.
+    Streamed responses are timed until their headers are sent.
+    """
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers[REQUEST_ID_HEADER] = request_id
+            return response
+        finally:
+            # Label by template (/items/{item_id}), or by mount (/data), never by raw path
+            route = request.scope.get("route")
+            label = route.path if route is not None else request.scope.get("root_path") or "unmatched"
+            REQUEST_SECONDS.labels(request.method, label, str(status)).observe(time.perf_counter() - start)
+            request_id_var.reset(token)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return metrics_response()
+
+    return app
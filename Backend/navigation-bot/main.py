@@ -1,12 +1,37 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import faiss
-import pickle
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+import os
+import secrets
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from index_manager import IndexManager
+from index_types import IndexConfig
+from query_encoder import QueryEncoder
+from index_artifact import ArtifactMismatchError
+from lifecycle import LazyModel, Startup
+from instrumentation import configure_logging, instrument, timed
+from geo import rerank_by_distance
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Navigation Bot API")
+configure_logging()
+
+# The model loads in the background after startup (or before fork with PRELOAD_MODELS=1)
+startup = Startup()
+
+@asynccontextmanager
+async def lifespan(app):
+    # The index is memory-mapped, so this is fast; a mismatched artifact stops startup here
+    startup.tasks["index"].run_sync()
+    index_manager.watch(RELOAD_INTERVAL_SECONDS)
+    startup.start()
+    yield
+    await startup.stop()
+
+app = FastAPI(title="Navigation Bot API", lifespan=lifespan)
+instrument(app)
 
 # Add CORS middleware
 app.add_middleware(
@@ -15,60 +40,337 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Batch size and result bounds of /ask/batch
+MAX_BATCH_QUERIES = int(os.environ.get("ASK_MAX_BATCH_QUERIES", "64"))
+MAX_TOP_K = int(os.environ.get("ASK_MAX_TOP_K", "10"))
+# Distance above which a location is not considered a confident match (unset: no cutoff).
+# Squared L2 between raw embeddings for flat-l2, 2 - 2 * cosine for the other index types.
+DEFAULT_MAX_DISTANCE = float(os.environ["ASK_MAX_DISTANCE"]) if os.environ.get("ASK_MAX_DISTANCE") else None
+# With a position, /ask reranks this many semantic candidates by distance from the user,
+# keeping those within GEO_RERANK_MARGIN of the best semantic distance
+GEO_CANDIDATES = int(os.environ.get("GEO_CANDIDATES", "10"))
+GEO_RERANK_MARGIN = float(os.environ.get("GEO_RERANK_MARGIN", "0.2"))
+MAX_NEARBY_RESULTS = int(os.environ.get("NEARBY_MAX_RESULTS", "50"))
+
+class Position(BaseModel):
+    lat: Optional[float] = Field(default=None, ge=-90, le=90)
+    lng: Optional[float] = Field(default=None, ge=-180, le=180)
+    radius_m: Optional[float] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def check_coordinates(self):
+        if (self.lat is None) != (self.lng is None):
+            raise ValueError("lat and lng must be given together")
+        if self.radius_m is not None and self.lat is None:
+            raise ValueError("radius_m requires lat and lng")
+        return self
+
+    @property
+    def located(self):
+        return self.lat is not None
+
 # Pydantic model for request
-class QueryRequest(BaseModel):
+class QueryRequest(Position):
     query: str
 
+class NearbyRequest(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    radius_m: Optional[float] = Field(default=None, gt=0)
+    k: int = Field(default=5, ge=1, le=MAX_NEARBY_RESULTS)
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=MAX_BATCH_QUERIES)
+    k: int = Field(default=1, ge=1, le=MAX_TOP_K)
+    max_distance: Optional[float] = Field(default=None, ge=0)
+
+class Coordinates(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+class LocationIn(BaseModel):
+    id: Optional[int] = Field(default=None, ge=0)
+    title: str = Field(min_length=1)
+    location: Coordinates
+
+class LocationsUpsert(BaseModel):
+    locations: List[LocationIn] = Field(min_length=1)
+
+MODEL_NAME = os.environ.get("NAV_MODEL_NAME", "all-MiniLM-L6-v2")
+LOCATIONS_PATH = os.environ.get("NAV_LOCATIONS_PATH", "data/location.json")
+ARTIFACT_DIR = os.environ.get("NAV_ARTIFACT_DIR", "artifacts")
+# Seconds between checks for index versions written by the CLI or another worker (0 disables)
+RELOAD_INTERVAL_SECONDS = float(os.environ.get("NAV_RELOAD_INTERVAL_SECONDS", "10"))
+# Token expected in X-Admin-Token; the admin API is disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
 # Load FAISS index and location data
-def load_faiss_index(index_path='faiss_index.bin', location_path='location_data.pkl'):
-    with open(location_path, 'rb') as f:
-        location_data = pickle.load(f)
-    index = faiss.read_index(index_path)
-    return index, location_data
+def load_faiss_index(artifact_dir=ARTIFACT_DIR, dim=None):
+    """
+    Load the index artifact built by embeddings.py.
+    Raises ArtifactMismatchError, so the service refuses to start, when the artifact
+    was built with another model, index type or version of the location file.
+    Args:
+        artifact_dir (str): Artifact root directory.
+        dim (int): Embedding size of the query model, if already known.
+    Returns:
+        IndexManager: Serves the current index and applies incremental updates.
+    """
+    return IndexManager(model, MODEL_NAME, artifact_dir, LOCATIONS_PATH, dim=dim, config=IndexConfig.from_env())
+
+# Initialize the model and load the index, both on first use or by the startup tasks
+model = LazyModel(lambda: SentenceTransformer(MODEL_NAME))
+index_manager = LazyModel(load_faiss_index)
+
+def warm_up_model():
+    dim = model.get_sentence_embedding_dimension()
+    if dim != index_manager.current.manifest["dim"]:
+        raise ArtifactMismatchError(
+            f"Model {MODEL_NAME} produces {dim}-d embeddings, the index holds {index_manager.current.manifest['dim']}-d"
+        )
+    model.encode(["warm up"], convert_to_numpy=True)
+
+startup.add("index", index_manager.get)
+startup.add("model", warm_up_model)
+
+# Query embeddings: normalized-query LRU with TTL, misses encoded in micro-batches off the event loop
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get("QUERY_CACHE_TTL_SECONDS", "3600"))
+ENCODER_MAX_BATCH_SIZE = int(os.environ.get("ENCODER_MAX_BATCH_SIZE", "32"))
+ENCODER_MAX_WAIT_MS = float(os.environ.get("ENCODER_MAX_WAIT_MS", "5"))
+query_encoder = QueryEncoder(
+    model,
+    cache_size=QUERY_CACHE_SIZE,
+    ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+    max_batch_size=ENCODER_MAX_BATCH_SIZE,
+    max_wait_ms=ENCODER_MAX_WAIT_MS
+)
+
+# Load the model at import time, so a pre-forking server shares it between workers
+if os.environ.get("PRELOAD_MODELS", "0").lower() in ("1", "true", "yes"):
+    startup.preload()
+
+NO_MATCH_ANSWER = "Aucun emplacement correspondant n'a été trouvé."
 
-# Initialize the model and load the index
-model = SentenceTransformer('all-MiniLM-L6-v2')
-index, location_data = load_faiss_index()
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """
+    Readiness: the index is loaded and the model is loaded and warmed up.
+    Returns 503 until then, so traffic is only routed to warm replicas.
+    """
+    if not startup.ready:
+        response.status_code = 503
+    return {"ready": startup.ready, "components": startup.status()}
 
 @app.post("/ask")
 async def ask_question(request: QueryRequest):
     """
     Answer a user query by finding the most similar location using FAISS.
+    With the user's position, the closest of the best semantic candidates wins.
     
     Args:
-        request (QueryRequest): The user's query in JSON format.
+        request (QueryRequest): The user's query in JSON format, optionally with
+            the user's lat/lng and a radius in meters.
     
     Returns:
         dict: A Google Maps URL and metadata of the matched location.
     """
     # Generate embedding for the query
-    query_embedding = model.encode([request.query], convert_to_numpy=True)
+    with timed("query_encode"):
+        query_embedding = await query_encoder.embed(request.query)
     
-    # Search in FAISS index
-    k = 1  # Number of nearest neighbors to retrieve
-    distances, indices = index.search(query_embedding, k)
+    # Search in FAISS index (one snapshot per request: updates swap it atomically)
+    locations = index_manager.current
+    k = GEO_CANDIDATES if request.located else 1  # Number of nearest neighbors to retrieve
+    with timed("faiss_search"):
+        distances, indices = locations.search(query_embedding, k)
+    rows = locations.rows(indices[0])
     
-    # Get the most similar location
-    matched_index = indices[0][0]
-    matched_location = location_data[matched_index]
+    # Get the most similar location (or, with a position, the closest good match)
+    distance_m = None
+    position = 0
+    if request.located:
+        with timed("geo_rerank"):
+            distances_m = np.full(len(rows), np.inf)
+            distances_m[rows >= 0] = locations.geo.distances(request.lat, request.lng, rows[rows >= 0])
+            candidates = rerank_by_distance(distances[0], rows, distances_m, GEO_RERANK_MARGIN, request.radius_m)
+        if len(candidates) == 0:
+            return {"answer": NO_MATCH_ANSWER, "source": None}
+        position = int(candidates[0])
+        distance_m = float(distances_m[position])
+    matched_index = int(rows[position])
+    if matched_index < 0:
+        return {"answer": NO_MATCH_ANSWER, "source": None}
+    title = str(locations.titles[matched_index])
     
     # Generate Google Maps URL
-    lat = matched_location['location']['lat']
-    lng = matched_location['location']['lng']
+    lat = float(locations.lat[matched_index])
+    lng = float(locations.lng[matched_index])
     
+    source = {
+        "type": "location",
+        "id": int(locations.ids[matched_index]),
+        "title": title,
+        "lat": lat,
+        "lng": lng,
+        "distance": float(distances[0][position])
+    }
+    if distance_m is not None:
+        source["distance_m"] = round(distance_m, 1)
+    return {"answer": f"L'emplacement '{title}' se trouve ici :", "source": source}
+
+@app.post("/nearby")
+async def nearby(request: NearbyRequest):
+    """
+    Locations closest to a point, without a query.
+
+    Args:
+        request (NearbyRequest): The user's lat/lng, the number of locations to return
+            and an optional radius in meters.
+
+    Returns:
+        dict: Up to k locations (closest first) with their distance in meters.
+    """
+    locations = index_manager.current
+    with timed("geo_search"):
+        if request.radius_m is not None:
+            rows, distances_m = locations.geo.within(request.lat, request.lng, request.radius_m, limit=request.k)
+        else:
+            rows, distances_m = locations.geo.nearest(request.lat, request.lng, request.k)
     return {
-        "answer": f"L'emplacement '{matched_location['title']}' se trouve ici :",
-        "source": {
-            "type": "location",
-            "title": matched_location['title'],
-            "lat": lat,
-            "lng": lng,
-            "distance": float(distances[0][0])
-        }
+        "results": [
+            {
+                "type": "location",
+                "id": int(locations.ids[row]),
+                "title": str(locations.titles[row]),
+                "lat": float(locations.lat[row]),
+                "lng": float(locations.lng[row]),
+                "distance_m": round(float(distance_m), 1)
+            } for row, distance_m in zip(rows.tolist(), distances_m.tolist())
+        ]
     }
 
+def build_batch_results(queries, distances, indices, locations, max_distance=None):
+    """
+    Turn one FAISS search over stacked queries into per-query answers.
+    Rows and columns are masked and gathered as whole arrays; only the final
+    conversion to JSON-ready lists happens per query.
+    Args:
+        queries (list): The user's queries.
+        distances (np.ndarray): (N, k) distances from LocationIndex.search.
+        indices (np.ndarray): (N, k) location ids, -1 where fewer than k exist.
+        locations (LocationIndex): Snapshot the search ran against.
+        max_distance (float): Distance above which a result is dropped, or None.
+    Returns:
+        list: One {query, answer, matches} dict per query.
+    """
+    rows = locations.rows(indices)
+    valid = rows >= 0
+    if max_distance is not None:
+        valid &= distances <= max_distance
+    if not valid.any():
+        return [{"query": query, "answer": NO_MATCH_ANSWER, "matches": []} for query in queries]
+    positions = np.where(valid, rows, 0)
+    match_ids = locations.ids[positions].tolist()
+    match_titles = locations.titles[positions].tolist()
+    match_lats = locations.lat[positions].tolist()
+    match_lngs = locations.lng[positions].tolist()
+    match_distances = distances.astype(float).tolist()
+    valid = valid.tolist()
+    results = []
+    for row, query in enumerate(queries):
+        matches = [
+            {
+                "type": "location",
+                "id": match_ids[row][column],
+                "title": match_titles[row][column],
+                "lat": match_lats[row][column],
+                "lng": match_lngs[row][column],
+                "distance": match_distances[row][column]
+            } for column, ok in enumerate(valid[row]) if ok
+        ]
+        answer = f"L'emplacement '{matches[0]['title']}' se trouve ici :" if matches else NO_MATCH_ANSWER
+        results.append({"query": query, "answer": answer, "matches": matches})
+    return results
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchQueryRequest):
+    """
+    Answer several queries with one encoder pass and one FAISS search.
+
+    Args:
+        request (BatchQueryRequest): The queries, the number of locations to return
+            per query and an optional distance cutoff.
+
+    Returns:
+        dict: One result per query, in order, with its top-k locations (closest first).
+            A query without any location under the cutoff gets an empty `matches` list.
+    """
+    max_distance = request.max_distance if request.max_distance is not None else DEFAULT_MAX_DISTANCE
+    with timed("query_encode"):
+        query_embeddings = await query_encoder.embed_many(request.queries)
+    locations = index_manager.current
+    with timed("faiss_search"):
+        distances, indices = locations.search(query_embeddings, request.k)
+    return {"results": build_batch_results(request.queries, distances, indices, locations, max_distance)}
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/locations", dependencies=[Depends(require_admin)])
+async def list_locations():
+    locations = index_manager.current
+    return {"version": locations.version, "locations": locations.locations()}
+
+@app.post("/admin/locations", dependencies=[Depends(require_admin)])
+async def upsert_locations(request: LocationsUpsert):
+    """
+    Add or update locations without a full rebuild; only new or renamed titles are embedded.
+    Searches keep using the previous index until the new one is swapped in.
+
+    Args:
+        request (LocationsUpsert): Locations to write; those without an id are added.
+
+    Returns:
+        dict: New index version, location count, written ids and number of embedded titles.
+    """
+    try:
+        return await run_in_threadpool(index_manager.upsert, [location.model_dump() for location in request.locations])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/admin/locations/{location_id}", dependencies=[Depends(require_admin)])
+async def delete_location(location_id: int):
+    try:
+        return await run_in_threadpool(index_manager.delete, [location_id])
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+async def reload_index():
+    """
+    Serve the latest artifact version on disk (e.g. after `python embeddings.py add ...`).
+    """
+    return {"version": await run_in_threadpool(index_manager.reload)}
+
+@app.get("/stats")
+async def encoder_stats():
+    """
+    Query embedding cache hit rate and encoder batch sizes.
+    """
+    return query_encoder.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
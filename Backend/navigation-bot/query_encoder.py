@@ -0,0 +1,221 @@
+import asyncio
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from instrumentation import count_model_call
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form used as cache key: case, surrounding punctuation and extra spaces are ignored.
+    Args:
+        query (str): Raw user query.
+    Returns:
+        str: Normalized query.
+    """
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?!.,;:")
+
+class QueryEmbeddingCache:
+    def __init__(self, max_size=2048, ttl_seconds=3600.0):
+        """
+        LRU cache of query embeddings with a time-to-live.
+        Args:
+            max_size (int): Maximum number of cached queries.
+            ttl_seconds (float): Lifetime of an entry.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, embedding):
+        embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class BatchingEncoder:
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        """
+        Background thread that coalesces concurrent queries into one model.encode call.
+        Args:
+            model: SentenceTransformer (anything with encode(list, convert_to_numpy=True)).
+            max_batch_size (int): Maximum queries per encode call.
+            max_wait_ms (float): How long to wait for more queries after the first one.
+        """
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Started on first use, and again in a forked child: threads do not survive fork,
+        # and a pre-forking server creates this object in the master
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, args=(self._queue,), name="query-encoder", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def submit(self, texts):
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    async def encode_async(self, text):
+        """
+        Encode one query off the event loop.
+        Args:
+            text (str): Query to encode.
+        Returns:
+            np.ndarray: (d,) float32 embedding.
+        """
+        return (await self.encode_many_async([text]))[0]
+
+    async def encode_many_async(self, texts):
+        """
+        Encode several queries off the event loop, in the same model pass.
+        Args:
+            texts (list): Queries to encode.
+        Returns:
+            np.ndarray: (N, d) float32 embeddings, in the order of `texts`.
+        """
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def _next_batch(self, requests):
+        batch = [requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait())
+            except queue.Empty:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    def _run(self, requests):
+        while True:
+            batch = [(texts, future) for texts, future in self._next_batch(requests) if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            # Identical queries in the same batch are encoded once
+            unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            with self._lock:
+                self._batch_sizes[len(unique)] += 1
+                self._requests += len(batch)
+            try:
+                count_model_call("sentence_transformer", self.model)
+                embeddings = np.asarray(self.model.encode(unique, convert_to_numpy=True), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            rows = {text: position for position, text in enumerate(unique)}
+            for texts, future in batch:
+                future.set_result(embeddings[[rows[text] for text in texts]])
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            encoded = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "requests": self._requests,
+                "batches": batches,
+                "avg_batch_size": encoded / batches if batches else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            }
+
+class QueryEncoder:
+    def __init__(self, model, cache_size=2048, ttl_seconds=3600.0, max_batch_size=32, max_wait_ms=5.0):
+        """
+        Query embeddings served from the cache, with misses sent to the batching encoder.
+        Args:
+            model: SentenceTransformer used for cache misses.
+            cache_size (int): See QueryEmbeddingCache.
+            ttl_seconds (float): See QueryEmbeddingCache.
+            max_batch_size (int): See BatchingEncoder.
+            max_wait_ms (float): See BatchingEncoder.
+        """
+        self.cache = QueryEmbeddingCache(cache_size, ttl_seconds)
+        self.encoder = BatchingEncoder(model, max_batch_size, max_wait_ms)
+
+    async def embed(self, query: str):
+        """
+        Embedding of a user query.
+        Args:
+            query (str): Raw user query.
+        Returns:
+            np.ndarray: (1, d) float32 matrix, ready for index.search.
+        """
+        return await self.embed_many([query])
+
+    async def embed_many(self, queries: list):
+        """
+        Embeddings of several user queries; all cache misses are encoded in one model pass.
+        Args:
+            queries (list): Raw user queries.
+        Returns:
+            np.ndarray: (N, d) float32 matrix, in the order of `queries`.
+        """
+        keys = [normalize_query(query) for query in queries]
+        embeddings = {}
+        for key in keys:
+            if key not in embeddings:
+                embeddings[key] = self.cache.get(key)
+        missing = [key for key, embedding in embeddings.items() if embedding is None]
+        if missing:
+            for key, embedding in zip(missing, await self.encoder.encode_many_async(missing)):
+                self.cache.put(key, embedding)
+                embeddings[key] = embedding
+        return np.stack([embeddings[key] for key in keys])
+
+    def stats(self):
+        return {"cache": self.cache.stats(), "batching": self.encoder.stats()}
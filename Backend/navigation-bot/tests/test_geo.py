@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+from geo import GeoIndex, haversine_m, rerank_by_distance
+
+
+def test_haversine_known_distance():
+    # Paris - Londres : environ 343.5 km
+    assert haversine_m(48.8566, 2.3522, 51.5074, -0.1278) == pytest.approx(343_550, rel=2e-3)
+    assert haversine_m(36.8, 10.1, 36.8, 10.1) == 0
+
+
+def test_within_matches_brute_force():
+    # Le KD-tree renvoie exactement les points du rayon, du plus proche au plus éloigné
+    rng = np.random.default_rng(0)
+    lat = 36.83 + rng.uniform(-0.02, 0.02, 2000)
+    lng = 10.14 + rng.uniform(-0.02, 0.02, 2000)
+    geo = GeoIndex(lat, lng)
+    distances = haversine_m(36.83, 10.14, lat, lng)
+    rows, found = geo.within(36.83, 10.14, 500)
+    assert set(rows.tolist()) == set(np.flatnonzero(distances <= 500).tolist())
+    assert np.all(np.diff(found) >= 0)
+    rows, _ = geo.within(36.83, 10.14, 500, limit=3)
+    assert rows.tolist() == np.argsort(distances)[:3].tolist()
+
+
+def test_nearest_across_antimeridian():
+    # Les coordonnées ECEF gèrent le passage de l'antiméridien
+    geo = GeoIndex(np.array([0.0, 0.0, 0.0]), np.array([179.99, -179.99, 170.0]))
+    rows, distances = geo.nearest(0.0, 179.999, k=2)
+    assert rows.tolist() == [0, 1]
+    assert distances[0] < distances[1] < 2_500
+
+
+def test_empty_index():
+    rows, distances = GeoIndex(np.empty(0), np.empty(0)).within(0.0, 0.0, 100)
+    assert len(rows) == 0 and len(distances) == 0
+
+
+def test_rerank_keeps_close_semantic_matches():
+    # Seuls les candidats proches du meilleur score sémantique sont triés par distance
+    semantic = np.array([0.10, 0.15, 0.90, 0.20])
+    rows = np.array([4, 2, 7, -1])
+    meters = np.array([800.0, 50.0, 10.0, np.inf])
+    assert rerank_by_distance(semantic, rows, meters, margin=0.2).tolist() == [1, 0]
+    assert rerank_by_distance(semantic, rows, meters, margin=0.2, radius_m=100).tolist() == [1]
+    assert rerank_by_distance(semantic, rows, meters, margin=0.2, radius_m=10).tolist() == []
@@ -0,0 +1,98 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import numpy as np
+import pytest
+from index_artifact import ArtifactMismatchError, file_sha256, load_artifact, location_columns, write_artifact
+from index_types import IndexConfig, build_index
+
+LOCATIONS = [
+    {"id": 7, "title": "Bibliothèque", "location": {"lat": 36.8338, "lng": 10.1478}},
+    {"id": 3, "title": "Bloc Prepa", "location": {"lat": 36.8344411, "lng": 10.1456052}},
+]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "location.json"
+    path.write_text(json.dumps(LOCATIONS))
+    return str(path)
+
+
+def build(root, source, model_name="all-MiniLM-L6-v2"):
+    embeddings = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0]], dtype=np.float32)
+    columns = location_columns(LOCATIONS, embeddings)
+    index = build_index(columns["embeddings"], columns["ids"])
+    return write_artifact(str(root), columns, index, model_name, file_sha256(source))
+
+
+def test_artifact_round_trip(tmp_path, source):
+    # L'artefact se recharge avec ses colonnes triées par id et son index, sans pickle
+    build(tmp_path / "artifacts", source)
+    locations = load_artifact(str(tmp_path / "artifacts"), model_name="all-MiniLM-L6-v2", dim=3, source_path=source)
+    assert len(locations) == 2
+    assert locations.ids.tolist() == [3, 7]
+    assert locations.titles.tolist() == ["Bloc Prepa", "Bibliothèque"]
+    assert locations.lat[0] == 36.8344411
+    assert locations.manifest["count"] == 2
+    distances, indices = locations.index.search(np.array([[0.0, 1.0, 0.0]], dtype=np.float32), 1)
+    assert indices[0][0] == 7
+    assert locations.rows(indices[0]).tolist() == [1]
+    assert locations.rows(np.array([-1, 4])).tolist() == [-1, -1]
+
+
+def test_artifact_refuses_changed_source(tmp_path, source):
+    # Un fichier de locations modifié depuis la construction est refusé
+    build(tmp_path / "artifacts", source)
+    with open(source, "a") as f:
+        f.write("\n")
+    with pytest.raises(ArtifactMismatchError):
+        load_artifact(str(tmp_path / "artifacts"), source_path=source)
+
+
+def test_artifact_refuses_other_model_or_dim(tmp_path, source):
+    # Un artefact construit avec un autre modèle ou une autre dimension est refusé
+    build(tmp_path / "artifacts", source, model_name="other-model")
+    with pytest.raises(ArtifactMismatchError):
+        load_artifact(str(tmp_path / "artifacts"), model_name="all-MiniLM-L6-v2")
+    with pytest.raises(ArtifactMismatchError):
+        load_artifact(str(tmp_path / "artifacts"), dim=384)
+
+
+def test_artifact_refuses_inconsistent_files(tmp_path, source):
+    # Des colonnes qui ne correspondent pas à l'index sont refusées
+    version_dir = build(tmp_path / "artifacts", source)
+    np.save(os.path.join(version_dir, "titles.npy"), np.array(["Bloc Prepa"]))
+    with pytest.raises(ArtifactMismatchError):
+        load_artifact(str(tmp_path / "artifacts"))
+
+
+def test_missing_artifact(tmp_path):
+    # Sans artefact, le chargement échoue avec un message explicite
+    with pytest.raises(ArtifactMismatchError):
+        load_artifact(str(tmp_path / "missing"))
+
+
+def test_artifact_refuses_other_index_type(tmp_path, source):
+    # Un artefact construit avec un autre type d'index est refusé
+    build(tmp_path / "artifacts", source)
+    with pytest.raises(ArtifactMismatchError):
+        load_artifact(str(tmp_path / "artifacts"), config=IndexConfig("hnsw"))
+
+
+@pytest.mark.parametrize("index_type", ["flat-ip", "hnsw", "ivfpq"])
+def test_cosine_index_reports_unit_l2_distances(tmp_path, source, index_type):
+    # Les index à produit scalaire renvoient 2 - 2 * cosinus, comme une distance
+    embeddings = np.array([[0.0, 2.0, 0.0], [3.0, 0.0, 0.0]], dtype=np.float32)
+    columns = location_columns(LOCATIONS, embeddings)
+    config = IndexConfig(index_type)
+    index = build_index(columns["embeddings"], columns["ids"], config)
+    write_artifact(str(tmp_path / "artifacts"), columns, index, "all-MiniLM-L6-v2", file_sha256(source), config)
+    locations = load_artifact(str(tmp_path / "artifacts"), config=config)
+    assert locations.manifest["index"]["type"] == index_type
+    distances, ids = locations.search(np.array([[0.0, 5.0, 0.0]], dtype=np.float32), 1)
+    assert ids[0][0] == 7
+    if index_type != "ivfpq":
+        assert distances[0][0] == pytest.approx(0.0, abs=1e-5)
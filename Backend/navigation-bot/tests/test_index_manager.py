@@ -0,0 +1,118 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import numpy as np
+import pytest
+from index_artifact import file_sha256, location_columns, write_artifact
+from index_types import IndexConfig, build_index
+from index_manager import IndexManager
+
+LOCATIONS = [
+    {"id": 1, "title": "Main Entrance", "location": {"lat": 36.8338, "lng": 10.1478}},
+    {"id": 2, "title": "Prepa Block", "location": {"lat": 36.8344, "lng": 10.1456}},
+]
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        return np.array([[len(text), sum(map(ord, text)) % 17, 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture(params=["flat-l2", "hnsw"])
+def manager(tmp_path, request):
+    # Chaque test est joué sur un index modifiable en place et sur un index reconstruit (HNSW)
+    source = tmp_path / "location.json"
+    source.write_text(json.dumps(LOCATIONS))
+    model = FakeModel()
+    config = IndexConfig(request.param)
+    columns = location_columns(LOCATIONS, model.encode([item["title"] for item in LOCATIONS]))
+    write_artifact(str(tmp_path / "artifacts"), columns, build_index(columns["embeddings"], columns["ids"], config),
+                   "test-model", file_sha256(str(source)), config)
+    model.calls.clear()
+    return IndexManager(model, "test-model", str(tmp_path / "artifacts"), str(source), config=config)
+
+
+def search(manager, title):
+    locations = manager.current
+    _, ids = locations.search(manager.encode([title]), 1)
+    return str(locations.titles[locations.rows(ids[0])[0]])
+
+
+def test_add_embeds_only_the_new_title(manager):
+    # Seul le nouveau titre est encodé, et il devient cherchable immédiatement
+    result = manager.upsert([{"title": "Library", "location": {"lat": 36.83, "lng": 10.14}}])
+    assert manager.model.calls == [["Library"]]
+    assert result["ids"] == [3]
+    assert result["count"] == 3
+    assert search(manager, "Library") == "Library"
+
+
+def test_coordinate_update_reuses_embedding(manager):
+    # Un simple déplacement ne ré-encode rien; un renommage ré-encode le titre
+    version = manager.current.version
+    result = manager.upsert([{"id": 2, "title": "Prepa Block", "location": {"lat": 1.0, "lng": 2.0}}])
+    assert result["embedded"] == 0
+    assert manager.model.calls == []
+    assert manager.current.version != version
+    assert manager.current.location(1)["location"] == {"lat": 1.0, "lng": 2.0}
+    result = manager.upsert([{"id": 2, "title": "Cafeteria", "location": {"lat": 1.0, "lng": 2.0}}])
+    assert result["embedded"] == 1
+    assert search(manager, "Cafeteria") == "Cafeteria"
+
+
+def test_delete_and_persist(manager):
+    # La suppression est persistée : le fichier source et l'artefact restent cohérents
+    snapshot = manager.current
+    manager.delete([1])
+    assert manager.current.ids.tolist() == [2]
+    # Les requêtes en cours gardent l'ancien instantané intact
+    assert snapshot.ids.tolist() == [1, 2]
+    assert snapshot.index.ntotal == 2
+    reopened = IndexManager(FakeModel(), "test-model", manager.artifact_dir, manager.source_path, config=manager.config)
+    assert reopened.current.ids.tolist() == [2]
+    with open(manager.source_path) as f:
+        assert [item["id"] for item in json.load(f)] == [2]
+    with pytest.raises(KeyError):
+        manager.delete([42])
+
+
+def test_reload_picks_up_changes_from_another_process(manager):
+    # Une mise à jour faite par un autre processus est servie après reload
+    other = IndexManager(FakeModel(), "test-model", manager.artifact_dir, manager.source_path, config=manager.config)
+    other.upsert([{"title": "Library", "location": {"lat": 36.83, "lng": 10.14}}])
+    assert len(manager.current) == 2
+    assert manager.reload() == other.current.version
+    assert len(manager.current) == 3
+
+
+def test_reindex_switches_index_type_without_embedding(manager):
+    # Changer de type d'index reconstruit depuis les embeddings stockés, sans ré-encoder
+    switched = IndexManager(manager.model, "test-model", manager.artifact_dir, manager.source_path,
+                            config=IndexConfig("flat-ip"), check_index_type=False)
+    result = switched.reindex()
+    assert result["index_type"] == "flat-ip"
+    assert manager.model.calls == []
+    assert switched.current.manifest["index"]["type"] == "flat-ip"
+    assert search(switched, "Prepa Block") == "Prepa Block"
+
+
+def test_writes_from_two_workers_are_not_lost(manager):
+    # Deux workers partagent le même répertoire : chaque écriture repart de la dernière version écrite
+    other = IndexManager(FakeModel(), "test-model", manager.artifact_dir, manager.source_path, config=manager.config)
+    assert manager.upsert([{"title": "Library", "location": {"lat": 36.83, "lng": 10.14}}])["ids"] == [3]
+    # `other` sert encore l'ancienne version, mais son écriture part de CURRENT
+    assert other.upsert([{"title": "Gym", "location": {"lat": 36.84, "lng": 10.15}}])["ids"] == [4]
+    assert sorted(other.current.titles.tolist()) == ["Gym", "Library", "Main Entrance", "Prepa Block"]
+
+    other.delete([1])
+    manager.reload()
+    assert sorted(manager.current.titles.tolist()) == ["Gym", "Library", "Prepa Block"]
+    # Le fichier source et le manifeste restent cohérents : un nouveau worker démarre
+    fresh = IndexManager(FakeModel(), "test-model", manager.artifact_dir, manager.source_path, config=manager.config)
+    assert fresh.current.version == manager.current.version
@@ -7,6 +7,7 @@ import pytest
 from fastapi.testclient import TestClient
 from main import app, load_faiss_index
 from unittest.mock import MagicMock
+import asyncio
 import numpy as np
 
 # Créer un client de test pour l'API FastAPI
@@ -66,4 +67,165 @@ async def test_cors_headers():
     response = client.post("/ask", json={"query": "Where is Bloc Prepa?"}, headers={"Origin": "http://frontend:8080"})
     assert response.status_code == 200
     assert "access-control-allow-origin" in response.headers
-    assert response.headers["access-control-allow-origin"] == "http://frontend:8080"
\ No newline at end of file
+    assert response.headers["access-control-allow-origin"] == "http://frontend:8080"
+
+@pytest.mark.asyncio
+async def test_stats_reports_query_cache_and_batching():
+    # Les statistiques du cache et du regroupement sont exposées
+    client.post("/ask", json={"query": "Where is Bloc Prepa?"})
+    client.post("/ask", json={"query": "where is bloc prepa"})
+    response = client.get("/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["cache"]["hits"] >= 1
+    assert stats["batching"]["batches"] >= 1
+
+
+@pytest.fixture
+def mock_batch_index(monkeypatch):
+    # Simuler un index FAISS de trois emplacements, identifiés par leur id
+    import main
+    from index_artifact import LocationIndex
+    mock_index = MagicMock()
+    mock_index.search.return_value = (
+        np.array([[0.1, 0.4], [0.9, 1.5]], dtype=np.float32),
+        np.array([[1, 3], [2, -1]])
+    )
+    locations = LocationIndex(
+        mock_index,
+        ids=np.array([1, 2, 3]),
+        titles=np.array(["Bloc Prepa", "Bibliothèque", "Foyer"], dtype=str),
+        lat=np.array([36.8344411, 36.8, 36.9]),
+        lng=np.array([10.1456052, 10.1, 10.2]),
+        embeddings=np.zeros((3, 2), dtype=np.float32),
+        manifest={"version": "test"}
+    )
+    monkeypatch.setattr(main.index_manager.get(), "current", locations)
+    return mock_index
+
+@pytest.mark.asyncio
+async def test_ask_batch_runs_one_search(mock_batch_index):
+    # Plusieurs questions sont traitées par une seule recherche FAISS, avec k résultats chacune
+    response = client.post("/ask/batch", json={"queries": ["Where is Bloc Prepa?", "library"], "k": 2})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert mock_batch_index.search.call_count == 1
+    query_matrix, k = mock_batch_index.search.call_args[0]
+    assert query_matrix.shape[0] == 2 and k == 2
+    assert results[0]["query"] == "Where is Bloc Prepa?"
+    assert results[0]["answer"] == "L'emplacement 'Bloc Prepa' se trouve ici :"
+    assert [match["title"] for match in results[0]["matches"]] == ["Bloc Prepa", "Foyer"]
+    assert [match["id"] for match in results[0]["matches"]] == [1, 3]
+    assert results[0]["matches"][0]["lat"] == 36.8344411
+    # Les positions -1 (moins de k emplacements) sont ignorées
+    assert [match["title"] for match in results[1]["matches"]] == ["Bibliothèque"]
+
+@pytest.mark.asyncio
+async def test_ask_batch_distance_cutoff(mock_batch_index):
+    # Au-delà du seuil de distance, aucune correspondance n'est renvoyée
+    response = client.post("/ask/batch", json={"queries": ["Where is Bloc Prepa?", "parking"], "k": 2, "max_distance": 0.5})
+    results = response.json()["results"]
+    assert [match["title"] for match in results[0]["matches"]] == ["Bloc Prepa", "Foyer"]
+    assert results[1]["matches"] == []
+    assert results[1]["answer"] == "Aucun emplacement correspondant n'a été trouvé."
+
+@pytest.mark.asyncio
+async def test_ask_batch_validates_request():
+    # Une liste vide ou un k hors bornes est refusé
+    assert client.post("/ask/batch", json={"queries": []}).status_code == 422
+    assert client.post("/ask/batch", json={"queries": ["library"], "k": 0}).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_admin_api_requires_token(monkeypatch):
+    # L'API d'administration est désactivée sans jeton, et refuse un mauvais jeton
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert client.post("/admin/reload").status_code == 403
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    response = client.get("/admin/locations", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["version"] == main.index_manager.current.version
+
+@pytest.mark.asyncio
+async def test_admin_delete_unknown_location(monkeypatch):
+    # La suppression d'un emplacement inconnu renvoie 404 sans modifier l'index
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    version = main.index_manager.current.version
+    response = client.delete("/admin/locations/999999", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 404
+    assert main.index_manager.current.version == version
+
+
+@pytest.mark.asyncio
+async def test_liveness_and_readiness(monkeypatch):
+    # Le processus est vivant tout de suite; il est prêt une fois l'index et le modèle chargés
+    import main
+    from lifecycle import Startup
+    assert client.get("/healthz").status_code == 200
+    startup = Startup()
+    for name, task in main.startup.tasks.items():
+        startup.add(name, task.func)
+    monkeypatch.setattr(main, "startup", startup)
+    assert client.get("/readyz").status_code == 503
+    with TestClient(app) as lifespan_client:
+        for _ in range(200):
+            if lifespan_client.get("/readyz").status_code == 200:
+                break
+            await asyncio.sleep(0.05)
+        response = lifespan_client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["components"]["model"]["state"] == "ready"
+
+@pytest.mark.asyncio
+async def test_metrics_expose_ask_stages(mock_batch_index):
+    # Les durées d'encodage et de recherche sont exportées au format Prometheus
+    response = client.post("/ask/batch", json={"queries": ["library"], "k": 1}, headers={"X-Request-ID": "trace-42"})
+    assert response.headers["X-Request-ID"] == "trace-42"
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert 'stage_duration_seconds_count{stage="query_encode"}' in metrics.text
+    assert 'stage_duration_seconds_count{stage="faiss_search"}' in metrics.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/ask/batch",status="200"}' in metrics.text
+    assert 'model_calls_total{model="sentence_transformer",state="warm"}' in metrics.text
+
+@pytest.mark.asyncio
+async def test_ask_with_position_prefers_closest(mock_batch_index, monkeypatch):
+    # Avec la position de l'utilisateur, le candidat le plus proche l'emporte parmi les bons scores
+    import main
+    monkeypatch.setattr(main, "GEO_RERANK_MARGIN", 0.5)
+    response = client.post("/ask", json={"query": "Where is the cafeteria?", "lat": 36.899, "lng": 10.199})
+    assert response.status_code == 200
+    assert mock_batch_index.search.call_args[0][1] == main.GEO_CANDIDATES
+    source = response.json()["source"]
+    assert source["title"] == "Foyer"
+    assert 0 < source["distance_m"] < 200
+    # Un candidat trop éloigné sémantiquement n'est pas retenu, même s'il est plus proche
+    monkeypatch.setattr(main, "GEO_RERANK_MARGIN", 0.1)
+    response = client.post("/ask", json={"query": "Where is the cafeteria?", "lat": 36.899, "lng": 10.199})
+    assert response.json()["source"]["title"] == "Bloc Prepa"
+    # Aucun candidat dans le rayon demandé
+    response = client.post("/ask", json={"query": "Where is the cafeteria?", "lat": 36.899, "lng": 10.199, "radius_m": 100})
+    assert response.json() == {"answer": "Aucun emplacement correspondant n'a été trouvé.", "source": None}
+
+@pytest.mark.asyncio
+async def test_ask_validates_position():
+    # lat et lng vont ensemble, et le rayon exige une position
+    assert client.post("/ask", json={"query": "library", "lat": 36.8}).status_code == 422
+    assert client.post("/ask", json={"query": "library", "radius_m": 100}).status_code == 422
+    assert client.post("/ask", json={"query": "library", "lat": 95, "lng": 10}).status_code == 422
+
+@pytest.mark.asyncio
+async def test_nearby_locations(mock_batch_index):
+    # Les emplacements les plus proches d'un point, avec ou sans rayon
+    response = client.post("/nearby", json={"lat": 36.8, "lng": 10.1, "k": 2})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["title"] for result in results] == ["Bibliothèque", "Bloc Prepa"]
+    assert results[0]["distance_m"] == 0
+    response = client.post("/nearby", json={"lat": 36.8, "lng": 10.1, "radius_m": 1000})
+    assert [result["id"] for result in response.json()["results"]] == [2]
+    assert 'stage_duration_seconds_count{stage="geo_search"}' in client.get("/metrics").text
@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import numpy as np
+import pytest
+import query_encoder
+from query_encoder import QueryEncoder, QueryEmbeddingCache, normalize_query
+
+
+class FakeModel:
+    def __init__(self, gate=None):
+        self.calls = []
+        self.gate = gate
+
+    def encode(self, texts, convert_to_numpy=True):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_normalize_query_ignores_case_spacing_and_punctuation():
+    # Les variantes d'une même question partagent une entrée de cache
+    assert normalize_query("  Where is   the Library? ") == "where is the library"
+    assert normalize_query("where is the library") == "where is the library"
+
+
+def test_cache_is_bounded_and_expires(monkeypatch):
+    # Le cache reste borné et les entrées expirées sont recalculées
+    now = [0.0]
+    monkeypatch.setattr(query_encoder.time, "monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(max_size=2, ttl_seconds=10)
+    cache.put("a", np.zeros(2, dtype=np.float32))
+    cache.put("b", np.zeros(2, dtype=np.float32))
+    assert cache.get("a") is not None
+    cache.put("c", np.zeros(2, dtype=np.float32))
+    assert cache.get("b") is None
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_repeated_queries_hit_the_cache():
+    # Une question répétée n'est encodée qu'une seule fois
+    model = FakeModel()
+    encoder = QueryEncoder(model, max_wait_ms=0)
+    first = await encoder.embed("Where is the library?")
+    second = await encoder.embed("where is the library")
+    assert first.shape == (1, 2)
+    np.testing.assert_array_equal(first, second)
+    assert model.calls == [["where is the library"]]
+    assert encoder.stats()["cache"]["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_encoded_in_one_batch():
+    # Les requêtes concurrentes sont regroupées en un seul appel à encode
+    gate = threading.Event()
+    model = FakeModel(gate)
+    encoder = QueryEncoder(model, max_batch_size=8, max_wait_ms=50)
+    tasks = [asyncio.create_task(encoder.embed(query)) for query in ["library", "bloc prepa", "library", "cafeteria"]]
+    await asyncio.sleep(0.1)
+    gate.set()
+    embeddings = await asyncio.gather(*tasks)
+    assert model.calls == [["library", "bloc prepa", "cafeteria"]]
+    assert embeddings[0][0, 0] == len("library")
+    assert embeddings[1][0, 0] == len("bloc prepa")
+    stats = encoder.stats()["batching"]
+    assert stats["batches"] == 1
+    assert stats["requests"] == 4
+
+
+@pytest.mark.asyncio
+async def test_encode_failure_is_raised_to_every_waiter():
+    # Une erreur du modèle est propagée à chaque requête du lot
+    class BrokenModel:
+        def encode(self, texts, convert_to_numpy=True):
+            raise RuntimeError("model unavailable")
+
+    encoder = QueryEncoder(BrokenModel(), max_wait_ms=0)
+    with pytest.raises(RuntimeError):
+        await encoder.embed("library")
+
+
+@pytest.mark.asyncio
+async def test_embed_many_encodes_misses_in_one_pass():
+    # Les questions absentes du cache sont encodées ensemble, les doublons une seule fois
+    model = FakeModel()
+    encoder = QueryEncoder(model, max_wait_ms=0)
+    await encoder.embed("library")
+    embeddings = await encoder.embed_many(["Library", "bloc prepa", "cafeteria", "bloc prepa?"])
+    assert embeddings.shape == (4, 2)
+    assert model.calls == [["library"], ["bloc prepa", "cafeteria"]]
+    assert embeddings[:, 0].tolist() == [len("library"), len("bloc prepa"), len("cafeteria"), len("bloc prepa")]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork n'existe pas sur cette plateforme")
+def test_encoder_thread_restarts_after_fork():
+    # Un serveur pré-forké crée l'encodeur dans le maître : chaque worker relance son propre thread
+    from query_encoder import BatchingEncoder
+    encoder = BatchingEncoder(FakeModel())
+    assert encoder._thread is None
+    assert encoder.submit(["before fork"]).result(timeout=5).shape == (1, 2)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = encoder.submit(["in child"]).result(timeout=5).shape == (1, 2)
+        except Exception:
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
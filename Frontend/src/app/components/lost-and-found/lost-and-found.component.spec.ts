@@ -13,6 +13,7 @@ describe('LostAndFoundComponent', () => {
     (process.env as any) = {
       NG_APP_API_URL: 'http://lost-and-found:8002'
     };
+    (window as any).__env = { lostAndFoundApiUrl: 'http://lost-and-found:8002' };
 
     await TestBed.configureTestingModule({
       declarations: [LostAndFoundComponent],
@@ -44,7 +45,11 @@ describe('LostAndFoundComponent', () => {
         description: 'Lost a black wallet',
         location: 'Bloc Prepa',
         contactInfo: 'john.doe@example.com',
-        image_path: '/data/test.jpg',
+        image_path: 'data/test.jpg',
+        renditions: {
+          thumbnail: { webp: '/data/renditions/test/thumbnail.webp', jpeg: '/data/renditions/test/thumbnail.jpg' },
+          medium: { webp: '/data/renditions/test/medium.webp', jpeg: '/data/renditions/test/medium.jpg' }
+        },
         detections: [{ name: 'wallet', confidence: 0.9 }],
         timestamp: '2023-10-01T10:00:00Z',
         matches: []
@@ -52,8 +57,9 @@ describe('LostAndFoundComponent', () => {
     ];
 
     // ngOnInit appelle fetchItems
-    const req = httpMock.expectOne('http://lost-and-found:8002/items');
+    const req = httpMock.expectOne(r => r.url === 'http://lost-and-found:8002/items');
     expect(req.request.method).toBe('GET');
+    expect(req.request.params.get('include')).toBe('matches');
     req.flush(mockItems);
 
     tick();
@@ -61,10 +67,48 @@ describe('LostAndFoundComponent', () => {
     expect(component.items.length).toBe(1);
     expect(component.filteredItems.length).toBe(1);
     expect(component.items[0].description).toBe('Lost a black wallet');
-    expect(component.items[0].image_path).toBe('http://localhost:8002/data/test.jpg');
+    expect(component.items[0].image_path).toBe('http://lost-and-found:8002/data/test.jpg');
+    expect(component.items[0].renditions.thumbnail.webp).toBe('http://lost-and-found:8002/data/renditions/test/thumbnail.webp');
+    expect(component.items[0].renditions.thumbnail.jpeg).toBe('http://lost-and-found:8002/data/renditions/test/thumbnail.jpg');
     expect(component.items[0].expanded).toBeFalse();
   }));
 
+  it('should show the 320px renditions in the list and the original in the modal', fakeAsync(() => {
+    const req = httpMock.expectOne(r => r.url === 'http://lost-and-found:8002/items');
+    req.flush([{
+      id: '1',
+      type: 'lost',
+      description: 'Lost a black wallet',
+      image_path: 'data/test.jpg',
+      renditions: {
+        thumbnail: { webp: '/data/renditions/test/thumbnail.webp', jpeg: '/data/renditions/test/thumbnail.jpg' },
+        medium: { webp: '/data/renditions/test/medium.webp', jpeg: '/data/renditions/test/medium.jpg' }
+      },
+      timestamp: '2023-10-01T10:00:00Z',
+      matches: []
+    }]);
+    tick();
+    fixture.detectChanges();
+
+    // La liste charge la miniature WebP, avec le JPEG en repli
+    const element: HTMLElement = fixture.nativeElement;
+    const source = element.querySelector('picture source') as HTMLSourceElement;
+    const image = element.querySelector('picture img') as HTMLImageElement;
+    expect(source.type).toBe('image/webp');
+    expect(source.getAttribute('srcset')).toBe('http://lost-and-found:8002/data/renditions/test/thumbnail.webp');
+    expect(image.getAttribute('src')).toBe('http://lost-and-found:8002/data/renditions/test/thumbnail.jpg');
+
+    // La fenêtre modale affiche l'original
+    image.click();
+    expect(component.modalImagePath).toBe('http://lost-and-found:8002/data/test.jpg');
+  }));
+
+  it('should fall back to the original until the renditions exist', () => {
+    const item: any = { renditions: { thumbnail: {} } };
+    component.onThumbnailError(item);
+    expect(item.renditions).toBeNull();
+  });
+
   it('should apply filter correctly', () => {
     component.items = [
       { id: '1', type: 'lost', description: 'Lost a wallet' },
@@ -1,5 +1,5 @@
 import { Component, OnInit } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpParams } from '@angular/common/http';
 
 @Component({
   selector: 'app-lost-and-found',
@@ -15,6 +15,7 @@ export class LostAndFoundComponent implements OnInit {
   items: any[] = [];
   filteredItems: any[] = [];
   selectedFile: File | null = null;
+  nextCursor: string | null = null;
   private defaultApiUrl = '/api/lost-and-found'; // Valeur par défaut
 
   constructor(private http: HttpClient) {}
@@ -35,16 +36,21 @@ export class LostAndFoundComponent implements OnInit {
     }
   }
 
-  fetchItems() {
-    this.http.get<any[]>(`${this.apiUrl}/items`).subscribe({
-      next: (items) => {
-        this.items = items.map(item => {
+  fetchItems(after: string | null = null) {
+    let params = new HttpParams().set('include', 'matches');
+    if (after) params = params.set('after', after);
+    this.http.get<any[]>(`${this.apiUrl}/items`, { params, observe: 'response' }).subscribe({
+      next: (response) => {
+        const items = (response.body || []).map(item => {
           return {
             ...item,
             expanded: false,
-            image_path: item.image_path ? `${this.apiUrl}/${item.image_path}` : null
+            image_path: item.image_path ? `${this.apiUrl}/${item.image_path}` : null,
+            renditions: this.absoluteRenditions(item.renditions)
           };
         });
+        this.items = after ? [...this.items, ...items] : items;
+        this.nextCursor = response.headers.get('X-Next-Cursor');
         this.applyFilter();
       },
       error: (error) => {
@@ -53,6 +59,10 @@ export class LostAndFoundComponent implements OnInit {
     });
   }
 
+  loadMore() {
+    if (this.nextCursor) this.fetchItems(this.nextCursor);
+  }
+
   applyFilter() {
     if (this.filter === 'all') {
       this.filteredItems = this.items;
@@ -89,6 +99,24 @@ export class LostAndFoundComponent implements OnInit {
       }
     });
   }
+  // Rendition URLs are relative to the API: {size: {format: url}}
+  private absoluteRenditions(renditions: any): any {
+    if (!renditions) return null;
+    const absolute: any = {};
+    for (const size of Object.keys(renditions)) {
+      absolute[size] = {};
+      for (const format of Object.keys(renditions[size])) {
+        absolute[size][format] = `${this.apiUrl}${renditions[size][format]}`;
+      }
+    }
+    return absolute;
+  }
+
+  // Renditions are written after the upload response: until then, show the original
+  onThumbnailError(item: any) {
+    item.renditions = null;
+  }
+
   isImageModalOpen = false;
 modalImagePath: string = '';
 